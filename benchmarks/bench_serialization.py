@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# vim: filetype=python shiftwidth=2 tabstop=2 expandtab
+#
+# Copyright (c) 2015, Jon Nall
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+# 
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+# 
+# * Neither the name of tradervue-utils nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# Measures the cost of encoding a large import_executions request body: the
+# original pretty-printed json.dumps() of a deep copy, against the compact
+# tradervue.codec encoding with and without gzip.
+#
+#   python benchmarks/bench_serialization.py [--executions 100000]
+
+import argparse
+import copy
+import gzip
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from tradervue import codec
+
+def make_executions(count):
+  executions = []
+  for i in range(count):
+    executions.append({ 'datetime': '2015-03-%02dT%02d:%02d:%02d-05:00' % (1 + i % 28, 9 + i % 7, i % 60, (i * 7) % 60),
+                        'symbol': 'SYM%d' % (i % 500),
+                        'quantity': (i % 20 + 1) * (100 if i % 2 == 0 else -100),
+                        'price': '%.4f' % (10.0 + (i % 1000) / 7.0),
+                        'option': '',
+                        'commission': '1.00',
+                        'transfee': '0.0023',
+                        'ecnfee': '0.0030' })
+  return executions
+
+def measure(fn, repeat):
+  best = None
+  for i in range(repeat):
+    start = time.process_time()
+    result = fn()
+    elapsed = time.process_time() - start
+    best = elapsed if best is None else min(best, elapsed)
+  return (result, best)
+
+def main():
+  parser = argparse.ArgumentParser(description = 'Import request serialization benchmark')
+  parser.add_argument('--executions', '-n', type = int, default = 100000, help = "The number of executions to encode")
+  parser.add_argument('--repeat', '-r', type = int, default = 3, help = "Report the best of this many runs")
+  args = parser.parse_args()
+
+  data = { 'allow_duplicates': False, 'overlay_commissions': False, 'tags': ['bench'], 'executions': make_executions(args.executions) }
+
+  cases = [ ('json indent=2 + deepcopy', lambda: json.dumps(copy.deepcopy(data), indent = 2).encode('utf-8')) ]
+  for backend in codec.available_backends():
+    codec.use_backend(backend)
+    cases.append(('codec %s' % (backend), lambda dumps = codec.dumps: dumps(data)))
+    cases.append(('codec %s + gzip' % (backend), lambda dumps = codec.dumps: gzip.compress(dumps(data), compresslevel = 6)))
+
+  print("%d executions, best of %d" % (args.executions, args.repeat))
+  print("%-30s %14s %10s" % ('encoding', 'bytes', 'cpu secs'))
+  for name, fn in cases:
+    body, elapsed = measure(fn, args.repeat)
+    print("%-30s %14d %10.3f" % (name, len(body), elapsed))
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,318 @@
+#!/usr/bin/env python
+# vim: filetype=python shiftwidth=2 tabstop=2 expandtab
+#
+# Copyright (c) 2015, Jon Nall
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+# 
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+# 
+# * Neither the name of tradervue-utils nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# A local stand-in for the Tradervue API, used by the benchmarks. It serves a synthetic account of any size with the
+# same pagination semantics as Tradervue (1-based ``page``, ``count`` of at most 100) and can add a fixed latency to
+# every response and answer imports with 424 (busy) a configurable number of times.
+#
+#   python benchmarks/fakeserver.py --trades 10000 --latency 0.02
+#
+# The server prints the base URL to pass to Tradervue(baseurl = ...) and runs until interrupted.
+
+import argparse
+import gzip
+import json
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+MAX_PAGE_SIZE = 100
+
+class Account:
+  """A synthetic Tradervue account. Objects are generated from their index, so even large accounts take no memory.
+  """
+
+  def __init__(self, trades, journals = None, notes = None):
+    self.trades = trades
+    self.journals = trades // 10 if journals is None else journals
+    self.notes = trades // 20 if notes is None else notes
+
+  # Newest first, like Tradervue
+  def trade_id(self, index): return str(1000000 + self.trades - index)
+  def journal_id(self, index): return str(2000000 + self.journals - index)
+  def note_id(self, index): return str(3000000 + self.notes - index)
+
+  def trade_index(self, trade_id): return self.__index(trade_id, 1000000, self.trades)
+  def journal_index(self, journal_id): return self.__index(journal_id, 2000000, self.journals)
+  def note_index(self, note_id): return self.__index(note_id, 3000000, self.notes)
+
+  def __index(self, object_id, base, count):
+    try:
+      index = base + count - int(object_id)
+    except ValueError:
+      return None
+    return index if 0 <= index < count else None
+
+  def trade(self, index, detail = False):
+    n = self.trades - index
+    trade = { 'id': self.trade_id(index),
+              'symbol': 'SYM%d' % (n % 500),
+              'side': 'long' if n % 3 else 'short',
+              'duration': 'intraday' if n % 5 else 'multiday',
+              'open': False,
+              'volume': 100 * (n % 10 + 1),
+              'gross_pl': '%.2f' % ((n % 41 - 20) * 12.5),
+              'native_pl': '%.2f' % ((n % 41 - 20) * 12.5),
+              'initial_risk': None,
+              'shared': n % 4 == 0,
+              'exec_count': n % 4 + 2,
+              'comment_count': 1 if n % 3 == 0 else 0,
+              'start_datetime': self.__datetime(n),
+              'end_datetime': self.__datetime(n, 45),
+              'updated_at': self.__datetime(n, 60),
+              'tags': ['setup%d' % (n % 7)] }
+    if detail:
+      trade['notes'] = 'Notes for trade %d. ' % (n) * 4
+    return trade
+
+  def executions(self, index):
+    n = self.trades - index
+    return [{ 'id': '%d%02d' % (n, e),
+              'datetime': self.__datetime(n, e * 5),
+              'symbol': 'SYM%d' % (n % 500),
+              'quantity': 100 if e % 2 == 0 else -100,
+              'price': '%.4f' % (10 + (n % 1000) / 7.0 + e * 0.01),
+              'commission': '1.00',
+              'transfee': '0.0023',
+              'ecnfee': '0.0030' } for e in range(n % 4 + 2)]
+
+  def journal(self, index):
+    n = self.journals - index
+    return { 'id': self.journal_id(index), 'date': self.__datetime(n)[:10], 'notes': 'Journal %d' % (n), 'comment_count': 1 if n % 5 == 0 else 0, 'trade_ids': [], 'updated_at': self.__datetime(n, 600) }
+
+  def note(self, index):
+    n = self.notes - index
+    return { 'id': self.note_id(index), 'notes': 'Note %d' % (n), 'comment_count': 1 if n % 5 == 0 else 0, 'updated_at': self.__datetime(n, 900) }
+
+  def comments(self, object_id):
+    return [{ 'id': '%s1' % (object_id), 'comment': 'A comment', 'user': 'bench', 'created_at': '2015-01-01T00:00:00Z' }]
+
+  def __datetime(self, n, minutes = 0):
+    day = n // 20
+    minute = (n % 20) * 15 + minutes
+    return '%04d-%02d-%02dT%02d:%02d:00Z' % (2010 + day // 336, day // 28 % 12 + 1, day % 28 + 1, 9 + minute // 60, minute % 60)
+
+class FakeTradervue:
+  """Serves an :class:`Account` over HTTP on a background thread.
+  """
+
+  def __init__(self, account, latency = 0.0, busy = 0, import_polls = 2, port = 0):
+    """
+       :param Account account: the account to serve
+       :param float latency: seconds added to every response
+       :param int busy: how many times each import is answered with 424 before it's accepted
+       :param int import_polls: how many import status requests report ``processing`` before ``succeeded``
+       :param int port: the port to listen on. 0 picks a free one.
+    """
+    self.account = account
+    self.latency = latency
+    self.busy = busy
+    self.import_polls = import_polls
+    self.requests = 0
+
+    self.__lock = threading.Lock()
+    self.__busy_left = busy
+    self.__polls_left = 0
+    self.__import_status = 'ready'
+
+    server = self
+    class Handler(_Handler):
+      fake = server
+    self.__server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+    self.__server.daemon_threads = True
+    self.__thread = None
+
+  @property
+  def baseurl(self):
+    return 'http://127.0.0.1:%d' % (self.__server.server_port)
+
+  def start(self):
+    self.__thread = threading.Thread(target = self.__server.serve_forever, daemon = True)
+    self.__thread.start()
+    return self
+
+  def stop(self):
+    self.__server.shutdown()
+    self.__server.server_close()
+
+  def __enter__(self):
+    return self.start()
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    self.stop()
+    return False
+
+  def count_request(self):
+    with self.__lock:
+      self.requests += 1
+
+  def submit_import(self):
+    # Each import is turned away ``busy`` times before it's accepted
+    with self.__lock:
+      if self.__busy_left > 0:
+        self.__busy_left -= 1
+        return False
+      self.__busy_left = self.busy
+      self.__polls_left = self.import_polls
+      self.__import_status = 'queued'
+      return True
+
+  def import_status(self):
+    with self.__lock:
+      if self.__import_status in ('queued', 'processing'):
+        if self.__polls_left > 0:
+          self.__polls_left -= 1
+          self.__import_status = 'processing'
+        else:
+          self.__import_status = 'succeeded'
+      return self.__import_status
+
+def _page(query, total, make):
+  page = max(1, int(query.get('page', ['1'])[0]))
+  count = min(MAX_PAGE_SIZE, max(1, int(query.get('count', ['25'])[0])))
+  start = (page - 1) * count
+  return [make(i) for i in range(start, min(total, start + count))]
+
+class _Handler(BaseHTTPRequestHandler):
+  protocol_version = 'HTTP/1.1'
+  wbufsize = -1
+  fake = None
+
+  def log_message(self, format, *args):
+    pass
+
+  def __send(self, code, obj, headers = {}):
+    body = json.dumps(obj).encode('utf-8')
+    if self.fake.latency > 0:
+      time.sleep(self.fake.latency)
+    self.send_response(code)
+    self.send_header('Content-Type', 'application/json; charset=utf-8')
+    self.send_header('Content-Length', str(len(body)))
+    for k, v in headers.items():
+      self.send_header(k, v)
+    self.end_headers()
+    self.wfile.write(body)
+
+  def __body(self):
+    body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+    if self.headers.get('Content-Encoding') == 'gzip':
+      body = gzip.decompress(body)
+    return json.loads(body) if len(body) > 0 else None
+
+  def __route(self):
+    self.fake.count_request()
+    url = urlparse(self.path)
+    path = url.path.split('/')
+    if path[1:3] != ['api', 'v1']:
+      return (None, parse_qs(url.query))
+    return (path[3:], parse_qs(url.query))
+
+  def do_GET(self):
+    account = self.fake.account
+    path, query = self.__route()
+    if path is None:
+      return self.__send(404, { 'error': 'Not found' })
+
+    kinds = { 'trades': (account.trades, account.trade_index, lambda i: account.trade(i), 'trades'),
+              'journal': (account.journals, account.journal_index, account.journal, 'journal_entries'),
+              'notes': (account.notes, account.note_index, account.note, 'journal_notes') }
+
+    if path == ['imports']:
+      return self.__send(200, { 'status': self.fake.import_status(), 'info': {} })
+    elif path == ['users']:
+      return self.__send(200, { 'users': [{ 'id': '1', 'username': 'bench', 'plan': 'gold' }] })
+    elif len(path) == 2 and path[0] == 'users':
+      return self.__send(200, { 'id': path[1], 'username': 'bench', 'plan': 'gold' })
+    elif len(path) == 1 and path[0] in kinds:
+      total, index_of, make, key = kinds[path[0]]
+      return self.__send(200, { key: _page(query, total, make) })
+    elif len(path) in (2, 3) and path[0] in kinds:
+      total, index_of, make, key = kinds[path[0]]
+      index = index_of(path[1])
+      if index is None:
+        return self.__send(404, { 'error': 'Not found' })
+      elif len(path) == 2:
+        return self.__send(200, account.trade(index, True) if path[0] == 'trades' else make(index))
+      elif path[2] == 'comments':
+        return self.__send(200, { 'comments': account.comments(path[1]) })
+      elif path[2] == 'executions' and path[0] == 'trades':
+        return self.__send(200, { 'executions': account.executions(index) })
+
+    return self.__send(404, { 'error': 'Not found' })
+
+  def do_POST(self):
+    path, query = self.__route()
+    data = self.__body()
+    if path == ['imports']:
+      if not isinstance(data, dict) or not isinstance(data.get('executions'), list):
+        return self.__send(400, { 'error': 'Invalid import' })
+      if not self.fake.submit_import():
+        return self.__send(424, { 'error': 'An import is already in progress' })
+      return self.__send(200, { 'status': 'queued' })
+    elif path == ['trades']:
+      return self.__send(201, { 'id': '999' }, { 'Location': '%s/api/v1/trades/999' % (self.fake.baseurl) })
+    elif path in (['journal'], ['notes']):
+      return self.__send(201, { 'id': '998' }, { 'Location': '%s/api/v1/%s/998' % (self.fake.baseurl, path[0]) })
+    return self.__send(404, { 'error': 'Not found' })
+
+  def do_PUT(self):
+    self.__route()
+    self.__body()
+    return self.__send(200, {})
+
+  def do_DELETE(self):
+    self.__route()
+    return self.__send(200, {})
+
+def main():
+  parser = argparse.ArgumentParser(description = 'Local stand-in Tradervue server for benchmarks')
+  parser.add_argument('--trades', '-n', type = int, default = 1000, help = "The number of trades in the account (default: %(default)s)")
+  parser.add_argument('--latency', type = float, default = 0.0, help = "Seconds added to every response (default: %(default)s)")
+  parser.add_argument('--busy', type = int, default = 0, help = "How many times each import is answered with HTTP 424 first (default: %(default)s)")
+  parser.add_argument('--import_polls', type = int, default = 2, help = "How many status polls report an import as processing (default: %(default)s)")
+  parser.add_argument('--port', type = int, default = 0, help = "The port to listen on. 0 picks a free one (default: %(default)s)")
+  args = parser.parse_args()
+
+  server = FakeTradervue(Account(args.trades), args.latency, args.busy, args.import_polls, args.port)
+  print(server.baseurl, flush = True)
+  try:
+    server.start()
+    while True:
+      time.sleep(3600)
+  except KeyboardInterrupt:
+    pass
+  finally:
+    server.stop()
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,259 @@
+#!/usr/bin/env python
+# vim: filetype=python shiftwidth=2 tabstop=2 expandtab
+#
+# Copyright (c) 2015, Jon Nall
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+# 
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+# 
+# * Neither the name of tradervue-utils nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# The benchmark suite. Each run starts local stand-in Tradervue servers (see fakeserver.py), measures the client and
+# tv-backup against them and stores the results under benchmarks/results/ named after the current commit, so two
+# commits can be compared:
+#
+#   python benchmarks/run.py                                  # writes results/<commit>.json
+#   python benchmarks/run.py --compare results/<other>.json   # and reports the changes against another run
+#   python benchmarks/run.py --sizes 1000 --skip import       # a quick subset
+
+import argparse
+import datetime
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(HERE, '..')
+sys.path.insert(0, ROOT)
+
+from fakeserver import Account
+from tradervue import Tradervue, RetryPolicy, Trade, codec
+from tradervue.records import projection, shape
+
+BENCHMARKS = ['get_objects', 'get_trades_executions', 'import', 'memory', 'tv_backup']
+
+"""Metrics where a smaller value is an improvement. For every other metric larger is better.
+"""
+LOWER_IS_BETTER = ('seconds', 'peak_rss_mb', 'bytes_per_trade')
+
+class Server:
+  """Runs fakeserver.py in a child process so it doesn't compete with the measured client for the GIL.
+  """
+
+  def __init__(self, trades, latency = 0.0, busy = 0, import_polls = 2):
+    self.process = subprocess.Popen([sys.executable, os.path.join(HERE, 'fakeserver.py'), '--trades', str(trades), '--latency', str(latency), '--busy', str(busy), '--import_polls', str(import_polls)], stdout = subprocess.PIPE, universal_newlines = True)
+    self.baseurl = self.process.stdout.readline().strip()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    self.process.terminate()
+    self.process.wait()
+    return False
+
+def client(baseurl):
+  # No rate limiting: the point is to measure the client and the protocol, not the limiter's pacing
+  return Tradervue('bench', 'benchmark', 'tradervue benchmarks', baseurl = baseurl, rate_limiter = False)
+
+def best_of(repeat, fn):
+  best = None
+  for i in range(repeat):
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    best = elapsed if best is None else min(best, elapsed)
+  return best
+
+def bench_get_objects(args, results):
+  with Server(10000, args.latency) as server:
+    with client(server.baseurl) as tv:
+      for max_trades in (25, 100, 500):
+        for offset in (0, 50, 5000):
+          count = len(tv.get_trades(max_trades = max_trades, offset = offset))
+          seconds = best_of(args.repeat, lambda: tv.get_trades(max_trades = max_trades, offset = offset))
+          results['get_objects[max=%d,offset=%d]' % (max_trades, offset)] = { 'seconds': seconds, 'objects_per_sec': count / seconds }
+
+def bench_get_trades_executions(args, results):
+  with Server(10000, args.latency) as server:
+    with client(server.baseurl) as tv:
+      for max_trades in (25, 100):
+        seconds = best_of(args.repeat, lambda: tv.get_trades(max_trades = max_trades, include_executions = True))
+        results['get_trades_executions[max=%d]' % (max_trades)] = { 'seconds': seconds }
+
+def bench_import(args, results):
+  executions = [{ 'datetime': '2015-03-%02dT10:%02d:00-05:00' % (1 + i % 28, i % 60),
+                  'symbol': 'SYM%d' % (i % 500),
+                  'quantity': 100 if i % 2 == 0 else -100,
+                  'price': '%.4f' % (10 + (i % 1000) / 7.0),
+                  'option': '',
+                  'commission': '1.00',
+                  'transfee': '0.0023',
+                  'ecnfee': '0.0030' } for i in range(args.executions)]
+
+  # Short waits so the time measured is the client's and the server's, not the backoff schedule's
+  policy = RetryPolicy(min_interval = 0.01, max_interval = 0.05, deadline = 60)
+  with Server(0, args.latency, busy = 2, import_polls = 2) as server:
+    with client(server.baseurl) as tv:
+      seconds = best_of(args.repeat, lambda: tv.import_executions(executions, wait_for_completion = True, busy_policy = policy, poll_policy = policy))
+      results['import_executions[n=%d]' % (args.executions)] = { 'seconds': seconds }
+
+def bench_memory(args, results):
+  # How much memory a decoded page of trades (with executions and comments) holds in each representation
+  trades = 10000
+  account = Account(trades, 0, 0)
+  page = []
+  for index in range(trades):
+    trade = account.trade(index)
+    trade['executions'] = account.executions(index)
+    if trade['comment_count'] > 0:
+      trade['comments'] = account.comments(trade['id'])
+    page.append(trade)
+  body = codec.dumps(page)
+  del page
+
+  fields = projection(['id', 'symbol', 'side', 'gross_pl', 'start_datetime', 'end_datetime'], ['executions', 'comments'])
+  variants = [('dicts', lambda objects: objects),
+              ('dicts,fields', lambda objects: shape(objects, Trade, fields)),
+              ('records', lambda objects: shape(objects, Trade, records = True)),
+              ('records,fields', lambda objects: shape(objects, Trade, fields, records = True))]
+  for name, convert in variants:
+    tracemalloc.start()
+    try:
+      kept = convert(codec.loads(body))
+      size = tracemalloc.get_traced_memory()[0]
+    finally:
+      tracemalloc.stop()
+    results['memory[trades=%d,%s]' % (trades, name)] = { 'bytes_per_trade': size / float(len(kept)) }
+    del kept
+
+def bench_tv_backup(args, results):
+  for trades in args.sizes:
+    workdir = tempfile.mkdtemp(prefix = 'tv-backup-bench')
+    try:
+      with Server(trades, args.latency) as server:
+        # Without --rate_limit 0 the run would just measure the rate limiter's ceiling
+        command = [sys.executable, os.path.join(HERE, 'tv_backup_bench.py'), 'backup', '--baseurl', server.baseurl, '--rate_limit', '0', '--dir', workdir, '--file', 'backup.json', '--progress_interval', '3600']
+        start = time.perf_counter()
+        process = subprocess.Popen(command, stdout = subprocess.DEVNULL, stderr = subprocess.DEVNULL)
+        if hasattr(os, 'wait4'):
+          pid, status, usage = os.wait4(process.pid, 0)
+          process.returncode = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -1
+          # ru_maxrss is in kilobytes on Linux and bytes on macOS
+          peak_rss = usage.ru_maxrss / (1024.0 * 1024.0 if sys.platform == 'darwin' else 1024.0)
+        else:
+          process.wait()
+          peak_rss = None
+        seconds = time.perf_counter() - start
+
+      if process.returncode != 0:
+        print("tv-backup failed for %d trades (exit status %d). Rerun the command to see its output: %s" % (trades, process.returncode, ' '.join(command)))
+        continue
+
+      result = { 'seconds': seconds, 'trades_per_sec': trades / seconds, 'backup_mb': os.path.getsize(os.path.join(workdir, 'backup.json')) / (1024.0 * 1024.0) }
+      if peak_rss is not None:
+        result['peak_rss_mb'] = peak_rss
+      results['tv_backup[trades=%d]' % (trades)] = result
+    finally:
+      shutil.rmtree(workdir)
+
+def git_revision():
+  try:
+    revision = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd = ROOT, universal_newlines = True).strip()
+    dirty = subprocess.check_output(['git', 'status', '--porcelain', '--untracked-files=no'], cwd = ROOT, universal_newlines = True).strip()
+  except (OSError, subprocess.CalledProcessError):
+    return 'unknown'
+  return revision + ('-dirty' if len(dirty) > 0 else '')
+
+def compare(previous, current, threshold):
+  regressions = 0
+  print("\nChanges against %s (%s):" % (previous['revision'], previous['date']))
+  print("%-45s %-16s %14s %14s %9s" % ('benchmark', 'metric', 'before', 'after', 'change'))
+  for name in sorted(current['results']):
+    for metric, after in sorted(current['results'][name].items()):
+      before = previous['results'].get(name, {}).get(metric)
+      if before is None or before == 0 or metric == 'backup_mb':
+        continue
+      change = 100.0 * (after - before) / before
+      worse = change > threshold if metric in LOWER_IS_BETTER else change < -threshold
+      regressions += 1 if worse else 0
+      print("%-45s %-16s %14.4f %14.4f %+8.1f%%%s" % (name, metric, before, after, change, '  REGRESSION' if worse else ''))
+  return regressions
+
+def main():
+  parser = argparse.ArgumentParser(description = 'Tradervue client benchmarks')
+  parser.add_argument('--sizes', type = str, default = '1000,10000,100000', help = 'Comma-separated account sizes (in trades) to run tv-backup against (default: %(default)s)')
+  parser.add_argument('--executions', type = int, default = 10000, help = 'The number of executions to import (default: %(default)s)')
+  parser.add_argument('--latency', type = float, default = 0.0, help = 'Seconds the fake server adds to every response (default: %(default)s)')
+  parser.add_argument('--repeat', type = int, default = 3, help = 'Client benchmarks report the best of this many runs (default: %(default)s)')
+  parser.add_argument('--skip', type = str, action = 'append', choices = BENCHMARKS, default = [], help = 'Skip a benchmark. May be repeated.')
+  parser.add_argument('--output', '-o', type = str, help = 'Where to store the results (default: results/<commit>.json)')
+  parser.add_argument('--compare', '-c', type = str, metavar = 'RESULTS', help = 'Report changes against results stored by an earlier run')
+  parser.add_argument('--threshold', type = float, default = 15.0, help = 'Percentage change reported as a regression by --compare (default: %(default)s)')
+  args = parser.parse_args()
+  args.sizes = [int(size) for size in args.sizes.split(',') if size]
+
+  # The import benchmark's 424 retries are expected
+  logging.basicConfig(level = logging.ERROR)
+
+  revision = git_revision()
+  current = { 'revision': revision,
+              'date': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+              'python': platform.python_version(),
+              'platform': platform.platform(),
+              'latency': args.latency,
+              'results': {} }
+
+  for name in BENCHMARKS:
+    if name not in args.skip:
+      print("Running %s..." % (name))
+      globals()['bench_' + name](args, current['results'])
+
+  print("\n%-45s %s" % ('benchmark', 'result'))
+  for name in sorted(current['results']):
+    print("%-45s %s" % (name, ', '.join('%s=%.4f' % item for item in sorted(current['results'][name].items()))))
+
+  output = args.output or os.path.join(HERE, 'results', '%s.json' % (revision))
+  if not os.path.isdir(os.path.dirname(os.path.abspath(output))):
+    os.makedirs(os.path.dirname(os.path.abspath(output)))
+  with open(output, 'w') as fh:
+    json.dump(current, fh, indent = 2, sort_keys = True)
+  print("\nStored results in %s" % (output))
+
+  if args.compare is not None:
+    with open(args.compare) as fh:
+      previous = json.load(fh)
+    if compare(previous, current, args.threshold) > 0:
+      return 1
+  return 0
+
+if __name__ == '__main__':
+  sys.exit(main())
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# vim: filetype=python shiftwidth=2 tabstop=2 expandtab
+#
+# Copyright (c) 2015, Jon Nall
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+# 
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+# 
+# * Neither the name of tradervue-utils nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# Runs tv-backup from this tree with a fixed password instead of one from the system keyring, so the benchmarks work
+# on machines without a configured keyring:
+#
+#   python benchmarks/tv_backup_bench.py backup --baseurl http://127.0.0.1:8080 ...
+
+import os
+import runpy
+import sys
+import types
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+PASSWORD = 'benchmark'
+
+try:
+  import keyring
+  import keyring.backend
+
+  class BenchmarkKeyring(keyring.backend.KeyringBackend):
+    priority = 1
+    def get_password(self, service, username): return PASSWORD
+    def set_password(self, service, username, password): pass
+    def delete_password(self, service, username): pass
+
+  keyring.set_keyring(BenchmarkKeyring())
+except ImportError:
+  # tv-backup only needs get_password (and the error types it catches) for a backup
+  keyring = types.ModuleType('keyring')
+  keyring.get_password = lambda service, username: PASSWORD
+  keyring.errors = types.SimpleNamespace(PasswordDeleteError = Exception, PasswordSetError = Exception)
+  sys.modules['keyring'] = keyring
+
+sys.path.insert(0, ROOT)
+sys.argv = [os.path.join(ROOT, 'tv-backup')] + sys.argv[1:]
+runpy.run_path(sys.argv[0], run_name = '__main__')
@@ -0,0 +1,30 @@
+# vim: filetype=python shiftwidth=2 tabstop=2 expandtab
+
+# Helpers shared by the tests. The local stand-in Tradervue server lives with the benchmarks.
+
+import os
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+import fakeserver
+from fakeserver import Account, FakeTradervue
+
+from tradervue import Tradervue
+
+def client(server, **kwargs):
+  kwargs.setdefault('rate_limiter', False)
+  return Tradervue('tests', 'tests', 'tests', baseurl = server.baseurl, **kwargs)
+
+def load_tv_backup():
+  """Import the tv-backup script as a module."""
+  import importlib.machinery
+  import importlib.util
+  import logging
+  loader = importlib.machinery.SourceFileLoader('tv_backup', os.path.join(ROOT, 'tv-backup'))
+  spec = importlib.util.spec_from_loader('tv_backup', loader)
+  module = importlib.util.module_from_spec(spec)
+  loader.exec_module(module)
+  module.LOG = logging.getLogger('tv-backup')
+  return module
@@ -0,0 +1,26 @@
+# vim: filetype=python shiftwidth=2 tabstop=2 expandtab
+
+import asyncio
+import unittest
+
+from tradervue import AsyncTradervue
+
+class FetchSubResourcesTest(unittest.TestCase):
+  def test_timeout_is_recorded_per_item(self):
+    tv = AsyncTradervue('user', 'pass', 'tests')
+
+    async def fetch(object_id):
+      if object_id == 2:
+        raise asyncio.TimeoutError()
+      return ['comment for %d' % object_id]
+
+    trades = [{ 'id': 1, 'comment_count': 1 }, { 'id': 2, 'comment_count': 1 }, { 'id': 3, 'comment_count': 1 }]
+    asyncio.run(tv._AsyncTradervue__fetch_sub_resources('trades', trades, [('comments', 'comment_count', fetch)]))
+
+    self.assertEqual(trades[0]['comments'], ['comment for 1'])
+    self.assertEqual(trades[2]['comments'], ['comment for 3'])
+    self.assertNotIn('comments', trades[1])
+    self.assertIn('comments', trades[1]['fetch_errors'])
+
+if __name__ == '__main__':
+  unittest.main()
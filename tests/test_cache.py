@@ -0,0 +1,155 @@
+# vim: filetype=python shiftwidth=2 tabstop=2 expandtab
+
+import time
+import unittest
+import unittest.mock
+
+from tradervue import ObjectCache
+
+from .support import Account, FakeTradervue, client
+
+class Clock:
+  def __init__(self):
+    self.now = 1000.0
+
+  def __call__(self):
+    return self.now
+
+class ObjectCacheTest(unittest.TestCase):
+  def setUp(self):
+    self.clock = Clock()
+    patcher = unittest.mock.patch('tradervue.cache.time.time', self.clock)
+    patcher.start()
+    self.addCleanup(patcher.stop)
+
+  def test_get_after_put(self):
+    cache = ObjectCache()
+    self.assertIsNone(cache.get(('trades', '1')))
+    self.assertTrue(cache.put(('trades', '1'), b'one', 3))
+    self.assertEqual(cache.get(('trades', '1')), b'one')
+    self.assertEqual(cache.stats()['hits'], 1)
+    self.assertEqual(cache.stats()['misses'], 1)
+
+  def test_expiry(self):
+    cache = ObjectCache(ttl = 10)
+    cache.put(('trades', '1'), b'one', 3)
+    self.clock.now += 9
+    self.assertEqual(cache.get(('trades', '1')), b'one')
+    self.clock.now += 2
+    self.assertIsNone(cache.get(('trades', '1')))
+    self.assertEqual(cache.stats()['expirations'], 1)
+
+  def test_reads_do_not_extend_expiry(self):
+    cache = ObjectCache(ttl = 10)
+    cache.put(('trades', '1'), b'one', 3)
+    for i in range(4):
+      self.clock.now += 3
+      cache.get(('trades', '1'))
+    self.assertIsNone(cache.get(('trades', '1')))
+
+  def test_no_ttl(self):
+    cache = ObjectCache(ttl = None)
+    cache.put(('trades', '1'), b'one', 3)
+    self.clock.now += 1e9
+    self.assertEqual(cache.get(('trades', '1')), b'one')
+
+  def test_lru_eviction_by_entries(self):
+    cache = ObjectCache(max_entries = 2)
+    cache.put(('trades', '1'), b'one', 3)
+    cache.put(('trades', '2'), b'two', 3)
+    cache.get(('trades', '1'))
+    cache.put(('trades', '3'), b'three', 5)
+    self.assertEqual(cache.get(('trades', '1')), b'one')
+    self.assertIsNone(cache.get(('trades', '2')))
+    self.assertEqual(cache.get(('trades', '3')), b'three')
+    self.assertEqual(cache.stats()['evictions'], 1)
+
+  def test_eviction_by_bytes(self):
+    cache = ObjectCache(max_bytes = 10)
+    cache.put(('trades', '1'), b'12345', 5)
+    cache.put(('trades', '2'), b'12345', 5)
+    cache.put(('trades', '3'), b'123', 3)
+    self.assertIsNone(cache.get(('trades', '1')))
+    self.assertEqual(cache.stats()['bytes'], 8)
+    self.assertFalse(cache.put(('trades', '4'), b'x' * 11, 11))
+
+  def test_invalidate_group(self):
+    cache = ObjectCache()
+    cache.put(('trades', '1'), b'one', 3)
+    cache.put(('trades', '1', 'executions'), b'execs', 5)
+    cache.put(('trades', '2'), b'two', 3)
+    cache.invalidate('trades', 1)
+    self.assertIsNone(cache.get(('trades', '1')))
+    self.assertIsNone(cache.get(('trades', '1', 'executions')))
+    self.assertEqual(cache.get(('trades', '2')), b'two')
+    self.assertEqual(cache.stats()['invalidations'], 2)
+
+  def test_invalidate_endpoint(self):
+    cache = ObjectCache()
+    cache.put(('trades', '1'), b'one', 3)
+    cache.put(('notes', '1'), b'note', 4)
+    cache.invalidate('trades')
+    self.assertIsNone(cache.get(('trades', '1')))
+    self.assertEqual(cache.get(('notes', '1')), b'note')
+
+  def test_put_after_invalidation_in_flight_is_discarded(self):
+    cache = ObjectCache()
+    token = cache.token(('trades', '1'))
+    cache.invalidate('trades', '1')
+    self.assertFalse(cache.put(('trades', '1'), b'stale', 5, token))
+    self.assertIsNone(cache.get(('trades', '1')))
+
+  def test_put_after_endpoint_invalidation_in_flight_is_discarded(self):
+    cache = ObjectCache()
+    token = cache.token(('trades', '1', 'comments'))
+    cache.invalidate('trades')
+    self.assertFalse(cache.put(('trades', '1', 'comments'), b'stale', 5, token))
+
+  def test_put_after_clear_in_flight_is_discarded(self):
+    cache = ObjectCache()
+    cache.put(('trades', '1'), b'one', 3)
+    token = cache.token(('trades', '1'))
+    cache.clear()
+    self.assertFalse(cache.put(('trades', '1'), b'stale', 5, token))
+
+  def test_unrelated_invalidation_keeps_token_valid(self):
+    cache = ObjectCache()
+    token = cache.token(('trades', '1'))
+    cache.invalidate('trades', '2')
+    self.assertTrue(cache.put(('trades', '1'), b'one', 3, token))
+
+class ClientCacheTest(unittest.TestCase):
+  def setUp(self):
+    self.server = FakeTradervue(Account(10)).start()
+    self.addCleanup(self.server.stop)
+
+  def test_hit_skips_request(self):
+    with client(self.server, cache = ObjectCache()) as tv:
+      trade_id = self.server.account.trade_id(0)
+      first = tv.get_trade(trade_id)
+      requests = self.server.requests
+      self.assertEqual(tv.get_trade(trade_id), first)
+      self.assertEqual(self.server.requests, requests)
+
+  def test_frequently_read_entry_still_expires(self):
+    with client(self.server, cache = ObjectCache(ttl = 0.3)) as tv:
+      trade_id = self.server.account.trade_id(0)
+      tv.get_trade(trade_id)
+      requests = self.server.requests
+      deadline = time.time() + 0.6
+      while time.time() < deadline:
+        tv.get_trade(trade_id)
+        time.sleep(0.02)
+      self.assertGreater(self.server.requests, requests)
+
+  def test_update_invalidates(self):
+    with client(self.server, cache = ObjectCache()) as tv:
+      trade_id = self.server.account.trade_id(0)
+      tv.get_trade(trade_id)
+      tv.update_trade(trade_id, notes = 'changed')
+      requests = self.server.requests
+      tv.get_trade(trade_id)
+      self.assertEqual(self.server.requests, requests + 1)
+
+if __name__ == '__main__':
+  unittest.main()
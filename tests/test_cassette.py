@@ -0,0 +1,80 @@
+# vim: filetype=python shiftwidth=2 tabstop=2 expandtab
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from tradervue import Cassette, CassetteError, Tradervue
+
+from .support import Account, FakeTradervue, client
+
+class CassetteTest(unittest.TestCase):
+  def setUp(self):
+    self.dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.dir)
+    self.path = os.path.join(self.dir, 'session.jsonl.gz')
+
+  def test_record_then_replay(self):
+    with FakeTradervue(Account(120)) as server:
+      with Cassette(self.path, 'record') as cassette, client(server, cassette = cassette) as tv:
+        trades = tv.get_trades(max_trades = 120, include_executions = True)
+        trade = tv.get_trade(trades[0]['id'])
+        missing = tv.get_trade('1')
+        created = tv.create_trade('SPY', notes = 'new')
+      recorded_requests = server.requests
+
+    # The server is gone, and the cassette answers from any baseurl
+    with Cassette(self.path, 'replay') as cassette:
+      tv = Tradervue('tests', 'tests', 'tests', baseurl = 'http://replay.invalid', rate_limiter = False, cassette = cassette)
+      self.assertEqual(tv.get_trades(max_trades = 120, include_executions = True), trades)
+      self.assertEqual(tv.get_trade(trades[0]['id']), trade)
+      self.assertIsNone(missing)
+      self.assertIsNone(tv.get_trade('1'))
+      self.assertEqual(tv.create_trade('SPY', notes = 'new'), created)
+    self.assertGreater(recorded_requests, 3)
+
+  def test_unrecorded_request(self):
+    with Cassette(self.path, 'record') as cassette:
+      cassette.record('GET', '/trades/2', None, None, 200, {}, b'{}', 0.0)
+    cassette = Cassette(self.path, 'replay')
+    with self.assertRaises(CassetteError):
+      cassette.replay('GET', '/trades/1', None, None)
+
+  def test_repeated_requests_replay_in_order(self):
+    with Cassette(self.path, 'record') as cassette:
+      for status in ['queued', 'processing', 'succeeded']:
+        cassette.record('GET', '/imports', None, None, 200, { 'Content-Type': 'application/json' }, ('{"status":"%s"}' % (status)).encode('utf-8'), 0.01)
+
+    cassette = Cassette(self.path, 'replay')
+    bodies = [cassette.replay('GET', '/imports', None, None)[0].content for i in range(4)]
+    self.assertEqual(bodies, [b'{"status":"queued"}', b'{"status":"processing"}', b'{"status":"succeeded"}', b'{"status":"succeeded"}'])
+
+  def test_requests_are_matched_on_query_and_body(self):
+    with Cassette(self.path, 'record') as cassette:
+      cassette.record('GET', '/trades', { 'page': 1 }, None, 200, {}, b'one', 0.0)
+      cassette.record('GET', '/trades', { 'page': 2 }, None, 200, {}, b'two', 0.0)
+      cassette.record('POST', '/trades', None, b'{"a":1}', 201, {}, b'created', 0.0)
+
+    cassette = Cassette(self.path, 'replay')
+    self.assertEqual(cassette.replay('GET', '/trades', { 'page': 2 }, None)[0].content, b'two')
+    self.assertEqual(cassette.replay('GET', '/trades', { 'page': 1 }, None)[0].content, b'one')
+    self.assertEqual(cassette.replay('POST', '/trades', None, b'{"a":1}')[0].status, 201)
+    with self.assertRaises(CassetteError):
+      cassette.replay('POST', '/trades', None, b'{"a":2}')
+
+  def test_binary_body_and_skipped_headers(self):
+    with Cassette(self.path, 'record') as cassette:
+      cassette.record('GET', '/blob', None, None, 200, { 'Date': 'today', 'X-Kept': 'yes' }, b'\xff\x00', 0.25)
+
+    interaction, delay = Cassette(self.path, 'replay', latency = 'recorded').replay('GET', '/blob', None, None)
+    self.assertEqual(interaction.content, b'\xff\x00')
+    self.assertEqual(interaction.headers, { 'X-Kept': 'yes' })
+    self.assertEqual(delay, 0.25)
+
+  def test_bad_mode(self):
+    with self.assertRaises(ValueError):
+      Cassette(self.path, 'rewind')
+
+if __name__ == '__main__':
+  unittest.main()
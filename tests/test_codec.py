@@ -0,0 +1,94 @@
+# vim: filetype=python shiftwidth=2 tabstop=2 expandtab
+
+import json
+import unittest
+
+from tradervue import codec
+
+def split(data, size):
+  return [data[i:i + size] for i in range(0, len(data), size)]
+
+def split_at(data, *offsets):
+  bounds = [0] + list(offsets) + [len(data)]
+  return [data[a:b] for (a, b) in zip(bounds, bounds[1:])]
+
+DOCUMENT = { 'meta': { 'page': 1, 'more': [1, 2] },
+             'trades': [{ 'id': '1', 'symbol': 'SPY', 'gross_pl': -12.5, 'volume': 1200, 'notes': 'Café — \U0001f4c8 "quoted" \\ end' },
+                        12345.678e-3,
+                        'plain string',
+                        True,
+                        None,
+                        [],
+                        {}],
+             'after': 'ignored' }
+
+class IterArrayTest(unittest.TestCase):
+  def test_every_chunk_size(self):
+    data = json.dumps(DOCUMENT, ensure_ascii = False).encode('utf-8')
+    for size in range(1, len(data) + 1):
+      self.assertEqual(list(codec.iter_array(split(data, size), 'trades')), DOCUMENT['trades'], 'chunk size %d' % (size))
+
+  def test_every_split_point(self):
+    # Splits inside keys, strings, numbers and multi-byte UTF-8 sequences
+    data = json.dumps(DOCUMENT, ensure_ascii = False).encode('utf-8')
+    for offset in range(1, len(data)):
+      self.assertEqual(list(codec.iter_array(split_at(data, offset), 'trades')), DOCUMENT['trades'], 'split at %d' % (offset))
+
+  def test_number_split_in_fraction_and_exponent(self):
+    for text in [b'{"a":[12.5]}', b'{"a":[1e10]}', b'{"a":[-1.5E+3,2]}']:
+      expected = json.loads(text)['a']
+      for offset in range(1, len(text)):
+        self.assertEqual(list(codec.iter_array(split_at(text, offset), 'a')), expected, '%s split at %d' % (text, offset))
+
+  def test_multibyte_character_split_across_chunks(self):
+    data = '{"notes":["€\U0001f4c8"]}'.encode('utf-8')
+    chunks = [bytes([b]) for b in data]
+    self.assertEqual(list(codec.iter_array(chunks, 'notes')), ['€\U0001f4c8'])
+
+  def test_empty_array(self):
+    self.assertEqual(list(codec.iter_array([b'{"trades": [ ] }'], 'trades')), [])
+
+  def test_missing_key(self):
+    with self.assertRaises(KeyError):
+      list(codec.iter_array([b'{"journal_entries": [1, 2]}'], 'trades'))
+    with self.assertRaises(KeyError):
+      list(codec.iter_array([b'{}'], 'trades'))
+
+  def test_reads_through_closing_brace(self):
+    chunks = iter(split(b'{"trades":[1,2],"more":{"x":[3]}}', 4))
+    self.assertEqual(list(codec.iter_array(chunks, 'trades')), [1, 2])
+    self.assertEqual(list(chunks), [])
+
+  def test_truncated_document(self):
+    with self.assertRaises(ValueError):
+      list(codec.iter_array([b'{"trades":[1,2'], 'trades'))
+    with self.assertRaises(ValueError):
+      list(codec.iter_array([b'{"trades":[1,2]'], 'trades'))
+
+  def test_not_an_array(self):
+    with self.assertRaises(ValueError):
+      list(codec.iter_array([b'{"trades": 5}'], 'trades'))
+
+class IterArraysTest(unittest.TestCase):
+  def test_every_chunk_size(self):
+    document = { 'trades': DOCUMENT['trades'], 'version': 3, 'notes': [{ 'id': 2, 'notes': 'ü' }], 'journal': [] }
+    expected = [('trades', t) for t in document['trades']] + [('notes', document['notes'][0])]
+    data = json.dumps(document, ensure_ascii = False, indent = 2).encode('utf-8')
+    for size in range(1, len(data) + 1, 7):
+      self.assertEqual(list(codec.iter_arrays(split(data, size))), expected, 'chunk size %d' % (size))
+
+  def test_empty_object(self):
+    self.assertEqual(list(codec.iter_arrays([b' { } '])), [])
+
+class BackendTest(unittest.TestCase):
+  def test_round_trip(self):
+    for name in codec.available_backends():
+      dumps, loads = codec._BACKENDS[name]
+      self.assertEqual(loads(dumps(DOCUMENT)), DOCUMENT, name)
+
+  def test_unknown_backend(self):
+    with self.assertRaises(ValueError):
+      codec.use_backend('nope')
+
+if __name__ == '__main__':
+  unittest.main()
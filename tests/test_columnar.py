@@ -0,0 +1,89 @@
+# vim: filetype=python shiftwidth=2 tabstop=2 expandtab
+
+import math
+import unittest
+
+import numpy
+
+from tradervue import ExecutionColumns, TradeColumns
+from tradervue.columnar import _timestamps, by_day, by_symbol, equity_curve, expectancy, max_drawdown, profit_factor, win_rate
+
+def trade(trade_id, symbol, gross_pl, start, end, **fields):
+  obj = { 'id': str(trade_id), 'symbol': symbol, 'side': 'long', 'duration': 'intraday', 'open': False, 'volume': '100',
+          'gross_pl': gross_pl, 'native_pl': gross_pl, 'exec_count': 2, 'start_datetime': start, 'end_datetime': end }
+  obj.update(fields)
+  return obj
+
+TRADES = [trade(1, 'SPY', '100.00', '2015-09-01T14:00:00Z', '2015-09-01T15:00:00Z'),
+          trade(2, 'QQQ', '-50.00', '2015-09-01T16:00:00Z', '2015-09-01T16:30:00Z', side = 'short'),
+          trade(3, 'SPY', '-150.00', '2015-09-02T14:00:00Z', '2015-09-02T14:10:00Z'),
+          trade(4, 'SPY', '200.00', '2015-09-03T14:00:00Z', None, open = True, duration = 'multiday')]
+
+class TimestampsTest(unittest.TestCase):
+  def test_offsets(self):
+    stamps = _timestamps(['2015-09-01T10:00:00Z', '2015-09-01T10:00:00-04:00', '2015-09-01T10:00:00.123+0530', '2015-09-01T10:00:00', None, ''])
+    expected = numpy.array(['2015-09-01T10:00:00', '2015-09-01T14:00:00', '2015-09-01T04:30:00', '2015-09-01T10:00:00', 'NaT', 'NaT'], dtype = 'datetime64[s]')
+    numpy.testing.assert_array_equal(stamps, expected)
+
+class TradeColumnsTest(unittest.TestCase):
+  def setUp(self):
+    self.trades = TradeColumns.from_trades(TRADES)
+
+  def test_columns(self):
+    self.assertEqual(len(self.trades), 4)
+    self.assertEqual(list(self.trades['id']), [1, 2, 3, 4])
+    self.assertEqual(list(self.trades.symbol_names()), ['SPY', 'QQQ', 'SPY', 'SPY'])
+    self.assertEqual(list(self.trades['side']), [1, -1, 1, 1])
+    self.assertEqual(list(self.trades['multiday']), [False, False, False, True])
+    self.assertEqual(list(self.trades['gross_pl']), [100.0, -50.0, -150.0, 200.0])
+    self.assertTrue(numpy.isnan(self.trades['net_pl']).all())
+    self.assertEqual(list(self.trades.holding_seconds()[:3]), [3600.0, 1800.0, 600.0])
+    self.assertTrue(math.isnan(self.trades.holding_seconds()[3]))
+    self.assertEqual(len(self.trades.select(self.trades['symbol'] == self.trades.symbol_code('SPY'))), 3)
+    self.assertEqual(self.trades.symbol_code('IWM'), -1)
+
+  def test_net_pl_from_executions(self):
+    trades = TradeColumns.from_trades([dict(TRADES[0], executions = [{ 'commission': '1.00', 'transfee': '0.25' }, { 'commission': None, 'ecnfee': '0.50' }])])
+    self.assertEqual(list(trades['net_pl']), [98.25])
+
+  def test_aggregates(self):
+    self.assertEqual(win_rate(self.trades), 0.5)
+    self.assertEqual(expectancy(self.trades), 25.0)
+    self.assertEqual(profit_factor(self.trades), 1.5)
+    self.assertTrue(math.isnan(win_rate(TradeColumns.from_trades([]))))
+    self.assertEqual(profit_factor(self.trades, numpy.array([1.0, 2.0])), float('inf'))
+    # Ordered by end time, with the open trade last
+    self.assertEqual(list(equity_curve(self.trades)), [100.0, 50.0, -100.0, 100.0])
+    self.assertEqual(max_drawdown(self.trades), 200.0)
+
+  def test_rollups(self):
+    symbols = by_symbol(self.trades)
+    self.assertEqual(list(symbols['symbol']), ['SPY', 'QQQ'])
+    self.assertEqual(list(symbols['count']), [3, 1])
+    self.assertEqual(list(symbols['total']), [150.0, -50.0])
+    self.assertEqual(list(symbols['win_rate']), [2.0 / 3, 0.0])
+
+    days = by_day(self.trades)
+    self.assertEqual([str(day) for day in days['day']], ['2015-09-01', '2015-09-02'])
+    self.assertEqual(list(days['total']), [50.0, -150.0])
+    self.assertEqual(list(by_day(self.trades, time = 'start')['count']), [2, 1, 1])
+
+class ExecutionColumnsTest(unittest.TestCase):
+  def test_fees_without_commission(self):
+    executions = ExecutionColumns.from_trades([{ 'id': 1, 'executions': [{ 'quantity': '100', 'price': '1.5', 'commission': None, 'transfee': '0.1' }] }])
+    numpy.testing.assert_allclose(executions['fees'], [0.1])
+    numpy.testing.assert_allclose(executions.cash_flow(), [-150.1])
+
+  def test_fees_and_cash_flow(self):
+    executions = ExecutionColumns.from_executions([
+      { 'symbol': 'SPY', 'datetime': '2015-09-01T10:00:00-04:00', 'quantity': '100', 'price': '10.00', 'commission': '1.00', 'transfee': '0.02', 'ecnfee': '0.03' },
+      { 'symbol': 'SPY', 'datetime': '2015-09-01T11:00:00-04:00', 'quantity': '-100', 'price': '11.00', 'commission': '1.00' }], trade_id = '7')
+    self.assertEqual(list(executions['trade_id']), [7, 7])
+    numpy.testing.assert_allclose(executions['fees'], [1.05, 1.0])
+    numpy.testing.assert_allclose(executions.notional(), [1000.0, 1100.0])
+    self.assertAlmostEqual(float(executions.cash_flow().sum()), 97.95)
+    self.assertEqual(str(executions['datetime'][0]), '2015-09-01T14:00:00')
+    self.assertEqual(list(by_day(executions, executions.cash_flow())['count']), [2])
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,126 @@
+# vim: filetype=python shiftwidth=2 tabstop=2 expandtab
+
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from tradervue import SnapshotStore
+from tradervue.diff import MISSING, diff_backups, diff_fields, iter_backup
+from tradervue.indexed import IndexedBackupWriter
+
+KINDS = ('journals', 'notes', 'trades')
+
+def trade(trade_id, **fields):
+  obj = { 'id': trade_id, 'symbol': 'SPY', 'side': 'long', 'notes': '', 'tags': ['a'],
+          'executions': [{ 'id': 1, 'quantity': 100 }, { 'id': 2, 'quantity': -100 }] }
+  obj.update(fields)
+  return obj
+
+OLD = { 'journals': [{ 'id': 7, 'date': '2015-09-02', 'notes': 'journal' }],
+        'notes': [{ 'id': 8, 'notes': 'removed' }],
+        'trades': [trade(3), trade(2), trade(1)] }
+NEW = { 'journals': [{ 'id': 7, 'date': '2015-09-02', 'notes': 'journal' }],
+        'notes': [],
+        'trades': [trade(4), trade(3, notes = 'Ünïcode €'), trade(2), trade(1, tags = ['a', 'b'], executions = [{ 'id': 1, 'quantity': 50 }, { 'id': 2, 'quantity': -100 }, { 'id': 5, 'quantity': 50 }])] }
+
+class DiffFieldsTest(unittest.TestCase):
+  def test_dicts(self):
+    self.assertEqual(list(diff_fields({ 'a': 1, 'b': 2 }, { 'a': 1, 'c': 3 })), [('b', 2, MISSING), ('c', MISSING, 3)])
+    self.assertEqual(list(diff_fields({ 'a': { 'b': 1 } }, { 'a': { 'b': 2 } })), [('a.b', 1, 2)])
+
+  def test_lists_of_objects_are_matched_by_id(self):
+    old = { 'executions': [{ 'id': 1, 'price': 1.0 }, { 'id': 2, 'price': 2.0 }] }
+    new = { 'executions': [{ 'id': 2, 'price': 2.5 }, { 'id': 3, 'price': 3.0 }] }
+    self.assertEqual(list(diff_fields(old, new)), [
+      ('executions[id=1]', { 'id': 1, 'price': 1.0 }, MISSING),
+      ('executions[id=2].price', 2.0, 2.5),
+      ('executions[id=3]', MISSING, { 'id': 3, 'price': 3.0 })])
+
+  def test_reordered_list(self):
+    old = [{ 'id': 1 }, { 'id': 2 }]
+    self.assertEqual(list(diff_fields(old, old[::-1], 'comments')), [('comments[order]', ['1', '2'], ['2', '1'])])
+
+  def test_other_lists_compare_whole(self):
+    self.assertEqual(list(diff_fields({ 'tags': ['a'] }, { 'tags': ['a', 'b'] })), [('tags', ['a'], ['a', 'b'])])
+    self.assertEqual(list(diff_fields({ 'tags': ['a'] }, { 'tags': ['a'] })), [])
+
+class DiffBackupsTest(unittest.TestCase):
+  def setUp(self):
+    self.dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.dir)
+
+  def path(self, name):
+    return os.path.join(self.dir, name)
+
+  def write_json(self, name, contents):
+    data = json.dumps(contents).encode('utf-8')
+    opener = gzip.open if name.endswith('.gz') else open
+    with opener(self.path(name), 'wb') as fh:
+      fh.write(data)
+    return self.path(name)
+
+  def write_ndjson(self, name, contents):
+    with open(self.path(name), 'wb') as raw, io.TextIOWrapper(raw, encoding = 'utf-8', newline = '\n') as fh:
+      writer = IndexedBackupWriter(fh)
+      for kind in KINDS:
+        writer.write_section(kind, contents[kind])
+    writer.write_index(self.path(name))
+    return self.path(name)
+
+  def write_snapshot(self, store, name, contents):
+    writer = store.writer(name)
+    for kind in KINDS:
+      writer.write_section(kind, contents[kind])
+    writer.close()
+    return (store, name)
+
+  def assertExpectedDiff(self, result):
+    self.assertEqual(result.counts['trades'], { 'added': 1, 'removed': 0, 'modified': 2, 'unchanged': 1 })
+    self.assertEqual(result.counts['journals'], { 'added': 0, 'removed': 0, 'modified': 0, 'unchanged': 1 })
+    self.assertEqual(result.counts['notes'], { 'added': 0, 'removed': 1, 'modified': 0, 'unchanged': 0 })
+    self.assertEqual(len(result), 4)
+    self.assertEqual([(c.kind, c.id, c.status) for c in result.changes],
+                     [('trades', '4', 'added'), ('trades', '3', 'modified'), ('trades', '1', 'modified'), ('notes', '8', 'removed')])
+
+    (added, notes, executions, removed) = result.changes
+    self.assertIsNone(added.old)
+    self.assertEqual(added.new, NEW['trades'][0])
+    self.assertEqual(notes.fields, [('notes', '', 'Ünïcode €')])
+    self.assertEqual(executions.fields, [('tags', ['a'], ['a', 'b']),
+                                         ('executions[id=1].quantity', 100, 50),
+                                         ('executions[id=5]', MISSING, { 'id': 5, 'quantity': 50 })])
+    self.assertEqual(removed.old, OLD['notes'][0])
+    self.assertIsNone(removed.new)
+
+  def test_json_files(self):
+    self.assertExpectedDiff(diff_backups(self.write_json('old.json', OLD), self.write_json('new.json', NEW)))
+
+  def test_mixed_formats(self):
+    self.assertExpectedDiff(diff_backups(self.write_ndjson('old.ndjson', OLD), self.write_json('new.json.gz', NEW)))
+    self.assertExpectedDiff(diff_backups(self.write_json('old.json.gz', OLD), self.write_ndjson('new.ndjson', NEW)))
+
+  def test_snapshots(self):
+    store = SnapshotStore(self.path('store'))
+    self.assertExpectedDiff(diff_backups(self.write_snapshot(store, 'old', OLD), self.write_snapshot(store, 'new', NEW)))
+
+  def test_snapshot_and_file(self):
+    store = SnapshotStore(self.path('store'))
+    self.assertExpectedDiff(diff_backups(self.write_snapshot(store, 'old', OLD), self.write_json('new.json', NEW)))
+
+  def test_identical_backups(self):
+    result = diff_backups(self.write_json('old.json', OLD), self.write_ndjson('new.ndjson', OLD))
+    self.assertEqual(len(result), 0)
+    self.assertEqual(result.counts['trades'], { 'added': 0, 'removed': 0, 'modified': 0, 'unchanged': 3 })
+
+  def test_iter_backup(self):
+    expected = [(kind, obj) for kind in KINDS for obj in NEW[kind]]
+    self.assertEqual(list(iter_backup(self.write_json('new.json', NEW))), expected)
+    self.assertEqual(list(iter_backup(self.write_json('new.json.gz', NEW))), expected)
+    self.assertEqual(list(iter_backup(self.write_ndjson('new.ndjson', NEW))), expected)
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,99 @@
+# vim: filetype=python shiftwidth=2 tabstop=2 expandtab
+
+import datetime
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+import unittest.mock
+
+from tradervue import IndexedBackup
+from tradervue.indexed import IndexedBackupWriter, index_path
+
+TRADES = [{ 'id': 3, 'symbol': 'SPY', 'start_datetime': '2015-09-03T14:00:00Z', 'notes': 'Ünïcode €' },
+          { 'id': 2, 'symbol': 'QQQ', 'start_datetime': '2015-09-02T14:00:00Z' },
+          { 'id': 1, 'symbol': 'IWM', 'start_datetime': '2015-09-02T10:00:00Z' },
+          { 'id': 4, 'symbol': 'OEX' }]
+JOURNALS = [{ 'id': 7, 'date': '2015-09-02', 'notes': 'multi\nline' }]
+
+class IndexedBackupTest(unittest.TestCase):
+  def setUp(self):
+    self.dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.dir)
+    self.path = os.path.join(self.dir, 'backup.ndjson')
+
+  def write(self, newline = '\n'):
+    with open(self.path, 'wb') as raw, io.TextIOWrapper(raw, encoding = 'utf-8', newline = newline) as fh:
+      writer = IndexedBackupWriter(fh)
+      writer.write_section('journals', JOURNALS)
+      writer.write_section('notes', [])
+      writer.write_section('trades', TRADES)
+    writer.write_index(self.path)
+
+  def open_without_rebuild(self):
+    with unittest.mock.patch.object(IndexedBackup, '_IndexedBackup__build_index', side_effect = AssertionError('index rebuilt')):
+      return IndexedBackup(self.path)
+
+  def test_lookups(self):
+    self.write()
+    with self.open_without_rebuild() as backup:
+      self.assertEqual(backup.kinds(), ['journals', 'notes', 'trades'])
+      self.assertEqual(backup.count('trades'), 4)
+      self.assertEqual(backup.ids('trades'), ['3', '2', '1', '4'])
+      self.assertEqual(backup.get_trade(3), TRADES[0])
+      self.assertEqual(backup.get_journal('7'), JOURNALS[0])
+      self.assertIsNone(backup.get_trade(99))
+      self.assertIsNone(backup.get_note(1))
+      self.assertEqual(backup.load(), { 'journals': JOURNALS, 'notes': [], 'trades': TRADES })
+      self.assertEqual([obj['id'] for (kind, obj) in backup.iter_objects('trades')], [3, 2, 1, 4])
+      self.assertEqual([kind for (kind, obj) in backup.iter_objects()], ['journals'] + ['trades'] * 4)
+
+  def test_between(self):
+    self.write()
+    with IndexedBackup(self.path) as backup:
+      self.assertEqual([t['id'] for t in backup.between('trades', '2015-09-02', '2015-09-02')], [2, 1])
+      self.assertEqual([t['id'] for t in backup.between('trades', datetime.date(2015, 9, 3))], [3])
+      self.assertEqual([t['id'] for t in backup.between('trades', enddate = datetime.datetime(2015, 9, 2, 23))], [2, 1])
+      self.assertEqual(list(backup.between('notes')), [])
+
+  def test_index_size_matches_the_file(self):
+    self.write()
+    with open(index_path(self.path)) as fh:
+      self.assertEqual(json.load(fh)['size'], os.path.getsize(self.path))
+
+  def test_rebuild_after_size_mismatch(self):
+    self.write()
+    with open(self.path, 'ab') as fh:
+      fh.write((json.dumps({ 'kind': 'notes', 'object': { 'id': 8, 'notes': 'appended' } }) + '\n').encode('utf-8'))
+    with IndexedBackup(self.path) as backup:
+      self.assertEqual(backup.get_note(8), { 'id': 8, 'notes': 'appended' })
+      self.assertEqual(backup.get_trade(1), TRADES[2])
+
+  def test_offsets_wrong_when_newlines_are_translated(self):
+    # What a platform default newline translation to '\r\n' would do. The size check catches it.
+    self.write(newline = '\r\n')
+    with IndexedBackup(self.path) as backup:
+      self.assertEqual(list(backup.iter_objects()), [('journals', JOURNALS[0])] + [('trades', trade) for trade in TRADES])
+
+  def test_rebuild_without_index(self):
+    self.write()
+    os.remove(index_path(self.path))
+    with IndexedBackup(self.path) as backup:
+      self.assertEqual(backup.get_trade(4), TRADES[3])
+
+  def test_corrupt_index(self):
+    self.write()
+    with open(index_path(self.path), 'w') as fh:
+      fh.write('{not json')
+    with IndexedBackup(self.path) as backup:
+      self.assertEqual(backup.count('trades'), 4)
+
+  def test_empty_file(self):
+    open(self.path, 'wb').close()
+    with IndexedBackup(self.path) as backup:
+      self.assertEqual(backup.kinds(), [])
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,100 @@
+# vim: filetype=python shiftwidth=2 tabstop=2 expandtab
+
+import datetime
+import unittest
+
+from tradervue import Mirror
+from tradervue.mirror import _tag_filter
+
+from .support import Account, FakeTradervue, client
+
+class TagFilterTest(unittest.TestCase):
+  def test_params_in_order(self):
+    self.assertEqual(_tag_filter('(a | B) & !c d')[1], ['a', 'B', 'c', 'd'])
+    self.assertEqual(_tag_filter('a && b')[0], _tag_filter('a AND b')[0])
+    self.assertEqual(_tag_filter('a || b')[0], _tag_filter('a or b')[0])
+    self.assertEqual(_tag_filter('!a')[0], _tag_filter('not a')[0])
+
+  def test_errors(self):
+    for expr in ['', '(a', 'a)', 'a and', 'or b', 'not']:
+      with self.assertRaises(ValueError, msg = expr):
+        _tag_filter(expr)
+
+class MirrorTest(unittest.TestCase):
+  def setUp(self):
+    self.account = Account(150, journals = 12, notes = 6)
+    self.server = FakeTradervue(self.account).start()
+    self.addCleanup(self.server.stop)
+    self.tv = client(self.server)
+    self.addCleanup(self.tv.close)
+    self.mirror = Mirror(':memory:', self.tv)
+    self.addCleanup(self.mirror.close)
+
+  def test_sync_and_query(self):
+    counts = self.mirror.sync()
+    self.assertEqual(counts['trades']['added'], 150)
+    self.assertEqual(counts['journals']['added'], 12)
+    self.assertEqual(counts['notes']['added'], 6)
+
+    trades = self.mirror.get_trades(max_trades = None)
+    self.assertEqual(len(trades), 150)
+    self.assertEqual(trades[0]['id'], self.account.trade_id(0))
+    self.assertIn('notes', trades[0])
+
+    trade_id = self.account.trade_id(3)
+    self.assertEqual(self.mirror.get_trade_executions(trade_id), self.account.executions(3))
+    self.assertEqual(self.mirror.get_trade(trade_id)['symbol'], self.account.trade(3)['symbol'])
+
+  def test_filters(self):
+    self.mirror.sync()
+    everything = [self.account.trade(i) for i in range(150)]
+
+    longs = self.mirror.get_trades(side = 'Long', max_trades = None)
+    self.assertEqual(len(longs), len([t for t in everything if t['side'] == 'long']))
+    self.assertEqual(len(self.mirror.get_trades(side = 'SHORT', duration = 'multiday', max_trades = None)), len([t for t in everything if t['side'] == 'short' and t['duration'] == 'multiday']))
+    self.assertEqual(len(self.mirror.get_trades(winners = True, max_trades = None)), len([t for t in everything if float(t['gross_pl']) > 0]))
+    self.assertEqual(len(self.mirror.get_trades(max_trades = 10, offset = 145)), 5)
+
+    def tagged(expr, match):
+      self.assertEqual(len(self.mirror.get_trades(tag_expr = expr, max_trades = None)), len([t for t in everything if match(t['tags'][0])]), expr)
+    tagged('SETUP1', lambda tag: tag == 'setup1')
+    tagged('setup1 setup2', lambda tag: False)
+    tagged('!(setup1 | setup2)', lambda tag: tag not in ('setup1', 'setup2'))
+    tagged('not setup1 and not setup3', lambda tag: tag not in ('setup1', 'setup3'))
+
+    start = datetime.date(2010, 1, 2)
+    self.assertEqual(len(self.mirror.get_trades(startdate = start, enddate = start, max_trades = None)), len([t for t in everything if t['start_datetime'].startswith('2010-01-02')]))
+
+  def test_side_and_duration_are_validated(self):
+    with self.assertRaises(ValueError):
+      self.mirror.get_trades(side = 'sideways')
+    with self.assertRaises(ValueError):
+      self.mirror.get_trades(duration = 'l%')
+
+  def test_incremental_sync_stops_after_window(self):
+    self.mirror.sync()
+    requests = self.server.requests
+    counts = self.mirror.sync(window = 5)
+    self.assertEqual(counts['trades'], { 'added': 0, 'updated': 0, 'deleted': 0, 'unchanged': 5 })
+    # The first page of each listing, plus at most the next page being prefetched
+    self.assertLessEqual(self.server.requests - requests, 6)
+
+  def test_full_sync_drops_deleted_objects(self):
+    self.mirror.sync()
+    self.account.trades = 140 # The oldest 10 trades are gone
+    counts = self.mirror.sync(full = True)
+    self.assertEqual(counts['trades']['deleted'], 10)
+    self.assertEqual(len(self.mirror.get_trades(max_trades = None)), 140)
+
+  def test_trades_without_updated_at_are_downloaded_again(self):
+    trade = Account.trade
+    Account.trade = lambda account, index, detail = False: dict((k, v) for (k, v) in trade(account, index, detail).items() if k != 'updated_at')
+    self.addCleanup(setattr, Account, 'trade', trade)
+
+    self.mirror.sync()
+    counts = self.mirror.sync(full = True)
+    self.assertEqual(counts['trades']['updated'], 150)
+    self.assertEqual(counts['notes']['unchanged'], 6)
+
+if __name__ == '__main__':
+  unittest.main()
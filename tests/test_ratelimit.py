@@ -0,0 +1,82 @@
+# vim: filetype=python shiftwidth=2 tabstop=2 expandtab
+
+import email.utils
+import unittest
+import unittest.mock
+
+from tradervue import RateLimiter
+
+class Clock:
+  def __init__(self):
+    self.now = 1000.0
+
+  def __call__(self):
+    return self.now
+
+class RateLimiterTest(unittest.TestCase):
+  def setUp(self):
+    self.clock = Clock()
+    patcher = unittest.mock.patch('tradervue.ratelimit.time.time', self.clock)
+    patcher.start()
+    self.addCleanup(patcher.stop)
+
+  def test_burst_then_paced(self):
+    limiter = RateLimiter(rate = 10, burst = 3)
+    self.assertEqual([limiter.reserve() for i in range(3)], [0.0, 0.0, 0.0])
+    self.assertAlmostEqual(limiter.reserve(), 0.1)
+    self.assertAlmostEqual(limiter.reserve(), 0.2)
+
+  def test_tokens_refill(self):
+    limiter = RateLimiter(rate = 10, burst = 2)
+    limiter.reserve()
+    limiter.reserve()
+    self.clock.now += 0.1
+    self.assertEqual(limiter.reserve(), 0.0)
+
+  def test_additive_increase(self):
+    limiter = RateLimiter(rate = 10, max_rate = 11, increase = 5)
+    limiter.on_response(200)
+    self.assertAlmostEqual(limiter.rate, 10.5)
+    limiter.on_response(200)
+    limiter.on_response(200)
+    self.assertEqual(limiter.rate, 11)
+
+  def test_multiplicative_decrease_once_per_burst(self):
+    limiter = RateLimiter(rate = 16, min_rate = 3, decrease = 0.5)
+    self.assertTrue(limiter.on_response(429))
+    self.assertTrue(limiter.on_response(503))
+    self.assertEqual(limiter.rate, 8)
+    self.clock.now += 1
+    limiter.on_response(429)
+    self.assertEqual(limiter.rate, 4)
+    self.clock.now += 1
+    limiter.on_response(429)
+    self.assertEqual(limiter.rate, 3)
+    self.assertEqual(limiter.stats()['throttled'], 4)
+
+  def test_throttling_never_raises_rate_above_max_rate(self):
+    limiter = RateLimiter(rate = 0.2, burst = 1, max_rate = 0.2)
+    limiter.on_response(429)
+    self.assertEqual(limiter.rate, 0.2)
+    self.assertAlmostEqual(limiter.reserve(), 5.0)
+
+  def test_retry_after_blocks_requests(self):
+    limiter = RateLimiter(rate = 100, burst = 10)
+    limiter.on_response(429, '2')
+    self.assertAlmostEqual(limiter.reserve(), 2.0)
+    self.clock.now += 1.5
+    self.assertAlmostEqual(limiter.reserve(), 0.5)
+
+  def test_parse_retry_after(self):
+    self.assertIsNone(RateLimiter.parse_retry_after(None))
+    self.assertIsNone(RateLimiter.parse_retry_after('soon'))
+    self.assertEqual(RateLimiter.parse_retry_after('7'), 7.0)
+    self.assertEqual(RateLimiter.parse_retry_after('-3'), 0.0)
+    self.assertAlmostEqual(RateLimiter.parse_retry_after(email.utils.formatdate(self.clock.now + 30, usegmt = True)), 30.0)
+
+  def test_shared_per_credentials(self):
+    self.assertIs(RateLimiter.shared('http://a', 'u'), RateLimiter.shared('http://a', 'u'))
+    self.assertIsNot(RateLimiter.shared('http://a', 'u'), RateLimiter.shared('http://a', 'v'))
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,104 @@
+# vim: filetype=python shiftwidth=2 tabstop=2 expandtab
+
+import unittest
+import unittest.mock
+
+from tradervue import RetryPolicy, Tradervue
+from tradervue.tradervue import _import_policies
+
+from .support import Account, FakeTradervue, client
+
+class Clock:
+  def __init__(self):
+    self.now = 1000.0
+
+  def __call__(self):
+    return self.now
+
+class RetryPolicyTest(unittest.TestCase):
+  def setUp(self):
+    self.clock = Clock()
+    for target, value in [('tradervue.retry.time.time', self.clock), ('tradervue.retry.random.random', lambda: 0.0)]:
+      patcher = unittest.mock.patch(target, value)
+      patcher.start()
+      self.addCleanup(patcher.stop)
+
+  def test_needs_a_limit(self):
+    with self.assertRaises(ValueError):
+      RetryPolicy(deadline = None, max_attempts = None)
+
+  def test_exponential_growth_capped(self):
+    schedule = RetryPolicy(min_interval = 1, max_interval = 5, multiplier = 2, deadline = None, max_attempts = 10).start()
+    self.assertEqual([schedule.next_delay() for i in range(5)], [1, 2, 4, 5, 5])
+    self.assertEqual(schedule.waited, 17)
+
+  def test_max_attempts(self):
+    schedule = RetryPolicy(min_interval = 1, deadline = None, max_attempts = 3).start()
+    self.assertIsNotNone(schedule.next_delay())
+    self.assertIsNotNone(schedule.next_delay())
+    self.assertIsNone(schedule.next_delay())
+
+  def test_deadline_shortens_last_wait(self):
+    schedule = RetryPolicy(min_interval = 4, max_interval = 4, deadline = 10).start()
+    self.assertEqual(schedule.next_delay(), 4)
+    self.clock.now += 8
+    self.assertEqual(schedule.next_delay(), 2)
+    self.clock.now += 2
+    self.assertIsNone(schedule.next_delay())
+
+  def test_jitter_shortens_the_first_wait(self):
+    policy = RetryPolicy(min_interval = 2, max_interval = 8, jitter = 0.5, deadline = 60)
+    with unittest.mock.patch('tradervue.retry.random.random', lambda: 1.0):
+      schedule = policy.start()
+      self.assertEqual(schedule.next_delay(), 1.0)
+      self.assertEqual(schedule.next_delay(), 2.0)
+
+  def test_jittered_waits_differ(self):
+    policy = RetryPolicy(min_interval = 2, jitter = 0.5, deadline = 60)
+    values = iter([0.1, 0.9])
+    with unittest.mock.patch('tradervue.retry.random.random', lambda: next(values)):
+      self.assertNotEqual(policy.start().next_delay(), policy.start().next_delay())
+
+class ImportPoliciesTest(unittest.TestCase):
+  def test_defaults_back_off_within_the_old_worst_case(self):
+    busy, poll = _import_policies(None, None, None, None, None)
+    self.assertIs(busy, Tradervue.IMPORT_BUSY_POLICY)
+    self.assertIs(poll, Tradervue.IMPORT_POLL_POLICY)
+    self.assertEqual((busy.min_interval, busy.max_interval, busy.deadline), (0.5, 5.0, 15.0))
+    self.assertEqual((poll.min_interval, poll.max_interval, poll.deadline), (0.5, 3.0, 18.0))
+    self.assertGreater(poll.jitter, 0.0)
+
+  def test_legacy_arguments(self):
+    busy, poll = _import_policies(5, 2, 1.5, None, None)
+    self.assertEqual((busy.min_interval, busy.max_interval, busy.max_attempts, busy.deadline), (5.0, 5.0, 5, None))
+    self.assertEqual((poll.min_interval, poll.max_interval, poll.jitter, poll.max_attempts, poll.deadline), (1.5, 1.5, 0.0, 4, None))
+
+  def test_interval_alone_keeps_the_old_number_of_polls(self):
+    busy, poll = _import_policies(None, None, 1.0, None, None)
+    self.assertEqual((poll.min_interval, poll.max_attempts), (1.0, 7))
+
+  def test_explicit_policies_win(self):
+    policy = RetryPolicy(deadline = 1)
+    self.assertEqual(_import_policies(3, 5, 3, policy, policy), (policy, policy))
+
+class ImportPollCountTest(unittest.TestCase):
+  """Pins the number of status polls to the baseline's: one up front and then wait_retries + 1 more"""
+
+  def setUp(self):
+    self.server = FakeTradervue(Account(1), import_polls = 100).start()
+    self.addCleanup(self.server.stop)
+    self.tv = client(self.server)
+    self.addCleanup(self.tv.close)
+
+  def test_wait_retries(self):
+    with unittest.mock.patch('tradervue.tradervue.time.sleep'):
+      self.assertIsNone(self.tv.import_executions([{ 'symbol': 'SPY' }], wait_for_completion = True, wait_retries = 5))
+    self.assertEqual(self.tv.last_import_timing['polls'], 7)
+
+  def test_wait_retries_zero(self):
+    with unittest.mock.patch('tradervue.tradervue.time.sleep'):
+      self.tv.import_executions([{ 'symbol': 'SPY' }], wait_for_completion = True, wait_retries = 0, secs_per_wait_retry = 1)
+    self.assertEqual(self.tv.last_import_timing['polls'], 2)
+
+if __name__ == '__main__':
+  unittest.main()
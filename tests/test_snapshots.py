@@ -0,0 +1,89 @@
+# vim: filetype=python shiftwidth=2 tabstop=2 expandtab
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from tradervue import SnapshotStore
+
+def backup(trades, notes = None):
+  return { 'journals': [], 'notes': notes or [], 'trades': trades }
+
+class SnapshotStoreTest(unittest.TestCase):
+  def setUp(self):
+    self.dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.dir)
+    self.store = SnapshotStore(self.dir)
+
+  def write(self, name, contents):
+    writer = self.store.writer(name)
+    for kind in ('journals', 'notes', 'trades'):
+      writer.write_section(kind, contents[kind])
+    writer.close()
+    return writer
+
+  def objects(self):
+    return sum(len(files) for (directory, dirs, files) in os.walk(self.store.objects_path))
+
+  def test_write_and_load(self):
+    contents = backup([{ 'id': '2', 'symbol': 'SPY', 'notes': 'Ünïcode' }, { 'id': '1', 'symbol': 'QQQ' }], [{ 'id': '9', 'notes': 'n' }])
+    writer = self.write('first', contents)
+    self.assertEqual(writer.new_objects, 3)
+    self.assertTrue(self.store.exists('first'))
+    self.assertEqual(self.store.load('first'), contents)
+    self.assertEqual(list(self.store.iter_objects('first', 'notes')), [('notes', contents['notes'][0])])
+    self.assertEqual(self.store.latest(), 'first')
+    self.assertEqual(self.store.snapshots()[0]['counts'], { 'journals': 0, 'notes': 1, 'trades': 2 })
+
+  def test_unchanged_objects_are_stored_once(self):
+    trades = [{ 'id': str(i), 'gross_pl': i } for i in range(10)]
+    self.write('first', backup(trades))
+    writer = self.write('second', backup(trades[:9] + [{ 'id': '9', 'gross_pl': -1 }]))
+    self.assertEqual(writer.new_objects, 1)
+    self.assertEqual(self.objects(), 11)
+
+  def test_names(self):
+    with self.assertRaises(ValueError):
+      self.store.writer('../escape')
+    self.write('taken', backup([]))
+    with self.assertRaises(ValueError):
+      self.store.writer('taken')
+    with self.assertRaises(KeyError):
+      self.store.load('missing')
+
+  def test_gc_removes_unreferenced_objects(self):
+    self.write('first', backup([{ 'id': '1', 'v': 1 }, { 'id': '2', 'v': 1 }]))
+    self.write('second', backup([{ 'id': '1', 'v': 2 }, { 'id': '2', 'v': 1 }]))
+    self.assertEqual(self.store.gc()['objects_removed'], 0)
+
+    self.store.remove('first')
+    result = self.store.gc()
+    self.assertEqual(result['objects_removed'], 1)
+    self.assertGreater(result['bytes_freed'], 0)
+    self.assertEqual(self.store.load('second')['trades'], [{ 'id': '1', 'v': 2 }, { 'id': '2', 'v': 1 }])
+
+  def test_gc_keep(self):
+    for i in range(4):
+      self.write('s%d' % (i), backup([{ 'id': '1', 'v': i }]))
+    result = self.store.gc(keep = 2)
+    self.assertEqual(result['snapshots_removed'], 2)
+    self.assertEqual(result['objects_removed'], 2)
+    self.assertEqual([s['name'] for s in self.store.snapshots()], ['s2', 's3'])
+
+  def test_gc_removes_aborted_snapshots(self):
+    writer = self.store.writer('aborted')
+    writer.write_section('trades', [{ 'id': '1' }])
+    writer.abort()
+    self.assertFalse(self.store.exists('aborted'))
+
+    unfinished = self.store.writer('crashed')
+    unfinished.write_section('trades', [{ 'id': '2' }])
+    unfinished._SnapshotWriter__refs.close()
+
+    self.assertEqual(self.store.snapshots(), [])
+    self.assertEqual(self.store.gc()['objects_removed'], 2)
+    self.assertEqual(os.listdir(self.store.snapshots_path), [])
+
+if __name__ == '__main__':
+  unittest.main()
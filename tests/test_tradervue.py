@@ -0,0 +1,73 @@
+# vim: filetype=python shiftwidth=2 tabstop=2 expandtab
+
+import unittest
+import unittest.mock
+
+import requests
+
+from tradervue import Metrics, Tradervue
+
+from .support import Account, FakeTradervue, client, fakeserver
+
+class StreamedListingTest(unittest.TestCase):
+  def setUp(self):
+    self.server = FakeTradervue(Account(250)).start()
+    self.addCleanup(self.server.stop)
+    patcher = unittest.mock.patch.object(Tradervue, 'STREAM_MIN_BYTES', 0)
+    patcher.start()
+    self.addCleanup(patcher.stop)
+
+  def test_streamed_pages_match(self):
+    with client(self.server) as tv:
+      trades = tv.get_trades(max_trades = 250)
+      self.assertEqual([t['id'] for t in trades], [self.server.account.trade_id(i) for i in range(250)])
+
+  def test_streamed_responses_reuse_the_connection(self):
+    connections = []
+    setup = fakeserver._Handler.setup
+    def counting_setup(handler):
+      connections.append(handler.client_address)
+      setup(handler)
+
+    # With tiny chunks the closing brace is still unread when the array ends
+    with unittest.mock.patch.object(fakeserver._Handler, 'setup', counting_setup), unittest.mock.patch.object(Tradervue, 'STREAM_CHUNK_BYTES', 1):
+      with client(self.server) as tv:
+        for i in range(3):
+          tv.get_trades(max_trades = 10)
+    self.assertEqual(len(connections), 1)
+
+  def received(self, session = None):
+    metrics = Metrics()
+    with client(self.server, metrics = metrics, session = session) as tv:
+      tv.get_trades(max_trades = 250)
+    return metrics.snapshot()['trades']['GET']['bytes_received']
+
+  def test_streamed_bytes_are_counted_without_content_length(self):
+    with unittest.mock.patch.object(Tradervue, 'STREAM_MIN_BYTES', 10 ** 9):
+      expected = self.received()
+    self.assertGreater(expected, 0)
+
+    # Chunked and compressed responses don't say how long they are up front
+    def without_length(r, *args, **kwargs):
+      del r.headers['Content-Length']
+    session = requests.Session()
+    session.hooks['response'].append(without_length)
+    self.addCleanup(session.close)
+    self.assertEqual(self.received(session), expected)
+    self.assertEqual(self.received(), expected)
+
+class BatchedImportTest(unittest.TestCase):
+  def setUp(self):
+    self.server = FakeTradervue(Account(1), import_polls = 0).start()
+    self.addCleanup(self.server.stop)
+
+  def test_on_chunk_reports_each_chunk_as_it_completes(self):
+    chunks = []
+    executions = ({ 'symbol': 'SPY', 'quantity': i } for i in range(25))
+    with client(self.server) as tv:
+      result = tv.import_executions_batched(executions, max_rows = 10, on_chunk = lambda chunk: chunks.append((chunk['index'], chunk['executions'], chunk['status'])))
+    self.assertEqual(chunks, [(0, 10, 'succeeded'), (1, 10, 'succeeded'), (2, 5, 'succeeded')])
+    self.assertEqual(result['summary']['succeeded'], 3)
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,323 @@
+# vim: filetype=python shiftwidth=2 tabstop=2 expandtab
+
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+import unittest.mock
+
+from .support import Account, FakeTradervue, load_tv_backup
+
+tv_backup = load_tv_backup()
+
+def listing(objects):
+  for obj in objects:
+    yield dict(obj)
+
+class SyncObjectsTest(unittest.TestCase):
+  def sync(self, listed, previous = None, previous_markers = None, fetch = None, window = 0):
+    markers = {}
+    objects = list(tv_backup.sync_objects('trades', listing(listed), previous, previous_markers, markers, window, fetch))
+    return (objects, markers)
+
+  def fetcher(self, fetched):
+    def fetch(listed):
+      fetched.append(listed['id'])
+      return dict(listed, detail = True)
+    return fetch
+
+  def test_full_walk(self):
+    trades = [{ 'id': 3 }, { 'id': 2 }, { 'id': 1 }]
+    objects, markers = self.sync(trades)
+    self.assertEqual(objects, trades)
+    self.assertEqual(sorted(markers), ['1', '2', '3'])
+
+  def test_reuses_unchanged_updated_at(self):
+    trades = [{ 'id': 2, 'updated_at': 'b' }, { 'id': 1, 'updated_at': 'a' }]
+    previous, markers = self.sync(trades, fetch = self.fetcher([]))
+
+    fetched = []
+    changed = [{ 'id': 2, 'updated_at': 'c' }, { 'id': 1, 'updated_at': 'a' }]
+    objects, markers = self.sync(changed, { 'trades': previous }, { 'trades': markers }, self.fetcher(fetched))
+    self.assertEqual(fetched, [2])
+    self.assertEqual([o['id'] for o in objects], [2, 1])
+
+  def test_refetches_when_listing_has_no_updated_at(self):
+    # Detail-only edits (e.g. notes) don't change the listed fields, so a listing hash can't prove a trade unchanged
+    trades = [{ 'id': 2, 'symbol': 'B' }, { 'id': 1, 'symbol': 'A' }]
+    previous, markers = self.sync(trades, fetch = self.fetcher([]))
+
+    fetched = []
+    self.sync(trades, { 'trades': previous }, { 'trades': markers }, self.fetcher(fetched), window = 1)
+    self.assertEqual(sorted(fetched), [1, 2])
+
+  def test_listing_hash_is_enough_without_fetch(self):
+    notes = [{ 'id': 2, 'notes': 'b' }, { 'id': 1, 'notes': 'a' }]
+    previous, markers = self.sync(notes)
+    objects, markers = self.sync([{ 'id': 2, 'notes': 'changed' }, { 'id': 1, 'notes': 'a' }], { 'trades': previous }, { 'trades': markers })
+    self.assertEqual(objects[0]['notes'], 'changed')
+    self.assertEqual(objects[1], notes[1])
+
+  def test_window_takes_the_rest_from_previous_backup(self):
+    trades = [{ 'id': i, 'updated_at': str(i) } for i in range(10, 0, -1)]
+    previous, markers = self.sync(trades, fetch = self.fetcher([]))
+
+    fetched = []
+    objects, markers = self.sync([{ 'id': 11, 'updated_at': '11' }] + trades, { 'trades': previous }, { 'trades': markers }, self.fetcher(fetched), window = 2)
+    self.assertEqual(fetched, [11])
+    self.assertEqual([o['id'] for o in objects], list(range(11, 0, -1)))
+    self.assertEqual(len(markers), 11)
+
+class TvBackupTestCase(unittest.TestCase):
+  """Runs tv-backup actions against a local stand-in server, in a scratch directory"""
+
+  def setUp(self):
+    self.dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.dir)
+    self.account = Account(300, journals = 10, notes = 5)
+    self.server = FakeTradervue(self.account).start()
+    self.addCleanup(self.server.stop)
+
+  def tv_backup(self, *argv):
+    argv = ['tv-backup'] + list(argv) + ['--username', 'tests', '--baseurl', self.server.baseurl, '--dir', self.dir, '--rate_limit', '0']
+    with unittest.mock.patch.object(sys, 'argv', argv), \
+         unittest.mock.patch.object(tv_backup, 'setup_logging', lambda debug: None), \
+         unittest.mock.patch.object(tv_backup.keyring, 'get_password', lambda service, username: 'tests'):
+      return tv_backup.main(argv)
+
+  def path(self, name):
+    return os.path.join(self.dir, name)
+
+class ResumeTest(TvBackupTestCase):
+  def crash_after(self, trades):
+    # Fails the backup once ``trades`` trades have been downloaded
+    download_trade = tv_backup.download_trade
+    calls = []
+    def crashing(tv, listed, details):
+      if len(calls) >= trades:
+        raise RuntimeError('simulated crash')
+      calls.append(listed['id'])
+      return download_trade(tv, listed, details)
+    return unittest.mock.patch.object(tv_backup, 'download_trade', crashing)
+
+  def counting(self, calls):
+    download_trade = tv_backup.download_trade
+    def counted(tv, listed, details):
+      calls.append(listed['id'])
+      return download_trade(tv, listed, details)
+    return unittest.mock.patch.object(tv_backup, 'download_trade', counted)
+
+  def backup_ids(self, name):
+    return [t['id'] for t in tv_backup.load_backup(self.path(name))['trades']]
+
+  def test_resume_after_crash(self):
+    with self.crash_after(150), self.assertRaises(RuntimeError):
+      self.tv_backup('backup', '--file', 'backup.json', '--jobs', '2', '--checkpoint_interval', '0')
+    self.assertFalse(os.path.exists(self.path('backup.json')))
+    self.assertTrue(os.path.exists(self.path('tradervue.checkpoint.json')))
+
+    calls = []
+    with self.counting(calls):
+      self.assertEqual(self.tv_backup('backup', '--resume', '--jobs', '2'), 0)
+
+    ids = self.backup_ids('backup.json')
+    self.assertEqual(sorted(ids), sorted(self.account.trade_id(i) for i in range(300)))
+    self.assertLess(len(calls), 300 - 100)
+    self.assertFalse(os.path.exists(self.path('tradervue.checkpoint.json')))
+
+  def test_resume_picks_up_trades_added_since_the_crash(self):
+    with self.crash_after(150), self.assertRaises(RuntimeError):
+      self.tv_backup('backup', '--file', 'backup.json', '--checkpoint_interval', '0')
+
+    # More trades than the old re-listing margin, listed ahead of everything the interrupted run saw
+    self.account.trades = 450
+    self.tv_backup('backup', '--resume')
+
+    ids = self.backup_ids('backup.json')
+    self.assertEqual(len(ids), len(set(ids)))
+    self.assertEqual(sorted(ids), sorted(self.account.trade_id(i) for i in range(450)))
+
+class NdjsonTest(TvBackupTestCase):
+  def test_index_is_used_as_written(self):
+    self.tv_backup('backup', '--file', 'backup.ndjson', '--format', 'ndjson')
+    with unittest.mock.patch.object(tv_backup.IndexedBackup, '_IndexedBackup__build_index', side_effect = AssertionError('index rebuilt')):
+      with tv_backup.IndexedBackup(self.path('backup.ndjson')) as backup:
+        self.assertEqual(backup.count('trades'), 300)
+        self.assertEqual(backup.get_trade(self.account.trade_id(7))['symbol'], self.account.trade(7)['symbol'])
+
+class SnapshotTest(TvBackupTestCase):
+  def test_snapshot_backup_and_restore_snapshot(self):
+    self.tv_backup('backup', '--file', 'plain.json')
+    self.tv_backup('backup', '--store', self.path('store'), '--file', 'first')
+    self.tv_backup('restore-snapshot', '--store', self.path('store'), '--snapshot', 'first')
+
+    with open(self.path('plain.json'), 'rb') as fh:
+      plain = fh.read()
+    with open(self.path('first.json'), 'rb') as fh:
+      self.assertEqual(fh.read(), plain)
+
+  def test_second_snapshot_only_adds_changes_and_gc(self):
+    store = tv_backup.SnapshotStore(self.path('store'))
+    self.tv_backup('backup', '--store', self.path('store'), '--file', 'first')
+    self.account.trades = 305
+    self.tv_backup('backup', '--store', self.path('store'), '--file', 'second')
+
+    summaries = dict((s['name'], s) for s in store.snapshots())
+    self.assertEqual(summaries['second']['counts']['trades'], 305)
+    self.assertEqual(summaries['second']['new_objects'], 5)
+
+    self.tv_backup('gc', '--store', self.path('store'), '--keep', '1')
+    self.assertEqual([s['name'] for s in store.snapshots()], ['second'])
+    self.assertEqual(len(store.load('second')['trades']), 305)
+
+class RestoreTest(TvBackupTestCase):
+  """The stand-in server doesn't keep what's restored, so these count what the restore sends it"""
+
+  def setUp(self):
+    super().setUp()
+    self.server.import_polls = 0
+    self.tv_backup('backup', '--file', 'backup.json')
+
+    # The account already matches the backup, except for the notes of every other trade
+    backup = tv_backup.load_backup(self.path('backup.json'))
+    for trade in backup['trades'][::2]:
+      trade['notes'] = 'Restored notes'
+    with open(self.path('backup.json'), 'w') as fh:
+      json.dump(backup, fh)
+    self.changed = sorted(trade['id'] for trade in backup['trades'][::2])
+    self.executions = sum(len(t['executions']) for t in backup['trades'])
+
+    self.batched = 0
+    self.imported = []
+    self.failed = []
+    self.updated = []
+
+  @contextlib.contextmanager
+  def recording(self, crash_imports_after = None, fail_imports_after = None, crash_updates_after = None):
+    # Records the imported chunks and the trade updates. The restore crashes, or a chunk's import fails, after the
+    # given number of them.
+    import_executions_batched = tv_backup.Tradervue.import_executions_batched
+    import_executions = tv_backup.Tradervue._Tradervue__import_executions
+    update_trade = tv_backup.Tradervue.update_trade
+    def batched(tv, executions, **kwargs):
+      self.batched += 1
+      return import_executions_batched(tv, executions, **kwargs)
+    def importing(tv, data, *args):
+      executions = len(json.loads(data)['executions'])
+      if crash_imports_after is not None and len(self.imported) >= crash_imports_after:
+        raise RuntimeError('simulated crash')
+      if fail_imports_after is not None and len(self.imported) >= fail_imports_after:
+        self.failed.append(executions)
+        return None
+      self.imported.append(executions)
+      return import_executions(tv, data, *args)
+    def updating(tv, trade_id, **kwargs):
+      if crash_updates_after is not None and len(self.updated) >= crash_updates_after:
+        raise RuntimeError('simulated crash')
+      self.updated.append(trade_id)
+      return update_trade(tv, trade_id, **kwargs)
+    with unittest.mock.patch.object(tv_backup.Tradervue, 'import_executions_batched', batched), \
+         unittest.mock.patch.object(tv_backup.Tradervue, '_Tradervue__import_executions', importing), \
+         unittest.mock.patch.object(tv_backup.Tradervue, 'update_trade', updating):
+      yield
+
+  def restore(self, *argv):
+    return self.tv_backup('restore', '--file', 'backup.json', '--import_rows', '400', '--jobs', '2', *argv)
+
+  def state(self):
+    with open(self.path('tradervue.restore.json')) as fh:
+      return json.load(fh)
+
+  def test_restore(self):
+    with self.recording():
+      self.restore()
+    self.assertEqual(self.batched, 1)
+    self.assertEqual(sum(self.imported), self.executions)
+    self.assertEqual(self.imported[:-1], [400] * (len(self.imported) - 1))
+    # Trades whose details already have the backup's notes aren't updated again
+    self.assertEqual(sorted(self.updated), self.changed)
+    self.assertFalse(os.path.exists(self.path('tradervue.restore.json')))
+
+  def test_resume_after_crash_during_import(self):
+    with self.recording(crash_imports_after = 2), self.assertRaises(RuntimeError):
+      self.restore()
+    self.assertEqual(self.imported, [400, 400])
+    self.assertEqual(self.updated, [])
+    self.assertEqual(self.state()['executions'], 800)
+
+    with self.recording():
+      self.restore('--resume')
+    # Only the executions the interrupted restore didn't import are imported again
+    self.assertEqual(sum(self.imported), self.executions)
+    self.assertEqual(sorted(self.updated), self.changed)
+    self.assertFalse(os.path.exists(self.path('tradervue.restore.json')))
+
+  def test_failed_import_stops_the_restore(self):
+    with self.recording(fail_imports_after = 1):
+      self.restore()
+    self.assertEqual((self.imported, self.failed), ([400], [400]))
+    self.assertEqual(self.updated, [])
+    self.assertEqual(self.state()['executions'], 400)
+
+    with self.recording():
+      self.restore('--resume')
+    self.assertEqual(self.imported[:2], [400, 400])
+    self.assertEqual(sum(self.imported), self.executions)
+    self.assertEqual(sorted(self.updated), self.changed)
+    self.assertFalse(os.path.exists(self.path('tradervue.restore.json')))
+
+  def test_resume_interrupted_trade_updates(self):
+    with self.recording(crash_updates_after = 50), self.assertRaises(RuntimeError):
+      self.restore()
+    self.assertEqual(sum(self.imported), self.executions)
+
+    del self.imported[:]
+    with self.recording():
+      self.restore('--resume')
+    self.assertEqual(self.imported, [])
+    self.assertEqual(sorted(set(self.updated)), self.changed)
+    self.assertFalse(os.path.exists(self.path('tradervue.restore.json')))
+
+  def test_resume_of_a_different_restore(self):
+    with self.recording(crash_imports_after = 1), self.assertRaises(RuntimeError):
+      self.restore()
+    self.tv_backup('backup', '--file', 'other.json')
+    with self.recording():
+      self.tv_backup('restore', '--file', 'other.json', '--resume')
+    self.assertEqual(self.imported, [400])
+    self.assertTrue(os.path.exists(self.path('tradervue.restore.json')))
+
+class DiffTest(TvBackupTestCase):
+  def diff(self, *argv):
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+      self.assertEqual(self.tv_backup('diff', *argv), 0)
+    return out.getvalue().splitlines()
+
+  def test_diff_backup_files(self):
+    self.tv_backup('backup', '--file', 'old.json')
+    self.account.trades = 302
+    self.tv_backup('backup', '--file', 'new.ndjson', '--format', 'ndjson')
+
+    lines = self.diff(self.path('old.json'), self.path('new.ndjson'), '--summary')
+    self.assertEqual([line.split()[:3] for line in lines[:2]], [['+', 'trade', self.account.trade_id(0)], ['+', 'trade', self.account.trade_id(1)]])
+    self.assertIn('trades: 2 added, 0 removed, 0 modified, 300 unchanged', lines)
+    self.assertIn('journals: 0 added, 0 removed, 0 modified, 10 unchanged', lines)
+
+  def test_diff_snapshots(self):
+    self.tv_backup('backup', '--store', self.path('store'), '--file', 'first')
+    self.account.trades = 301
+    self.tv_backup('backup', '--store', self.path('store'), '--file', 'second')
+
+    lines = self.diff('first', 'second', '--store', self.path('store'))
+    self.assertIn('trades: 1 added, 0 removed, 0 modified, 300 unchanged', lines)
+
+  def test_unknown_backup(self):
+    self.assertEqual(self.tv_backup('diff', self.path('missing.json'), self.path('other.json')), 1)
+
+if __name__ == '__main__':
+  unittest.main()
@@ -1 +1,12 @@
-from tradervue import Tradervue, TradervueLogFormatter
+from .tradervue import Tradervue, TradervueLogFormatter
+from .async_tradervue import AsyncTradervue
+from .cache import ObjectCache
+from .ratelimit import RateLimiter
+from .retry import RetryPolicy
+from .metrics import Metrics
+from .cassette import Cassette, CassetteError
+from .mirror import Mirror
+from .columnar import TradeColumns, ExecutionColumns
+from .records import Trade, Execution, Comment, JournalEntry, Note
+from .snapshots import SnapshotStore
+from .indexed import IndexedBackup
@@ -0,0 +1,740 @@
+# vim: filetype=python shiftwidth=2 tabstop=2 expandtab
+#
+# Copyright (c) 2015, Jon Nall
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of tradervue-utils nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+.. module:: async_tradervue
+   :platform: Unix, Windows
+   :synopsis: Implements the Tradervue API on top of asyncio
+
+.. moduleauthor:: Jon Nall <jon.nall@gmail.com>
+
+"""
+
+import asyncio
+import collections
+import gzip
+import logging
+import math
+import time
+
+try:
+  import aiohttp
+except ImportError:
+  aiohttp = None
+
+from . import codec
+from .metrics import Metrics
+from .ratelimit import RateLimiter
+from .records import Trade, JournalEntry, Note
+from .tradervue import Tradervue, Fore, color_text, _log_bad_http_response, _trades_query, _journals_query, _shape, _page_shaper, _import_payload, _check_import_status, _import_policies, _import_result, _import_header, _import_batches, _import_chunk, _import_summary, _endpoint, _replayed_headers
+
+# The subset of a response needed by the shared error handling in tradervue.py. The body is read eagerly so the
+# connection can go straight back to the pool.
+class _Response(collections.namedtuple('_Response', ['url', 'status_code', 'headers', 'content'])):
+  __slots__ = ()
+
+  @property
+  def text(self):
+    return self.content.decode('utf-8', 'replace')
+
+class AsyncTradervue:
+  """An asyncio version of :class:`~tradervue.tradervue.Tradervue`.
+
+     Every method of :class:`~tradervue.tradervue.Tradervue` that talks to the server is available here as a
+     coroutine with the same arguments and return values. Requests share a pooled ``aiohttp`` session, so many of them
+     can be in flight at once from a single event loop. Use the instance as an asynchronous context manager, or
+     ``await`` :meth:`close` when done with it.
+
+     Requires the ``aiohttp`` package.
+  """
+
+  MAX_ALLOWED_OBJECT_REQUEST = Tradervue.MAX_ALLOWED_OBJECT_REQUEST
+  MAX_OBJECTS_PER_REQUEST = Tradervue.MAX_OBJECTS_PER_REQUEST
+
+  def __init__(self, username, password, user_agent, target_user = None, baseurl = 'https://www.tradervue.com', verbose_http = False, pool_maxsize = 100, pool_maxsize_per_host = 0, max_workers = 16, session = None, rate_limiter = None, throttle_retries = 5, gzip_requests = False, metrics = None, cassette = None):
+    """Construct an AsyncTradervue instance.
+
+       :param str username: the Tradervue username
+       :param str password: the Tradervue password
+       :param str user_agent: the user agent to use in requests. Should be something like: ``MyApp (your@email.com)``
+       :param target_user: the user id to issues requests on behalf of. To be used by organization administrators (if the feature is enabled)
+       :param str baseurl: the organization's URL if using a local server
+       :param bool verbose_http: set to True for verbose dumping of HTTP requests and reponses (requires logging of DEBUG severity to be enabled)
+       :param int pool_maxsize: the maximum number of simultaneous connections. ``0`` means no limit.
+       :param int pool_maxsize_per_host: the maximum number of simultaneous connections to one host. ``0`` means no limit.
+       :param int max_workers: the number of concurrent requests used when fetching comments and executions for the results of :meth:`get_trades`, :meth:`get_journals` and :meth:`get_notes`
+       :param session: an existing ``aiohttp.ClientSession`` to use. If specified, the pool arguments are ignored and the session is not closed by :meth:`close`.
+       :param rate_limiter: the limiter every request passes through. By default this is shared with all other clients (synchronous or not) for the same ``username`` and ``baseurl``. Specify ``False`` to disable rate limiting.
+       :param int throttle_retries: the number of times a request the server throttled (HTTP 429 or 503) is retried
+       :param bool gzip_requests: set to True to gzip request bodies of at least ``Tradervue.GZIP_MIN_BYTES``. Only enable this if the server accepts compressed requests.
+       :param metrics: where request metrics are recorded. By default each client has its own :class:`~tradervue.metrics.Metrics`, available as the ``metrics`` attribute. Specify ``False`` to disable metrics.
+       :type target_user: str or None
+       :type session: aiohttp.ClientSession or None
+       :type rate_limiter: RateLimiter or None or False
+       :param cassette: record every request and response into this cassette, or answer requests from it, depending on its mode (see :class:`~tradervue.cassette.Cassette`). A replaying client never opens an HTTP session.
+       :type metrics: Metrics or None or False
+       :type cassette: Cassette or None
+       :return: the AsyncTradervue instance
+       :rtype: AsyncTradervue
+       :raises ImportError: if ``aiohttp`` isn't installed
+    """
+    if aiohttp is None:
+      raise ImportError("AsyncTradervue requires the aiohttp package")
+
+    self.username = username
+    self.password = password
+    self.user_agent = user_agent
+    self.target_user = target_user
+    self.baseurl = '/'.join([baseurl, 'api', 'v1'])
+    self.log = logging.getLogger('tradervue')
+    self.verbose_http = verbose_http
+    self.max_workers = max(1, int(max_workers))
+    self.rate_limiter = RateLimiter.shared(self.baseurl, username) if rate_limiter is None else (rate_limiter or None)
+    self.throttle_retries = throttle_retries
+    self.last_import_timing = None
+    self.gzip_requests = gzip_requests
+    self.metrics = Metrics() if metrics is None else (metrics or None)
+    self.cassette = cassette
+
+    self.__headers = { 'Accept': 'application/json',
+                       'Content-Type': 'application/json',
+                       'User-Agent': self.user_agent }
+    if self.target_user is not None:
+      self.__headers['Tradervue-UserId'] = self.target_user
+
+    self.__pool_maxsize = pool_maxsize
+    self.__pool_maxsize_per_host = pool_maxsize_per_host
+    self.__owns_session = session is None
+    self.session = session
+
+  async def __aenter__(self):
+    return self
+
+  async def __aexit__(self, exc_type, exc_value, traceback):
+    await self.close()
+    return False
+
+  async def close(self):
+    """Close the underlying HTTP session and release any pooled connections.
+
+       If a ``session`` was passed to the constructor it is left open; closing it is the caller's responsibility.
+    """
+    if self.__owns_session and self.session is not None:
+      await self.session.close()
+      self.session = None
+
+  def __get_session(self):
+    # aiohttp sessions must be created from within a running event loop, so this is deferred until the first request
+    if self.session is None:
+      connector = aiohttp.TCPConnector(limit = self.__pool_maxsize, limit_per_host = self.__pool_maxsize_per_host)
+      self.session = aiohttp.ClientSession(connector = connector, auth = aiohttp.BasicAuth(self.username, self.password), headers = self.__headers)
+    return self.session
+
+  # Simple wrappers for aiohttp API
+  async def __get   (self, url, params) : return await self.__make_request('GET',    url, params = params)
+  async def __put   (self, url, payload): return await self.__make_request('PUT',    url, payload)
+  async def __post  (self, url, payload): return await self.__make_request('POST',   url, payload)
+  async def __delete(self, url, payload): return await self.__make_request('DELETE', url, payload)
+
+  async def __make_request(self, method, url, payload = None, params = None):
+    # Payloads may arrive already encoded (see import_executions_batched)
+    if payload is not None and not isinstance(payload, bytes):
+      payload = codec.dumps(payload)
+
+    # aiohttp only accepts str query values
+    if params is not None:
+      params = dict((k, str(v)) for (k, v) in params.items())
+
+    verbose = self.verbose_http and self.log.isEnabledFor(logging.DEBUG)
+    if verbose:
+      self.log.debug(color_text(Fore.GREEN, "REQUEST:  url     %s" % (url)))
+      self.log.debug(color_text(Fore.GREEN, "          headers %s" % (self.__headers)))
+      self.log.debug(color_text(Fore.GREEN, "          user    %s" % (self.username)))
+      self.log.debug(color_text(Fore.GREEN, "          payload %s" % (payload if payload is None else payload.decode('utf-8'))))
+      self.log.debug(color_text(Fore.GREEN, "          params  %s" % (params)))
+
+    body = payload
+    headers = None
+    if self.gzip_requests and payload is not None and len(payload) >= Tradervue.GZIP_MIN_BYTES:
+      payload = gzip.compress(payload, compresslevel = 6)
+      headers = { 'Content-Encoding': 'gzip' }
+
+    endpoint = _endpoint(self.baseurl, url)
+    sent = 0 if payload is None else len(payload)
+    path = url[len(self.baseurl):]
+    replaying = self.cassette is not None and self.cassette.mode == 'replay'
+    recording = self.cassette is not None and self.cassette.mode == 'record'
+
+    attempt = 0
+    while True:
+      if self.rate_limiter is not None:
+        delay = self.rate_limiter.reserve()
+        if delay > 0:
+          await asyncio.sleep(delay)
+
+      start = time.perf_counter()
+      try:
+        if replaying:
+          interaction, delay = self.cassette.replay(method, path, params, body)
+          if delay > 0:
+            await asyncio.sleep(delay)
+          content = interaction.content
+          result = _Response(url, interaction.status, _replayed_headers(interaction), content)
+        else:
+          async with self.__get_session().request(method, url, data = payload, params = params, headers = headers) as r:
+            content = await r.read()
+            result = _Response(str(r.url), r.status, r.headers, content)
+      except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        if self.metrics is not None:
+          self.metrics.record(endpoint, method, type(e).__name__, time.perf_counter() - start, sent, 0, attempt > 0)
+        raise
+
+      if recording:
+        self.cassette.record(method, path, params, body, result.status_code, result.headers, content, time.perf_counter() - start)
+
+      if self.metrics is not None:
+        length = result.headers.get('Content-Length')
+        received = int(length) if length is not None else len(content)
+        self.metrics.record(endpoint, method, result.status_code, time.perf_counter() - start, sent, received, attempt > 0)
+
+      if verbose:
+        self.log.debug(color_text(Fore.GREEN, "RESPONSE: url     %s" % (result.url)))
+        self.log.debug(color_text(Fore.GREEN, "          code    %s" % (result.status_code)))
+        self.log.debug(color_text(Fore.GREEN, "          headers %s" % (result.headers)))
+        self.log.debug(color_text(Fore.GREEN, "          body    %s" % (result.text)))
+
+      throttled = result.status_code in RateLimiter.THROTTLE_STATUS_CODES
+      if self.rate_limiter is not None:
+        self.rate_limiter.on_response(result.status_code, result.headers.get('Retry-After'))
+      if not throttled or attempt >= self.throttle_retries:
+        return result
+
+      attempt += 1
+      self.log.warning("Request to %s was throttled (HTTP %d). Retrying (attempt %d of %d)" % (url, result.status_code, attempt, self.throttle_retries))
+      if self.rate_limiter is None:
+        await asyncio.sleep(RateLimiter.parse_retry_after(result.headers.get('Retry-After')) or 1)
+
+  def __handle_bad_http_response(self, r, msg, show_url = False):
+    _log_bad_http_response(self.log, r, msg, show_url, self.target_user)
+
+  async def __delete_object(self, key, object_id):
+    object_id = str(object_id)
+    url = '/'.join([self.baseurl, key, object_id])
+
+    r = await self.__delete(url, None)
+    if r.status_code == 200:
+      self.log.debug("%s-DELETE[%s]: %s" % (key.upper(), object_id, color_text(Fore.GREEN, 'SUCCESS')))
+      return True
+    else:
+      self.__handle_bad_http_response(r, "%s-DELETE[%s]: %s" % (key.upper(), object_id, color_text(Fore.RED, 'FAILED')))
+      return False
+
+  async def __create_object(self, key, user_identifier, data, return_url):
+    url = '/'.join([self.baseurl, key])
+
+    r = await self.__post(url, data)
+    if r.status_code == 201:
+      self.log.debug("%s-CREATE[%s]: %s" % (key.upper(), user_identifier, color_text(Fore.GREEN, 'SUCCESS')))
+      if return_url:
+        return r.headers['Location']
+      else:
+        payload = codec.loads(r.content)
+        return payload['id']
+    else:
+      self.__handle_bad_http_response(r, "%s-CREATE[%s]: %s" % (key.upper(), user_identifier, color_text(Fore.RED, 'FAILED')))
+      return None
+
+  async def __update_object(self, key, object_id, data):
+    object_id = str(object_id)
+
+    if len(data) == 0:
+      self.log.warning("No updates specified for %s ID %s. Not taking further action" % (key, object_id))
+      return False
+
+    url = '/'.join([self.baseurl, key, object_id])
+    r = await self.__put(url, data)
+    if r.status_code == 200:
+      self.log.debug("%s-UPDATE[%s]: (%s) %s" % (key.upper(), object_id, ' '.join(list(data.keys())), color_text(Fore.GREEN, 'SUCCESS')))
+      return True
+    else:
+      self.__handle_bad_http_response(r, "%s-UPDATE[%s]: (%s) %s" % (key.upper(), object_id, ' '.join(list(data.keys())), color_text(Fore.RED, 'FAILED')))
+      return False
+
+  async def __get_objects(self, key, data, result_key = None, max_objects = 25, object_offset = 0):
+    MAX_OBJECTS_PER_REQUEST = AsyncTradervue.MAX_OBJECTS_PER_REQUEST
+
+    max_objects = int(max_objects) # Check for valid value and not None
+
+    if max_objects > AsyncTradervue.MAX_ALLOWED_OBJECT_REQUEST:
+      raise ValueError("API doesn't allow more than %d objects to be returned from one call. Consider using the offset argument to get_%s()" % (AsyncTradervue.MAX_ALLOWED_OBJECT_REQUEST, key))
+
+    # See Tradervue.__get_objects for how the page, count and slice are chosen
+    start_index = int(object_offset % MAX_OBJECTS_PER_REQUEST)
+    end_index = None
+
+    last_object_index = start_index + max_objects
+    if last_object_index > MAX_OBJECTS_PER_REQUEST:
+      data['count'] = MAX_OBJECTS_PER_REQUEST
+    else:
+      data['count'] = last_object_index
+
+    data['page'] = int(math.floor((object_offset / MAX_OBJECTS_PER_REQUEST)))
+
+    objects = [] # Results returned to user
+
+    while True:
+      data['page'] += 1
+
+      if start_index == 0 and (max_objects - len(objects)) < MAX_OBJECTS_PER_REQUEST:
+        end_index = max_objects - len(objects)
+
+      cur_objects = await self.__get_object(key, None, None, result_key, data, start_index, end_index)
+      if cur_objects is None:
+        self.log.error("Found error condition when querying %s offset=%s [%s:%s]" % (data, object_offset, start_index, end_index))
+        return None
+      elif len(cur_objects) == 0:
+        self.log.debug("No objects were found when querying %s offset=%s [%s:%s]" % (data, object_offset, start_index, end_index))
+        break
+      else:
+        self.log.debug("%d object(s) were found when querying %s offset=%s [%s:%s]" % (len(cur_objects), data, object_offset, start_index, end_index))
+        objects.extend(cur_objects)
+        # We ran out of data, so don't query again
+        if len(cur_objects) < (data['count'] - start_index):
+          break
+        # We're done if we have the number of objects requested by the user
+        elif len(objects) >= max_objects:
+          break
+
+      start_index = 0 # This is only ever non-zero for the first iteration
+
+    self.log.debug("Returning %d object(s) for %s" % (len(objects), key.upper()))
+    return objects
+
+  async def __iter_objects(self, key, data, result_key, fetches, offset, shape_page = None):
+    page_size = AsyncTradervue.MAX_OBJECTS_PER_REQUEST
+
+    async def fetch_page(page_offset):
+      page = await self.__get_objects(key, dict(data), result_key, page_size, page_offset)
+      if page is not None and len(fetches) > 0:
+        await self.__fetch_sub_resources(key, page, fetches)
+      if page is not None and shape_page is not None:
+        # Projected away keys are dropped only once sub-resources (which need the IDs and counts) have been fetched
+        page = shape_page(page)
+      return page
+
+    pending = asyncio.ensure_future(fetch_page(offset))
+    try:
+      while pending is not None:
+        page = await pending
+        if page is None:
+          raise IOError("Unable to fetch %s at offset %d" % (key, offset))
+
+        offset += len(page)
+        pending = asyncio.ensure_future(fetch_page(offset)) if len(page) == page_size else None
+
+        for obj in page:
+          yield obj
+    finally:
+      if pending is not None:
+        pending.cancel()
+
+  async def __get_object(self, endpoint, fragments, object_id, result_key = None, data = None, start_index = 0, end_index = None):
+
+    if fragments is None: fragments = []
+
+    url_array = [self.baseurl, endpoint]
+    if object_id is not None: url_array.append(str(object_id))
+    url_array.extend(fragments)
+
+    url = '/'.join(url_array)
+    f_debug_string = '' if len(fragments) == 0 else '[%s]' % ('/'.join(fragments))
+
+    r = await self.__get(url, data)
+    if r.status_code == 200:
+      self.log.debug("%s-GET[%s]%s: %s" % (endpoint.upper(), object_id, f_debug_string, color_text(Fore.GREEN, 'SUCCESS')))
+      result = codec.loads(r.content)
+      if result_key is not None:
+        if result_key not in result:
+          self.log.error("Unable to find '%s' key in %s results: %s" % (result_key, endpoint, r.text))
+          return None
+        else:
+          result = result[result_key]
+    else:
+      self.__handle_bad_http_response(r, "%s-GET[%s]%s: %s" % (endpoint.upper(), object_id, f_debug_string, color_text(Fore.RED, 'FAILED')), show_url = True)
+      return None
+
+    # Only copy the list if a part of it was asked for
+    if isinstance(result, list) and (start_index > 0 or (end_index is not None and end_index < len(result))):
+      return result[start_index:end_index]
+    else:
+      return result
+
+  async def __fetch_sub_resources(self, key, objects, fetches):
+    # See Tradervue.__fetch_sub_resources. Concurrency is bounded by a semaphore instead of a thread pool.
+    semaphore = asyncio.Semaphore(self.max_workers)
+
+    async def fetch(obj, result_key, fetch_fn):
+      async with semaphore:
+        try:
+          result = await fetch_fn(obj['id'])
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+          # A timeout must not escape gather() and cancel the fetches that did succeed
+          return (None, str(e) or type(e).__name__)
+      if result is None:
+        return (None, 'request failed')
+      return (result, None)
+
+    jobs = []
+    for obj in objects:
+      for result_key, count_key, fetch_fn in fetches:
+        if int(obj[count_key]) > 0:
+          jobs.append((obj, result_key, fetch_fn))
+
+    results = await asyncio.gather(*[fetch(*job) for job in jobs])
+    for (obj, result_key, fetch_fn), (value, error) in zip(jobs, results):
+      if error is None:
+        obj[result_key] = value
+      else:
+        self.log.error("Unable to fetch %s for %s ID %s: %s" % (result_key, key, obj['id'], error))
+        obj.setdefault('fetch_errors', {})[result_key] = error
+
+  def __trade_fetches(self, include_comments, include_executions):
+    fetches = []
+    if include_comments: fetches.append(('comments', 'comment_count', self.get_trade_comments))
+    if include_executions: fetches.append(('executions', 'exec_count', self.get_trade_executions))
+    return fetches
+
+  async def create_trade(self, symbol, notes = None, initial_risk = None, shared = False, tags = [], return_url = False):
+    """Create a new trade. See :meth:`Tradervue.create_trade <tradervue.tradervue.Tradervue.create_trade>`.
+    """
+    data = { 'symbol': symbol, 'shared': shared }
+    if notes is not None: data['notes'] = notes
+    if initial_risk is not None: data['initial_risk'] = initial_risk
+    if tags is not None and len(tags) > 0: data['tags'] = tags
+
+    return await self.__create_object('trades', symbol, data, return_url)
+
+  async def delete_trade(self, trade_id):
+    """Delete the specified trade ID. See :meth:`Tradervue.delete_trade <tradervue.tradervue.Tradervue.delete_trade>`.
+    """
+    return await self.__delete_object('trades', trade_id)
+
+  async def get_trades(self, symbol = None, tag_expr = None, side = None, duration = None, startdate = None, enddate = None, winners = None, include_comments = False, include_executions = False, max_trades = 25, offset = 0, fields = None, records = False):
+    """Query for trades matching the specified criteria. See :meth:`Tradervue.get_trades <tradervue.tradervue.Tradervue.get_trades>`.
+    """
+    data = _trades_query(symbol, tag_expr, side, duration, startdate, enddate, winners)
+
+    all_trades = await self.__get_objects('trades', data, 'trades', max_trades, offset)
+
+    fetches = self.__trade_fetches(include_comments, include_executions)
+    if all_trades is not None and len(fetches) > 0:
+      await self.__fetch_sub_resources('trades', all_trades, fetches)
+
+    return _shape(all_trades, Trade, fetches, fields, records)
+
+  def iter_trades(self, symbol = None, tag_expr = None, side = None, duration = None, startdate = None, enddate = None, winners = None, include_comments = False, include_executions = False, offset = 0, fields = None, records = False):
+    """Lazily iterate over all trades matching the specified criteria. Use with ``async for``. See :meth:`Tradervue.iter_trades <tradervue.tradervue.Tradervue.iter_trades>`.
+    """
+    data = _trades_query(symbol, tag_expr, side, duration, startdate, enddate, winners)
+    fetches = self.__trade_fetches(include_comments, include_executions)
+    return self.__iter_objects('trades', data, 'trades', fetches, offset, _page_shaper(Trade, fetches, fields, records))
+
+  async def get_trade(self, trade_id):
+    """Get detailed information about the specified trade ID. See :meth:`Tradervue.get_trade <tradervue.tradervue.Tradervue.get_trade>`.
+    """
+    return await self.__get_object('trades', None, trade_id)
+
+  async def get_trade_executions(self, trade_id):
+    """Get the executions of the specified trade ID. See :meth:`Tradervue.get_trade_executions <tradervue.tradervue.Tradervue.get_trade_executions>`.
+    """
+    return await self.__get_object('trades', ['executions'], trade_id, 'executions')
+
+  async def get_trade_comments(self, trade_id):
+    """Get the comments of the specified trade ID. See :meth:`Tradervue.get_trade_comments <tradervue.tradervue.Tradervue.get_trade_comments>`.
+    """
+    return await self.__get_object('trades', ['comments'], trade_id, 'comments')
+
+  async def update_trade(self, trade_id, notes = None, shared = None, initial_risk = None, tags = None):
+    """Update fields of the specified trade ID. See :meth:`Tradervue.update_trade <tradervue.tradervue.Tradervue.update_trade>`.
+    """
+    data = {}
+    if notes is not None: data['notes'] = notes
+    if shared is not None: data['shared'] = shared
+    if initial_risk is not None: data['initial_risk'] = initial_risk
+    if tags is not None : data['tags'] = tags
+
+    return await self.__update_object('trades', trade_id, data)
+
+  async def import_status(self):
+    """Query status of the current import. See :meth:`Tradervue.import_status <tradervue.tradervue.Tradervue.import_status>`.
+    """
+    return _check_import_status(self.log, await self.__get_object('imports', None, None))
+
+  async def import_executions(self, executions, account_tag = None, tags = None, allow_duplicates = False, overlay_commissions = False, import_retries = None, wait_for_completion = False, wait_retries = None, secs_per_wait_retry = None, busy_policy = None, poll_policy = None):
+    """Import the specified trade executions. See :meth:`Tradervue.import_executions <tradervue.tradervue.Tradervue.import_executions>`.
+
+       Waiting between retries and status polls is done with ``asyncio.sleep``, so other tasks keep running.
+    """
+    data = _import_payload(executions, account_tag, tags, allow_duplicates, overlay_commissions)
+    (busy_policy, poll_policy) = _import_policies(import_retries, wait_retries, secs_per_wait_retry, busy_policy, poll_policy)
+
+    return await self.__import_executions(data, wait_for_completion, busy_policy, poll_policy)
+
+  async def import_executions_batched(self, executions, account_tag = None, tags = None, allow_duplicates = False, overlay_commissions = False, max_rows = 5000, max_bytes = 4 * 1024 * 1024, stop_on_error = False, busy_policy = None, poll_policy = None, on_chunk = None):
+    """Import a large number of trade executions as a sequence of smaller imports. See :meth:`Tradervue.import_executions_batched <tradervue.tradervue.Tradervue.import_executions_batched>`.
+
+       The next chunk is serialized in the default executor so the event loop isn't blocked.
+    """
+    header = _import_header(account_tag, tags, allow_duplicates, overlay_commissions, 'import_executions_batched')
+    (busy_policy, poll_policy) = _import_policies(None, None, None, busy_policy or Tradervue.IMPORT_BUSY_BACKOFF, poll_policy or Tradervue.IMPORT_POLL_BACKOFF)
+    batches = _import_batches(executions, header, max_rows, max_bytes)
+    loop = asyncio.get_running_loop()
+
+    start = time.time()
+    chunks = []
+    pending = loop.run_in_executor(None, next, batches, None)
+    while True:
+      batch = await pending
+      if batch is None:
+        break
+      pending = loop.run_in_executor(None, next, batches, None)
+
+      (count, body) = batch
+      result = await self.__import_executions(body, True, busy_policy, poll_policy)
+      chunk = _import_chunk(len(chunks), count, len(body), result, self.last_import_timing)
+      chunks.append(chunk)
+      self.log.debug("Import chunk %d (%d executions, %d bytes): %s" % (chunk['index'], count, len(body), chunk['status']))
+      if on_chunk is not None:
+        on_chunk(chunk)
+
+      if stop_on_error and chunk['status'] != 'succeeded':
+        self.log.error("Import chunk %d didn't succeed. Not importing the remaining executions." % (chunk['index']))
+        await pending
+        break
+
+    if len(chunks) == 0:
+      raise ValueError("Found 0 executions to import in import_executions_batched. Must specify at least 1")
+
+    return { 'chunks': chunks, 'summary': _import_summary(chunks, time.time() - start) }
+
+  async def __import_executions(self, data, wait_for_completion, busy_policy, poll_policy):
+    url = '/'.join([self.baseurl, 'imports'])
+    timing = self.last_import_timing = { 'submit_seconds': 0.0, 'submit_attempts': 0, 'wait_seconds': 0.0, 'polls': 0 }
+
+    import_posted = False
+    busy = busy_policy.start()
+    while True:
+      r = await self.__post(url, data)
+      timing['submit_attempts'] += 1
+      if r.status_code == 200:
+        result = codec.loads(r.content)
+        status = result['status']
+        if not status in ['queued']:
+          self.log.error("Unexpected status '%s' from importing executions: %s" % (status, r.text))
+          return False
+        else:
+          self.log.debug("Import request successful: %s" % (r.text))
+          import_posted = True
+          break
+      elif r.status_code == 424:
+        result = codec.loads(r.content)
+        delay = busy.next_delay()
+        if delay is None:
+          break
+        self.log.warning("Waiting %.1f seconds and retrying import: %s" % (delay, result['error']))
+        await asyncio.sleep(delay)
+      else:
+        self.__handle_bad_http_response(r, "Unable to import executions")
+        return False
+    timing['submit_seconds'] = busy.elapsed()
+
+    if not import_posted:
+      self.log.error("Unable to import executions after %d attempts (%.1f seconds). Giving up." % (timing['submit_attempts'], timing['submit_seconds']))
+      return False
+    elif wait_for_completion:
+      self.log.debug("Waiting for import to complete...")
+
+      poll = poll_policy.start()
+      result = await self.import_status()
+      timing['polls'] += 1
+
+      while result is not None and (result['status'] == 'queued' or result['status'] == 'processing'):
+        delay = poll.next_delay()
+        if delay is None:
+          break
+        await asyncio.sleep(delay)
+        result = await self.import_status()
+        timing['polls'] += 1
+      timing['wait_seconds'] = poll.elapsed()
+
+      self.log.debug("Import submitted in %.1f seconds (%d attempts) and processed in %.1f seconds (%d polls)" % (timing['submit_seconds'], timing['submit_attempts'], timing['wait_seconds'], timing['polls']))
+      return _import_result(self.log, result, timing['polls'], timing['wait_seconds'])
+    else:
+      self.log.debug("Import submitted in %.1f seconds (%d attempts)" % (timing['submit_seconds'], timing['submit_attempts']))
+      return True
+
+  async def get_users(self):
+    """Get the list of users for the organization. See :meth:`Tradervue.get_users <tradervue.tradervue.Tradervue.get_users>`.
+    """
+    return await self.__get_object('users', None, None, 'users')
+
+  async def get_user(self, user_id):
+    """Get detailed information about the specified user ID. See :meth:`Tradervue.get_user <tradervue.tradervue.Tradervue.get_user>`.
+    """
+    return await self.__get_object('users', None, user_id, 'users')
+
+  async def update_user(self, user_id, username = None, email = None, plan = None):
+    """Update fields for the specified user ID. See :meth:`Tradervue.update_user <tradervue.tradervue.Tradervue.update_user>`.
+    """
+    data = {}
+    if username is not None: data['username'] = username
+    if email is not None: data['plan'] = email
+    if plan is not None: data['plan'] = plan
+
+    return await self.__update_object('users', user_id, data)
+
+  async def create_user(self, username, email, plan, password, trial_end = None, return_url = False):
+    """Create a new user. See :meth:`Tradervue.create_user <tradervue.tradervue.Tradervue.create_user>`.
+    """
+    data = { 'username': username, 'plan': plan, 'email': email, 'password': password }
+    if trial_end is not None: data['trial_end'] = trial_end.strftime('%Y-%m-%d')
+
+    return await self.__create_object('users', username, data, return_url)
+
+  async def get_journals(self, date = None, startdate = None, enddate = None, include_comments = False, max_journals = 25, offset = 0, fields = None, records = False):
+    """Query for journal entries matching the specified criteria. See :meth:`Tradervue.get_journals <tradervue.tradervue.Tradervue.get_journals>`.
+    """
+    data = _journals_query(date, startdate, enddate)
+
+    all_journals = await self.__get_objects('journal', data, 'journal_entries', max_journals, offset)
+
+    fetches = [('comments', 'comment_count', self.get_journal_comments)] if include_comments else []
+    if all_journals is not None and len(fetches) > 0:
+      await self.__fetch_sub_resources('journal', all_journals, fetches)
+
+    return _shape(all_journals, JournalEntry, fetches, fields, records)
+
+  def iter_journals(self, date = None, startdate = None, enddate = None, include_comments = False, offset = 0, fields = None, records = False):
+    """Lazily iterate over all journal entries matching the specified criteria. Use with ``async for``. See :meth:`Tradervue.iter_journals <tradervue.tradervue.Tradervue.iter_journals>`.
+    """
+    data = _journals_query(date, startdate, enddate)
+    fetches = [('comments', 'comment_count', self.get_journal_comments)] if include_comments else []
+    return self.__iter_objects('journal', data, 'journal_entries', fetches, offset, _page_shaper(JournalEntry, fetches, fields, records))
+
+  async def get_journal(self, journal_id = None, date = None):
+    """Get detailed information about the specified journal ID (or the journal on the specified date). See :meth:`Tradervue.get_journal <tradervue.tradervue.Tradervue.get_journal>`.
+    """
+    if journal_id is not None and date is not None:
+      raise ValueError("Must not specify both journal_id and date to get_journal")
+    elif journal_id is None and date is None:
+      raise ValueError("Must specify either journal_id or date to get_journal")
+
+    if journal_id is not None:
+      return await self.__get_object('journal', None, journal_id)
+    else:
+      journals = await self.get_journals(date = date, max_journals = 1)
+      if journals is None or len(journals) == 0:
+        return None
+      else:
+        return await self.get_journal(journals[0]['id'])
+
+  async def get_journal_comments(self, journal_id):
+    """Get the comments of the specified journal entry ID. See :meth:`Tradervue.get_journal_comments <tradervue.tradervue.Tradervue.get_journal_comments>`.
+    """
+    return await self.__get_object('journal', ['comments'], journal_id, 'comments')
+
+  async def update_journal(self, journal_id, notes = None):
+    """Update fields of the specified journal ID. See :meth:`Tradervue.update_journal <tradervue.tradervue.Tradervue.update_journal>`.
+    """
+    data = {}
+    if notes is not None: data['notes'] = notes
+
+    return await self.__update_object('journal', journal_id, data)
+
+  async def create_journal(self, date, notes = None, return_url = False):
+    """Create a new journal entry. See :meth:`Tradervue.create_journal <tradervue.tradervue.Tradervue.create_journal>`.
+    """
+    data = { 'date': date.strftime('%Y-%m-%d') }
+    if notes is not None: data['notes'] = notes
+
+    return await self.__create_object('journal', data['date'], data, return_url)
+
+  async def delete_journal(self, journal_id):
+    """Delete the specified journal ID. See :meth:`Tradervue.delete_journal <tradervue.tradervue.Tradervue.delete_journal>`.
+    """
+    return await self.__delete_object('journal', journal_id)
+
+  async def get_notes(self, include_comments = False, max_notes = 25, offset = 0, fields = None, records = False):
+    """Query for journal notes. See :meth:`Tradervue.get_notes <tradervue.tradervue.Tradervue.get_notes>`.
+    """
+    all_notes = await self.__get_objects('notes', {}, 'journal_notes', max_notes, offset)
+
+    fetches = [('comments', 'comment_count', self.get_note_comments)] if include_comments else []
+    if all_notes is not None and len(fetches) > 0:
+      await self.__fetch_sub_resources('notes', all_notes, fetches)
+
+    return _shape(all_notes, Note, fetches, fields, records)
+
+  def iter_notes(self, include_comments = False, offset = 0, fields = None, records = False):
+    """Lazily iterate over all journal notes. Use with ``async for``. See :meth:`Tradervue.iter_notes <tradervue.tradervue.Tradervue.iter_notes>`.
+    """
+    fetches = [('comments', 'comment_count', self.get_note_comments)] if include_comments else []
+    return self.__iter_objects('notes', {}, 'journal_notes', fetches, offset, _page_shaper(Note, fetches, fields, records))
+
+  async def get_note(self, note_id):
+    """Get detailed information about the specified journal note ID. See :meth:`Tradervue.get_note <tradervue.tradervue.Tradervue.get_note>`.
+    """
+    return await self.__get_object('notes', None, note_id)
+
+  async def get_note_comments(self, note_id):
+    """Get the comments of the specified note ID. See :meth:`Tradervue.get_note_comments <tradervue.tradervue.Tradervue.get_note_comments>`.
+    """
+    return await self.__get_object('notes', ['comments'], note_id, 'comments')
+
+  async def update_note(self, note_id, notes = None):
+    """Update fields of the specified journal note ID. See :meth:`Tradervue.update_note <tradervue.tradervue.Tradervue.update_note>`.
+    """
+    data = {}
+    if notes is not None: data['notes'] = notes
+
+    return await self.__update_object('notes', note_id, data)
+
+  async def create_note(self, notes = None, return_url = False):
+    """Create a new journal note entry. See :meth:`Tradervue.create_note <tradervue.tradervue.Tradervue.create_note>`.
+    """
+    data = {}
+    if notes is not None: data['notes'] = notes
+
+    return await self.__create_object('notes', '', data, return_url)
+
+  async def delete_note(self, note_id):
+    """Delete the specified journal note ID. See :meth:`Tradervue.delete_note <tradervue.tradervue.Tradervue.delete_note>`.
+    """
+    return await self.__delete_object('notes', note_id)
@@ -0,0 +1,190 @@
+# vim: filetype=python shiftwidth=2 tabstop=2 expandtab
+#
+# Copyright (c) 2015, Jon Nall
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of tradervue-utils nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+.. module:: cache
+   :platform: Unix, Windows
+   :synopsis: In-process object cache for the Tradervue API
+
+.. moduleauthor:: Jon Nall <jon.nall@gmail.com>
+
+"""
+
+import collections
+import threading
+import time
+
+class ObjectCache:
+  """A thread-safe LRU cache of Tradervue API responses with a TTL and a memory bound.
+
+     Entries are keyed by a tuple whose first two items are the endpoint and object ID, e.g. ``('trades', '1234')`` or
+     ``('trades', '1234', 'executions')``. All entries sharing an endpoint and object ID form a group which is
+     invalidated together when the object is modified.
+
+     Pass an instance to the ``cache`` argument of :class:`~tradervue.tradervue.Tradervue` to enable caching. One
+     instance may be shared by several clients.
+  """
+
+  def __init__(self, max_entries = 10000, max_bytes = 64 * 1024 * 1024, ttl = 300):
+    """Construct an ObjectCache instance.
+
+       :param int max_entries: the maximum number of entries to keep. The least recently used entries are evicted first.
+       :param int max_bytes: the maximum total size of the cached values (as reported to :meth:`put`)
+       :param ttl: the number of seconds an entry stays valid. ``None`` disables expiry.
+       :type ttl: float or None
+       :return: the ObjectCache instance
+       :rtype: ObjectCache
+    """
+    self.max_entries = max_entries
+    self.max_bytes = max_bytes
+    self.ttl = ttl
+
+    self.hits = 0
+    self.misses = 0
+    self.evictions = 0
+    self.expirations = 0
+    self.invalidations = 0
+
+    self.__lock = threading.Lock()
+    self.__entries = collections.OrderedDict() # key -> (value, size, expires)
+    self.__groups = {}                         # (endpoint, object_id) -> set of keys
+    self.__generations = {}                    # (endpoint, object_id) or endpoint -> invalidation count
+    self.__bytes = 0
+
+  def __remove(self, key):
+    value, size, expires = self.__entries.pop(key)
+    self.__bytes -= size
+    group = self.__groups[key[:2]]
+    group.discard(key)
+    if len(group) == 0:
+      del self.__groups[key[:2]]
+
+  def token(self, key):
+    """Return a token to pass to :meth:`put` for ``key``.
+
+       Take the token before issuing the request whose result will be cached. If the object is invalidated while the
+       request is in flight, the token becomes stale and :meth:`put` discards the (possibly outdated) value.
+    """
+    with self.__lock:
+      return (self.__generations.get(key[0], 0), self.__generations.get(key[:2], 0))
+
+  def get(self, key):
+    """Return the cached value for ``key`` or ``None`` if it isn't cached (or has expired).
+    """
+    with self.__lock:
+      entry = self.__entries.get(key)
+      if entry is None:
+        self.misses += 1
+        return None
+
+      value, size, expires = entry
+      if expires is not None and expires < time.time():
+        self.__remove(key)
+        self.expirations += 1
+        self.misses += 1
+        return None
+
+      self.__entries.move_to_end(key)
+      self.hits += 1
+      return value
+
+  def put(self, key, value, size, token = None):
+    """Cache ``value`` under ``key``.
+
+       :param tuple key: the cache key. The first two items must be the endpoint and object ID.
+       :param value: the value to cache
+       :param int size: the size of ``value`` in bytes, counted against ``max_bytes``
+       :param token: the result of :meth:`token` taken before ``value`` was fetched. If specified and the key was invalidated since, the value isn't cached.
+       :return: ``True`` if the value was cached
+       :rtype: bool
+    """
+    if size > self.max_bytes:
+      return False
+
+    with self.__lock:
+      if token is not None and token != (self.__generations.get(key[0], 0), self.__generations.get(key[:2], 0)):
+        return False
+
+      if key in self.__entries:
+        self.__remove(key)
+
+      expires = None if self.ttl is None else time.time() + self.ttl
+      self.__entries[key] = (value, size, expires)
+      self.__groups.setdefault(key[:2], set()).add(key)
+      self.__bytes += size
+
+      while len(self.__entries) > self.max_entries or self.__bytes > self.max_bytes:
+        self.__remove(next(iter(self.__entries)))
+        self.evictions += 1
+      return True
+
+  def invalidate(self, endpoint, object_id = None):
+    """Drop cached entries for the specified object, or for every object of ``endpoint`` if ``object_id`` is ``None``.
+    """
+    with self.__lock:
+      if object_id is None:
+        self.__generations[endpoint] = self.__generations.get(endpoint, 0) + 1
+        groups = [g for g in self.__groups if g[0] == endpoint]
+      else:
+        group = (endpoint, str(object_id))
+        self.__generations[group] = self.__generations.get(group, 0) + 1
+        groups = [group] if group in self.__groups else []
+
+      for group in groups:
+        for key in list(self.__groups[group]):
+          self.__remove(key)
+          self.invalidations += 1
+
+  def clear(self):
+    """Drop all cached entries. The hit/miss counters are left alone.
+    """
+    with self.__lock:
+      for group in self.__groups:
+        self.__generations[group] = self.__generations.get(group, 0) + 1
+      self.__entries.clear()
+      self.__groups.clear()
+      self.__bytes = 0
+
+  def stats(self):
+    """Return a snapshot of the cache counters.
+
+       :return: a dict with ``hits``, ``misses``, ``hit_rate``, ``evictions``, ``expirations``, ``invalidations``, ``entries`` and ``bytes`` keys
+       :rtype: dict
+    """
+    with self.__lock:
+      lookups = self.hits + self.misses
+      return { 'hits': self.hits,
+               'misses': self.misses,
+               'hit_rate': float(self.hits) / lookups if lookups > 0 else 0.0,
+               'evictions': self.evictions,
+               'expirations': self.expirations,
+               'invalidations': self.invalidations,
+               'entries': len(self.__entries),
+               'bytes': self.__bytes }
@@ -0,0 +1,190 @@
+# vim: filetype=python shiftwidth=2 tabstop=2 expandtab
+#
+# Copyright (c) 2015, Jon Nall
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of tradervue-utils nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+.. module:: cassette
+   :platform: Unix, Windows
+   :synopsis: Record and replay of Tradervue API traffic
+
+.. moduleauthor:: Jon Nall <jon.nall@gmail.com>
+
+"""
+
+import base64
+import collections
+import gzip
+import hashlib
+import json
+import threading
+
+class CassetteError(IOError):
+  """Raised when a replayed request has no recorded response.
+  """
+  pass
+
+"""A recorded response: the HTTP status, a dict of headers, the body as bytes and the seconds the server took
+"""
+Interaction = collections.namedtuple('Interaction', ['status', 'headers', 'content', 'elapsed'])
+
+class Cassette:
+  """Records the requests a client issues along with the server's responses, and serves them back later without a
+     network.
+
+     Pass an instance to the ``cassette`` argument of :class:`~tradervue.tradervue.Tradervue` or
+     :class:`~tradervue.async_tradervue.AsyncTradervue`. In ``'record'`` mode every request is sent as usual and the
+     exchange is appended to the cassette file. In ``'replay'`` mode no request leaves the process; each one is
+     answered with the next recorded response for the same method, path, query and body. Repeated requests (e.g.
+     import status polls) get their recorded responses in order, the last one being reused once they run out.
+
+     Cassettes are gzip-compressed JSON lines, one exchange per line. Paths are stored relative to the client's
+     ``baseurl`` so a cassette recorded against one server can be replayed with any ``baseurl``.
+  """
+
+  """Response headers that aren't recorded. They either vary between runs or no longer apply to the stored body.
+  """
+  SKIPPED_HEADERS = frozenset(['connection', 'content-encoding', 'content-length', 'date', 'keep-alive', 'server', 'set-cookie', 'transfer-encoding'])
+
+  def __init__(self, path, mode = 'replay', latency = None):
+    """Construct a Cassette instance.
+
+       :param str path: the cassette file
+       :param str mode: ``'record'`` to (over)write the file from live traffic or ``'replay'`` to serve responses from it
+       :param latency: the simulated server time for each replayed response. ``None`` answers immediately, a number waits that many seconds and ``'recorded'`` waits as long as the server took when the cassette was recorded.
+       :type latency: None or float or str
+       :return: the Cassette instance
+       :rtype: Cassette
+    """
+    if mode not in ('record', 'replay'):
+      raise ValueError("Cassette mode must be 'record' or 'replay', not '%s'" % (mode))
+
+    self.path = path
+    self.mode = mode
+    self.latency = latency
+
+    self.__lock = threading.Lock()
+    self.__file = None
+    self.__interactions = {} # request key -> deque of Interaction
+    self.__last = {}         # request key -> the most recently served Interaction
+
+    if mode == 'replay':
+      self.__load()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    self.close()
+    return False
+
+  def close(self):
+    """Finish writing a recorded cassette.
+    """
+    with self.__lock:
+      if self.__file is not None:
+        self.__file.close()
+        self.__file = None
+
+  @staticmethod
+  def __key(method, path, params, payload):
+    query = sorted((str(k), str(v)) for (k, v) in params.items() if v is not None) if params else []
+    digest = hashlib.sha1(payload).hexdigest() if payload else None
+    return json.dumps([method, path, query, digest])
+
+  def __load(self):
+    with gzip.open(self.path, 'rt', encoding = 'utf-8') as fh:
+      for line in fh:
+        entry = json.loads(line)
+        if 'body_b64' in entry:
+          content = base64.b64decode(entry['body_b64'])
+        else:
+          content = entry['body'].encode('utf-8')
+        interaction = Interaction(entry['status'], entry['headers'], content, entry['elapsed'])
+        self.__interactions.setdefault(entry['key'], collections.deque()).append(interaction)
+
+  def record(self, method, path, params, payload, status, headers, content, elapsed):
+    """Append one exchange to the cassette. Clients call this in ``'record'`` mode.
+
+       :param str method: the HTTP method
+       :param str path: the request URL relative to the client's ``baseurl``
+       :param params: the query parameters
+       :param payload: the encoded request body
+       :param int status: the HTTP status of the response
+       :param headers: the response headers
+       :param bytes content: the (decoded) response body
+       :param float elapsed: the seconds the server took to respond
+       :type params: dict or None
+       :type payload: bytes or None
+    """
+    entry = { 'key': Cassette.__key(method, path, params, payload),
+              'status': status,
+              'headers': dict((k, v) for (k, v) in headers.items() if k.lower() not in Cassette.SKIPPED_HEADERS),
+              'elapsed': round(elapsed, 4) }
+    try:
+      entry['body'] = content.decode('utf-8')
+    except UnicodeDecodeError:
+      entry['body_b64'] = base64.b64encode(content).decode('ascii')
+    line = json.dumps(entry, separators = (',', ':')) + '\n'
+
+    with self.__lock:
+      if self.__file is None:
+        self.__file = gzip.open(self.path, 'wt', encoding = 'utf-8')
+      self.__file.write(line)
+
+  def replay(self, method, path, params, payload):
+    """Return the recorded response to a request. Clients call this in ``'replay'`` mode.
+
+       :param str method: the HTTP method
+       :param str path: the request URL relative to the client's ``baseurl``
+       :param params: the query parameters
+       :param payload: the encoded request body
+       :type params: dict or None
+       :type payload: bytes or None
+       :return: the response and the number of seconds to wait before returning it
+       :rtype: tuple(Interaction, float)
+       :raises CassetteError: if the request wasn't recorded
+    """
+    key = Cassette.__key(method, path, params, payload)
+    with self.__lock:
+      queue = self.__interactions.get(key)
+      if queue:
+        interaction = self.__last[key] = queue.popleft()
+      elif key in self.__last:
+        interaction = self.__last[key]
+      else:
+        raise CassetteError("No recorded response for %s %s (query %s) in cassette %s" % (method, path, params, self.path))
+
+    if self.latency is None:
+      delay = 0.0
+    elif self.latency == 'recorded':
+      delay = interaction.elapsed
+    else:
+      delay = float(self.latency)
+    return (interaction, delay)
@@ -0,0 +1,248 @@
+# vim: filetype=python shiftwidth=2 tabstop=2 expandtab
+#
+# Copyright (c) 2015, Jon Nall
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of tradervue-utils nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+.. module:: codec
+   :platform: Unix, Windows
+   :synopsis: JSON encoding and decoding for Tradervue API requests
+
+.. moduleauthor:: Jon Nall <jon.nall@gmail.com>
+
+"""
+
+import codecs
+import json
+import re
+
+try:
+  import orjson
+except ImportError:
+  orjson = None
+
+try:
+  import ujson
+except ImportError:
+  ujson = None
+
+def _json_dumps(obj):
+  return json.dumps(obj, separators = (',', ':')).encode('utf-8')
+
+def _orjson_dumps(obj):
+  return orjson.dumps(obj)
+
+def _ujson_dumps(obj):
+  return ujson.dumps(obj, ensure_ascii = False).encode('utf-8')
+
+# name -> (dumps, loads). Every loads accepts UTF-8 bytes as well as str.
+_BACKENDS = { 'json': (_json_dumps, json.loads) }
+if ujson is not None: _BACKENDS['ujson'] = (_ujson_dumps, ujson.loads)
+if orjson is not None: _BACKENDS['orjson'] = (_orjson_dumps, orjson.loads)
+
+"""The name of the JSON backend in use. The fastest installed one is picked by default: ``'orjson'``, then ``'ujson'``, then the standard library's ``'json'``
+"""
+BACKEND = 'orjson' if orjson is not None else ('ujson' if ujson is not None else 'json')
+
+dumps, loads = _BACKENDS[BACKEND]
+
+def available_backends():
+  """Return the names of the JSON backends that are installed.
+
+     :rtype: list
+  """
+  return sorted(_BACKENDS.keys())
+
+def use_backend(name):
+  """Select the JSON backend used to encode request bodies and decode responses.
+
+     :param str name: one of the names returned by :func:`available_backends`
+     :raises ValueError: if the backend isn't installed
+  """
+  global BACKEND, dumps, loads
+  if name not in _BACKENDS:
+    raise ValueError("JSON backend '%s' isn't available. Choose one of: %s" % (name, ', '.join(available_backends())))
+  BACKEND = name
+  dumps, loads = _BACKENDS[name]
+
+_DECODER = json.JSONDecoder()
+
+# What may follow the part of a number that has been read so far without ending it, e.g. '.' in '12.'
+_NUMBER_TAIL = re.compile(r'[0-9.eE+-]*\Z')
+
+class _TextReader:
+  """Decodes a stream of UTF-8 byte chunks into a buffer that JSON values can be read from one at a time.
+  """
+
+  def __init__(self, chunks):
+    self.__chunks = iter(chunks)
+    self.__decoder = codecs.getincrementaldecoder('utf-8')()
+    self.__buf = ''
+    self.__pos = 0
+    self.__eof = False
+
+  def __fill(self):
+    if self.__eof:
+      return False
+
+    # Drop what has already been consumed so the buffer only ever holds the value being decoded
+    self.__buf = self.__buf[self.__pos:]
+    self.__pos = 0
+    for chunk in self.__chunks:
+      if len(chunk) > 0:
+        self.__buf += self.__decoder.decode(chunk)
+        return True
+
+    self.__buf += self.__decoder.decode(b'', True)
+    self.__eof = True
+    return False
+
+  def peek(self):
+    """Skip whitespace and return the next character, or ``None`` at the end of the stream.
+    """
+    while True:
+      buf = self.__buf
+      while self.__pos < len(buf) and buf[self.__pos] in ' \t\n\r':
+        self.__pos += 1
+      if self.__pos < len(buf):
+        return buf[self.__pos]
+      if not self.__fill():
+        return None
+
+  def take(self, char):
+    """Consume ``char``, which must be the next non-whitespace character.
+    """
+    found = self.peek()
+    if found != char:
+      raise ValueError("Expected '%s' but found %s" % (char, 'end of data' if found is None else "'%s'" % (found)))
+    self.__pos += 1
+
+  def value(self):
+    """Decode and return the next JSON value.
+    """
+    self.peek()
+    while True:
+      try:
+        obj, end = _DECODER.raw_decode(self.__buf, self.__pos)
+      except ValueError:
+        # The value may just be cut off at the end of the buffer
+        if self.__fill():
+          continue
+        raise
+
+      # A number at the very end of the buffer may continue in the next chunk, even if the buffer ends in a partial
+      # fraction or exponent ('12.', '1e') that the decoder stopped short of
+      if end == len(self.__buf) or (isinstance(obj, (int, float)) and _NUMBER_TAIL.match(self.__buf, end)):
+        if self.__fill():
+          continue
+
+      self.__pos = end
+      return obj
+
+def iter_array(chunks, key):
+  """Incrementally decode the array stored under ``key`` in a JSON object, e.g. the ``trades`` of a page of trades.
+
+     Elements are yielded as soon as they have been read, so the full document is never held in memory. Other keys
+     of the object are decoded and discarded. Once the last element has been yielded the rest of the object is read
+     up to its closing brace.
+
+     :param chunks: the UTF-8 encoded document, e.g. ``response.iter_content(65536)``
+     :param str key: the top-level key of the array
+     :type chunks: iterable of bytes
+     :raises KeyError: if the object has no ``key``
+     :raises ValueError: if the document isn't valid JSON or ``key`` isn't an array
+     :rtype: generator
+  """
+  reader = _TextReader(chunks)
+  reader.take('{')
+  if reader.peek() == '}':
+    raise KeyError(key)
+
+  while True:
+    name = reader.value()
+    reader.take(':')
+    if name != key:
+      reader.value()
+      if reader.peek() == '}':
+        raise KeyError(key)
+      reader.take(',')
+      continue
+
+    reader.take('[')
+    if reader.peek() != ']':
+      while True:
+        yield reader.value()
+        if reader.peek() == ']':
+          break
+        reader.take(',')
+    reader.take(']')
+    break
+
+  # Read through the end of the object, so a response it came from has been consumed entirely
+  while reader.peek() == ',':
+    reader.take(',')
+    reader.value()
+    reader.take(':')
+    reader.value()
+  reader.take('}')
+
+def iter_arrays(chunks):
+  """Incrementally decode every array stored in a JSON object, e.g. all the sections of a tv-backup file.
+
+     Like :func:`iter_array`, elements are yielded as soon as they have been read. Keys whose values aren't arrays are
+     decoded and discarded.
+
+     :param chunks: the UTF-8 encoded document
+     :type chunks: iterable of bytes
+     :return: a generator of ``(key, element)`` tuples, in document order
+     :raises ValueError: if the document isn't a valid JSON object
+     :rtype: generator
+  """
+  reader = _TextReader(chunks)
+  reader.take('{')
+  if reader.peek() == '}':
+    return
+
+  while True:
+    name = reader.value()
+    reader.take(':')
+    if reader.peek() != '[':
+      reader.value()
+    else:
+      reader.take('[')
+      if reader.peek() != ']':
+        while True:
+          yield (name, reader.value())
+          if reader.peek() == ']':
+            break
+          reader.take(',')
+      reader.take(']')
+
+    if reader.peek() == '}':
+      return
+    reader.take(',')
@@ -0,0 +1,398 @@
+# vim: filetype=python shiftwidth=2 tabstop=2 expandtab
+#
+# Copyright (c) 2015, Jon Nall
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of tradervue-utils nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+.. module:: columnar
+   :platform: Unix, Windows
+   :synopsis: Columnar NumPy views of trades and executions for vectorized analytics
+
+.. moduleauthor:: Jon Nall <jon.nall@gmail.com>
+
+"""
+
+import re
+
+try:
+  import numpy
+except ImportError:
+  numpy = None
+
+def _require_numpy():
+  if numpy is None:
+    raise ImportError("tradervue.columnar requires the numpy package")
+
+_TZ_SUFFIX = re.compile(r'^(?:\.\d+)?(?:(Z)|([+-])(\d\d):?(\d\d))?$')
+
+def _offset(suffix):
+  # The UTC offset in seconds of the part of an ISO 8601 timestamp after the seconds field
+  match = _TZ_SUFFIX.match(suffix)
+  if match is None or match.group(2) is None:
+    return 0
+  seconds = int(match.group(3)) * 3600 + int(match.group(4)) * 60
+  return -seconds if match.group(2) == '-' else seconds
+
+def _timestamps(values):
+  """Convert ISO 8601 strings to a ``datetime64[s]`` array in UTC. Missing values become ``NaT``.
+  """
+  values = [v or '' for v in values]
+  base = numpy.array([v[:19] or 'NaT' for v in values], dtype = 'datetime64[s]')
+
+  # Timestamps share a handful of UTC offsets, so each distinct one is only parsed once
+  suffixes = [v[19:] for v in values]
+  offsets = dict((suffix, _offset(suffix)) for suffix in set(suffixes))
+  if any(offsets.values()):
+    base = base - numpy.fromiter((offsets[s] for s in suffixes), dtype = numpy.int64, count = len(suffixes)).astype('timedelta64[s]')
+  return base
+
+def _float(value):
+  try:
+    return float(value)
+  except (TypeError, ValueError):
+    return float('nan')
+
+def _floats(values):
+  values = list(values)
+  try:
+    # NumPy parses numeric strings itself, which is much quicker unless a value is missing or malformed
+    return numpy.array(values, dtype = numpy.float64)
+  except (TypeError, ValueError):
+    pass
+  return numpy.fromiter((_float(v) for v in values), dtype = numpy.float64, count = len(values))
+
+def _int(value):
+  try:
+    return int(value)
+  except (TypeError, ValueError):
+    return -1
+
+def _ints(values):
+  values = list(values)
+  return numpy.fromiter((_int(v) for v in values), dtype = numpy.int64, count = len(values))
+
+def _net_pl(trade):
+  # Trades carry gross P&L only; the fees are on their executions, when those were fetched
+  executions = trade.get('executions')
+  if executions is None:
+    return trade.get('net_pl')
+  fees = 0.0
+  for execution in executions:
+    for field in ('commission', 'transfee', 'ecnfee'):
+      fee = _float(execution.get(field))
+      if fee == fee:
+        fees += fee
+  return _float(trade.get('gross_pl')) - fees
+
+def _codes(values, index):
+  # Dictionary-encode ``values``, adding new ones to ``index`` (value -> code)
+  values = list(values)
+  return numpy.fromiter((index.setdefault(v, len(index)) for v in values), dtype = numpy.int32, count = len(values))
+
+def _labels(index):
+  labels = numpy.empty(len(index), dtype = object)
+  for value, code in index.items():
+    labels[code] = value
+  return labels
+
+class Columns:
+  """A set of equal-length NumPy arrays, one per field. Columns are read with ``columns['name']``.
+
+     Symbols are dictionary-encoded: the ``symbol`` column holds integer codes and :attr:`symbols` maps each code to
+     its name.
+  """
+
+  def __init__(self, columns, symbols):
+    self.columns = columns
+    self.symbols = symbols
+
+  def __len__(self):
+    return len(next(iter(self.columns.values()))) if len(self.columns) > 0 else 0
+
+  def __getitem__(self, name):
+    return self.columns[name]
+
+  def __contains__(self, name):
+    return name in self.columns
+
+  def select(self, mask):
+    """Return the rows where ``mask`` is true (or the rows at the indexes in ``mask``) as a new instance.
+    """
+    return self.__class__(dict((name, column[mask]) for (name, column) in self.columns.items()), self.symbols)
+
+  def symbol_code(self, symbol):
+    """Return the code of ``symbol`` in the ``symbol`` column, or -1 if no row has that symbol.
+    """
+    matches = numpy.nonzero(self.symbols == symbol)[0]
+    return int(matches[0]) if len(matches) > 0 else -1
+
+  def symbol_names(self):
+    """Return the ``symbol`` column decoded to names.
+    """
+    return self.symbols[self.columns['symbol']]
+
+class TradeColumns(Columns):
+  """Trades as columns:
+
+     ============== =============== ===================================================
+     ``id``         int64           the trade ID
+     ``symbol``     int32           the symbol code (see :attr:`symbols`)
+     ``side``       int8            1 for long, -1 for short
+     ``multiday``   bool            True for multiday trades
+     ``open``       bool            True for open trades
+     ``start``      datetime64[s]   the start time in UTC
+     ``end``        datetime64[s]   the end time in UTC
+     ``volume``     float64         the number of shares or contracts traded
+     ``gross_pl``   float64         the gross P&L
+     ``native_pl``  float64         the gross P&L in the account's native currency
+     ``net_pl``     float64         the gross P&L less the fees of the trade's executions (NaN unless the
+                                    trades include their executions)
+     ``exec_count`` int32           the number of executions
+     ============== =============== ===================================================
+  """
+
+  @classmethod
+  def from_trades(cls, trades):
+    """Convert trades as returned by :meth:`Tradervue.get_trades <tradervue.tradervue.Tradervue.get_trades>` (or stored in a tv-backup file).
+
+       :param trades: the trades
+       :type trades: list of dict
+       :rtype: TradeColumns
+    """
+    _require_numpy()
+    trades = list(trades)
+    index = {}
+    columns = { 'id': _ints(t.get('id') for t in trades),
+                'symbol': _codes((t.get('symbol') for t in trades), index),
+                'side': numpy.array([-1 if str(t.get('side', '')).lower() == 'short' else 1 for t in trades], dtype = numpy.int8),
+                'multiday': numpy.array([str(t.get('duration', '')).lower() == 'multiday' for t in trades], dtype = bool),
+                'open': numpy.array([bool(t.get('open')) for t in trades], dtype = bool),
+                'start': _timestamps(t.get('start_datetime') for t in trades),
+                'end': _timestamps(t.get('end_datetime') for t in trades),
+                'volume': _floats(t.get('volume') for t in trades),
+                'gross_pl': _floats(t.get('gross_pl') for t in trades),
+                'native_pl': _floats(t.get('native_pl') for t in trades),
+                'net_pl': _floats(_net_pl(t) for t in trades),
+                'exec_count': _ints(t.get('exec_count') for t in trades).astype(numpy.int32) }
+    return cls(columns, _labels(index))
+
+  @classmethod
+  def from_backup(cls, backup):
+    """Convert the trades of a tv-backup file.
+
+       :param dict backup: the decoded backup, e.g. ``json.load(open('20150101_000000.tradervue.json'))``
+       :rtype: TradeColumns
+    """
+    return cls.from_trades(backup['trades'])
+
+  def holding_seconds(self):
+    """Return how long each trade was held, in seconds (NaN for trades without an end time).
+    """
+    held = (self.columns['end'] - self.columns['start']).astype('timedelta64[s]')
+    return numpy.where(numpy.isnat(held), numpy.nan, held.astype(numpy.float64))
+
+class ExecutionColumns(Columns):
+  """Executions as columns:
+
+     ============== =============== ===================================================
+     ``trade_id``   int64           the ID of the trade the execution belongs to (-1 if unknown)
+     ``symbol``     int32           the symbol code (see :attr:`symbols`)
+     ``datetime``   datetime64[s]   the execution time in UTC
+     ``quantity``   float64         the signed quantity: positive for buys, negative for sells
+     ``price``      float64         the price
+     ``fees``       float64         commission plus transaction and ECN fees
+     ============== =============== ===================================================
+  """
+
+  @classmethod
+  def from_executions(cls, executions, trade_id = None):
+    """Convert executions as returned by :meth:`Tradervue.get_trade_executions <tradervue.tradervue.Tradervue.get_trade_executions>`.
+
+       :param executions: the executions
+       :param trade_id: the trade the executions belong to
+       :type executions: list of dict
+       :type trade_id: str or int or None
+       :rtype: ExecutionColumns
+    """
+    _require_numpy()
+    return cls.__convert([(trade_id, e) for e in executions])
+
+  @classmethod
+  def from_trades(cls, trades):
+    """Convert the executions embedded in trades, e.g. from ``get_trades(include_executions = True)`` or a tv-backup file.
+
+       :param trades: the trades
+       :type trades: list of dict
+       :rtype: ExecutionColumns
+    """
+    _require_numpy()
+    return cls.__convert([(t.get('id'), e) for t in trades for e in t.get('executions') or []])
+
+  @classmethod
+  def from_backup(cls, backup):
+    """Convert the executions of every trade in a decoded tv-backup file.
+
+       :param dict backup: the decoded backup
+       :rtype: ExecutionColumns
+    """
+    return cls.from_trades(backup['trades'])
+
+  @classmethod
+  def __convert(cls, rows):
+    index = {}
+    executions = [e for (trade_id, e) in rows]
+    fees = numpy.nan_to_num(_floats(e.get('commission') for e in executions))
+    for field in ('transfee', 'ecnfee'):
+      fees += numpy.nan_to_num(_floats(e.get(field) for e in executions))
+    columns = { 'trade_id': _ints(trade_id for (trade_id, e) in rows),
+                'symbol': _codes((e.get('symbol') for e in executions), index),
+                'datetime': _timestamps(e.get('datetime') for e in executions),
+                'quantity': _floats(e.get('quantity') for e in executions),
+                'price': _floats(e.get('price') for e in executions),
+                'fees': fees }
+    return cls(columns, _labels(index))
+
+  def notional(self):
+    """Return the traded value of each execution: ``abs(quantity) * price``.
+    """
+    return numpy.abs(self.columns['quantity']) * self.columns['price']
+
+  def cash_flow(self):
+    """Return the cash each execution moved: negative for buys, positive for sells, less fees. Summed over a
+       position that has been closed, this is its net P&L.
+    """
+    return -self.columns['quantity'] * self.columns['price'] - self.columns['fees']
+
+###########################################################################
+# Aggregates
+###########################################################################
+
+def _values(columns, column):
+  values = columns[column] if isinstance(column, str) else numpy.asarray(column, dtype = numpy.float64)
+  return values[~numpy.isnan(values)]
+
+def win_rate(trades, column = 'gross_pl'):
+  """Return the fraction of trades with a positive P&L, or NaN if there are none.
+
+     :param TradeColumns trades: the trades
+     :param column: the P&L column to use, or an array of values
+     :type column: str or numpy.ndarray
+     :rtype: float
+  """
+  pl = _values(trades, column)
+  return float(numpy.count_nonzero(pl > 0)) / len(pl) if len(pl) > 0 else float('nan')
+
+def expectancy(trades, column = 'gross_pl'):
+  """Return the average P&L per trade, or NaN if there are no trades.
+
+     :rtype: float
+  """
+  pl = _values(trades, column)
+  return float(pl.mean()) if len(pl) > 0 else float('nan')
+
+def profit_factor(trades, column = 'gross_pl'):
+  """Return the total profit of the winners divided by the total loss of the losers. This is infinite if there are
+     no losers and NaN if there are no trades with a non-zero P&L.
+
+     :rtype: float
+  """
+  pl = _values(trades, column)
+  profit = float(pl[pl > 0].sum())
+  loss = -float(pl[pl < 0].sum())
+  if loss == 0:
+    return float('inf') if profit > 0 else float('nan')
+  return profit / loss
+
+def equity_curve(trades, column = 'gross_pl'):
+  """Return the cumulative P&L after each trade, with the trades ordered by end time (open trades last).
+
+     :rtype: numpy.ndarray
+  """
+  order = numpy.argsort(trades['end'], kind = 'stable')
+  return numpy.cumsum(numpy.nan_to_num(trades[column][order]))
+
+def max_drawdown(trades, column = 'gross_pl'):
+  """Return the largest drop of the equity curve from a preceding peak (starting from 0), as a non-negative number.
+
+     :rtype: float
+  """
+  equity = equity_curve(trades, column)
+  if len(equity) == 0:
+    return 0.0
+  peaks = numpy.maximum.accumulate(numpy.maximum(equity, 0.0))
+  return float((peaks - equity).max())
+
+def _rollup(codes, labels, values, key):
+  # Group ``values`` by the integer ``codes`` (indexes into ``labels``), dropping empty groups
+  valid = ~numpy.isnan(values)
+  codes = codes[valid]
+  values = values[valid]
+  count = numpy.bincount(codes, minlength = len(labels))
+  total = numpy.bincount(codes, weights = values, minlength = len(labels))
+  wins = numpy.bincount(codes, weights = values > 0, minlength = len(labels))
+  present = count > 0
+  count = count[present]
+  return { key: labels[present],
+           'count': count,
+           'total': total[present],
+           'mean': total[present] / count,
+           'win_rate': wins[present] / count }
+
+def by_symbol(columns, column = 'gross_pl'):
+  """Aggregate a column per symbol.
+
+     :param columns: trades or executions
+     :param column: the column to aggregate, e.g. ``'gross_pl'`` for trades, or an array of values such as ``executions.cash_flow()``
+     :type columns: TradeColumns or ExecutionColumns
+     :type column: str or numpy.ndarray
+     :return: a dict of arrays, one entry per symbol: ``symbol``, ``count``, ``total``, ``mean`` and ``win_rate`` (the fraction of positive values)
+     :rtype: dict
+  """
+  values = columns[column] if isinstance(column, str) else numpy.asarray(column, dtype = numpy.float64)
+  return _rollup(columns['symbol'], columns.symbols, values, 'symbol')
+
+def by_day(columns, column = 'gross_pl', time = None):
+  """Aggregate a column per (UTC) day.
+
+     :param columns: trades or executions
+     :param column: the column to aggregate, or an array of values
+     :param time: the timestamp column that decides the day. Defaults to ``'end'`` for trades and ``'datetime'`` for executions. Rows without a timestamp are left out.
+     :type columns: TradeColumns or ExecutionColumns
+     :type column: str or numpy.ndarray
+     :type time: str or None
+     :return: a dict of arrays, one entry per day in ascending order: ``day`` (``datetime64[D]``), ``count``, ``total``, ``mean`` and ``win_rate``
+     :rtype: dict
+  """
+  if time is None:
+    time = 'end' if 'end' in columns else 'datetime'
+  values = columns[column] if isinstance(column, str) else numpy.asarray(column, dtype = numpy.float64)
+  days = columns[time].astype('datetime64[D]')
+  dated = ~numpy.isnat(days)
+  labels, codes = numpy.unique(days[dated], return_inverse = True)
+  return _rollup(codes.ravel(), labels, values[dated], 'day')
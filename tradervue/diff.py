@@ -0,0 +1,268 @@
+# vim: filetype=python shiftwidth=2 tabstop=2 expandtab
+#
+# Copyright (c) 2015, Jon Nall
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of tradervue-utils nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+.. module:: diff
+   :platform: Unix, Windows
+   :synopsis: Compares two tv-backup backups
+
+.. moduleauthor:: Jon Nall <jon.nall@gmail.com>
+
+"""
+
+import collections
+import gzip
+import hashlib
+import zipfile
+
+try:
+  import zstandard
+except ImportError:
+  zstandard = None
+
+from . import codec
+from .indexed import IndexedBackup
+
+CHUNK_BYTES = 1024 * 1024
+
+class _Missing:
+  def __repr__(self):
+    return '<missing>'
+
+"""Stands in for a field (or sub-object) one side of a difference doesn't have
+"""
+MISSING = _Missing()
+
+"""One added, removed or modified object. ``old`` is ``None`` for added objects and ``new`` for removed ones.
+``fields`` lists the differences of a modified object as ``(path, old value, new value)`` tuples (see :func:`diff_fields`).
+"""
+Change = collections.namedtuple('Change', ['kind', 'id', 'status', 'old', 'new', 'fields'])
+
+class BackupDiff:
+  """The result of :func:`diff_backups`.
+
+     ``counts`` maps each kind to a dict with the number of ``added``, ``removed``, ``modified`` and ``unchanged``
+     objects. ``changes`` lists a :class:`Change` for every object that isn't unchanged: additions and modifications in
+     the order of the new backup, then removals in the order of the old one.
+  """
+
+  def __init__(self, counts, changes):
+    self.counts = counts
+    self.changes = changes
+
+  def __len__(self):
+    return len(self.changes)
+
+def iter_backup(path):
+  """Stream the objects of a backup file of any format tv-backup writes: JSON (optionally zip, gzip or zstd
+     compressed) or indexed NDJSON.
+
+     :param str path: the backup file
+     :return: a generator of ``(kind, object)`` tuples, in backup order
+     :rtype: generator
+  """
+  if path.endswith('.ndjson'):
+    with IndexedBackup(path) as indexed:
+      for item in indexed.iter_objects():
+        yield item
+    return
+
+  if path.endswith('.zip'):
+    archive = zipfile.ZipFile(path, 'r')
+    fh = archive.open(archive.namelist()[0], 'r')
+  elif path.endswith('.gz'):
+    archive = None
+    fh = gzip.open(path, 'rb')
+  elif path.endswith('.zst'):
+    if zstandard is None:
+      raise ImportError("Reading %s requires the zstandard package" % (path))
+    archive = open(path, 'rb')
+    fh = zstandard.ZstdDecompressor().stream_reader(archive)
+  else:
+    archive = None
+    fh = open(path, 'rb')
+
+  try:
+    for item in codec.iter_arrays(iter(lambda: fh.read(CHUNK_BYTES), b'')):
+      yield item
+  finally:
+    fh.close()
+    if archive is not None:
+      archive.close()
+
+def _iter_source(source):
+  if isinstance(source, tuple):
+    (store, name) = source
+    return store.iter_objects(name)
+  return iter_backup(source)
+
+def _digest(obj):
+  # Both backups are decoded with the same backend, which keeps the key order of the files
+  return hashlib.sha1(codec.dumps(obj)).digest()
+
+def _sub_object_id(value):
+  return value.get('id') if isinstance(value, dict) else None
+
+def diff_fields(old, new, path = ''):
+  """Yield the differences between two objects as ``(path, old value, new value)`` tuples.
+
+     Dicts are compared key by key. Lists whose items all have an ``id`` (such as executions and comments) are
+     matched up by ID, so an added execution shows up as ``executions[id=...]`` with an old value of :data:`MISSING`.
+     Other lists (such as tags) are compared as a whole.
+
+     :param old: the old value
+     :param new: the new value
+     :param str path: the path of the values, used as the prefix of the reported paths
+     :rtype: generator
+  """
+  if isinstance(old, dict) and isinstance(new, dict):
+    for key in old:
+      child = '%s.%s' % (path, key) if path else key
+      if key not in new:
+        yield (child, old[key], MISSING)
+      elif old[key] != new[key]:
+        for difference in diff_fields(old[key], new[key], child):
+          yield difference
+    for key in new:
+      if key not in old:
+        yield ('%s.%s' % (path, key) if path else key, MISSING, new[key])
+  elif isinstance(old, list) and isinstance(new, list) and len(old) > 0 and len(new) > 0 and all(_sub_object_id(item) is not None for item in old + new):
+    old_by_id = collections.OrderedDict((str(item['id']), item) for item in old)
+    new_by_id = collections.OrderedDict((str(item['id']), item) for item in new)
+    for item_id, item in old_by_id.items():
+      child = '%s[id=%s]' % (path, item_id)
+      if item_id not in new_by_id:
+        yield (child, item, MISSING)
+      elif item != new_by_id[item_id]:
+        for difference in diff_fields(item, new_by_id[item_id], child):
+          yield difference
+    for item_id, item in new_by_id.items():
+      if item_id not in old_by_id:
+        yield ('%s[id=%s]' % (path, item_id), MISSING, item)
+    if list(old_by_id) != list(new_by_id) and set(old_by_id) == set(new_by_id):
+      yield ('%s[order]' % (path), list(old_by_id), list(new_by_id))
+  elif old != new:
+    yield (path, old, new)
+
+def _counts(kinds):
+  return collections.OrderedDict((kind, { 'added': 0, 'removed': 0, 'modified': 0, 'unchanged': 0 }) for kind in kinds)
+
+def _result(counts, changed_new, changed_old, order):
+  # ``order`` lists the changed (kind, id) keys: new backup order first, then removals in old backup order
+  changes = []
+  for key in order:
+    (kind, object_id) = key
+    old = changed_old.get(key)
+    new = changed_new.get(key)
+    if old is None:
+      status = 'added'
+    elif new is None:
+      status = 'removed'
+    else:
+      status = 'modified'
+    counts.setdefault(kind, { 'added': 0, 'removed': 0, 'modified': 0, 'unchanged': 0 })[status] += 1
+    fields = list(diff_fields(old, new)) if status == 'modified' else []
+    changes.append(Change(kind, object_id, status, old, new, fields))
+  return BackupDiff(counts, changes)
+
+def _diff_snapshots(store, old_name, new_name):
+  # Unchanged objects have the same hash in both snapshots, so only the objects that differ are ever read
+  old_refs = list(store.refs(old_name))
+  new_refs = list(store.refs(new_name))
+  old_digests = set(digest for (kind, digest) in old_refs)
+  new_digests = set(digest for (kind, digest) in new_refs)
+
+  counts = _counts(kind for (kind, digest) in old_refs + new_refs)
+  changed_old = collections.OrderedDict()
+  changed_new = collections.OrderedDict()
+  for (kind, digest) in old_refs:
+    if digest not in new_digests:
+      obj = store.get(digest)
+      changed_old[(kind, str(obj['id']))] = obj
+  for (kind, digest) in new_refs:
+    if digest not in old_digests:
+      obj = store.get(digest)
+      changed_new[(kind, str(obj['id']))] = obj
+    else:
+      counts[kind]['unchanged'] += 1
+
+  order = list(changed_new) + [key for key in changed_old if key not in changed_new]
+  return _result(counts, changed_new, changed_old, order)
+
+def diff_backups(old, new):
+  """Compare two backups.
+
+     Both backups are streamed. A hash of every object of the old backup is kept while the new one is read, and only
+     the objects that differ are kept in full, so memory use grows with the number of changes rather than the size
+     of the backups. Two snapshots in the same store are compared by their lists of hashes, so only the objects that
+     differ are read at all.
+
+     :param old: the old backup: the path of a backup file, or a ``(SnapshotStore, snapshot name)`` tuple
+     :param new: the new backup, in the same form
+     :type old: str or tuple
+     :type new: str or tuple
+     :rtype: BackupDiff
+  """
+  if isinstance(old, tuple) and isinstance(new, tuple) and old[0].path == new[0].path:
+    return _diff_snapshots(old[0], old[1], new[1])
+
+  old_digests = collections.OrderedDict()
+  for (kind, obj) in _iter_source(old):
+    old_digests[(kind, str(obj['id']))] = _digest(obj)
+
+  counts = _counts(kind for (kind, object_id) in old_digests)
+  changed_new = collections.OrderedDict()
+  for (kind, obj) in _iter_source(new):
+    key = (kind, str(obj['id']))
+    digest = old_digests.pop(key, None)
+    if digest is None or digest != _digest(obj):
+      changed_new[key] = obj
+      if digest is not None:
+        # Still needed to find the old version of the object
+        old_digests[key] = None
+    else:
+      counts.setdefault(kind, { 'added': 0, 'removed': 0, 'modified': 0, 'unchanged': 0 })['unchanged'] += 1
+
+  # Whatever is left was either removed or modified. Look those up in an indexed backup, or read the old backup again
+  # for just those.
+  changed_old = collections.OrderedDict()
+  if len(old_digests) > 0 and not isinstance(old, tuple) and old.endswith('.ndjson'):
+    with IndexedBackup(old) as indexed:
+      for key in old_digests:
+        changed_old[key] = indexed.get(*key)
+  elif len(old_digests) > 0:
+    for (kind, obj) in _iter_source(old):
+      key = (kind, str(obj['id']))
+      if key in old_digests:
+        changed_old[key] = obj
+
+  order = list(changed_new) + [key for key in changed_old if key not in changed_new]
+  return _result(counts, changed_new, changed_old, order)
@@ -0,0 +1,266 @@
+# vim: filetype=python shiftwidth=2 tabstop=2 expandtab
+#
+# Copyright (c) 2015, Jon Nall
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of tradervue-utils nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+.. module:: indexed
+   :platform: Unix, Windows
+   :synopsis: A backup file format with an index for random access
+
+.. moduleauthor:: Jon Nall <jon.nall@gmail.com>
+
+"""
+
+import bisect
+import json
+import mmap
+import os
+
+from . import codec
+
+INDEX_VERSION = 1
+
+def index_path(path):
+  """Return the path of the index that belongs to the indexed backup at ``path``.
+  """
+  return path + '.idx'
+
+def _object_date(kind, obj):
+  # The date an object is filed under: a trade's start, a journal entry's date, a note's creation
+  if kind == 'trades':
+    value = obj.get('start_datetime')
+  elif kind == 'journals':
+    value = obj.get('date')
+  else:
+    value = obj.get('created_at') or obj.get('updated_at')
+  return value[:10] if isinstance(value, str) else None
+
+def _date_key(value):
+  if value is None or isinstance(value, str):
+    return value
+  return value.strftime('%Y-%m-%d')
+
+class IndexedBackupWriter:
+  """Writes a backup as newline-delimited JSON, one ``{"kind": ..., "object": ...}`` record per line, and keeps the
+     index of where each record starts.
+
+     This has the same interface as tv-backup's writer for backup files: objects are added a section at a time with
+     :meth:`write_section`. Once the file is complete, :meth:`write_index` writes the index next to it.
+  """
+
+  def __init__(self, fh):
+    """
+       :param fh: the text stream the backup is written to. It must not translate newlines (open it with ``newline = '\\n'``), or the recorded offsets won't match the file.
+    """
+    self.fh = fh
+    self.offset = 0
+    self.entries = {}
+
+  def write_section(self, kind, objects):
+    """Write ``objects`` under ``kind``.
+
+       :return: the number of objects written
+       :rtype: int
+    """
+    entries = self.entries.setdefault(kind, [])
+    count = 0
+    for obj in objects:
+      # ASCII-only JSON, so the length of the string is its length in bytes
+      line = json.dumps({ 'kind': kind, 'object': obj }) + '\n'
+      self.fh.write(line)
+      entries.append([str(obj['id']), _object_date(kind, obj), self.offset, len(line)])
+      self.offset += len(line)
+      count += 1
+    return count
+
+  def close(self):
+    pass
+
+  def write_index(self, path):
+    """Write the index of the backup at ``path``. Call this once the backup has been written to ``path``.
+    """
+    index = { 'version': INDEX_VERSION, 'size': self.offset, 'kinds': self.entries }
+    tmp_path = index_path(path) + '.tmp'
+    with open(tmp_path, 'w') as fh:
+      json.dump(index, fh, separators = (',', ':'))
+    os.replace(tmp_path, index_path(path))
+
+class IndexedBackup:
+  """Reads single objects or date ranges from an indexed backup without parsing the rest of it.
+
+     The backup is memory-mapped and its index (see :func:`index_path`) is loaded, so a lookup only decodes the lines
+     it returns. If the index is missing or doesn't match the backup, it's rebuilt with one pass over the file.
+
+     Use it as a context manager, or call :meth:`close` when done.
+  """
+
+  def __init__(self, path):
+    """Open an indexed backup.
+
+       :param str path: the backup file, as written by ``tv-backup --format ndjson``
+       :return: the IndexedBackup instance
+       :rtype: IndexedBackup
+    """
+    self.path = path
+    self.__fh = open(path, 'rb')
+    size = os.fstat(self.__fh.fileno()).st_size
+    # Empty files can't be mapped
+    self.__map = mmap.mmap(self.__fh.fileno(), 0, access = mmap.ACCESS_READ) if size > 0 else b''
+
+    index = self.__load_index(size)
+    self.__by_id = {}
+    self.__by_date = {}
+    for kind, entries in index['kinds'].items():
+      self.__by_id[kind] = dict((entry[0], (entry[2], entry[3])) for entry in entries)
+      dated = sorted((entry for entry in entries if entry[1] is not None), key = lambda entry: entry[1])
+      self.__by_date[kind] = ([entry[1] for entry in dated], [(entry[2], entry[3]) for entry in dated])
+
+  def __load_index(self, size):
+    try:
+      with open(index_path(self.path), 'r') as fh:
+        index = json.load(fh)
+      if index.get('version') == INDEX_VERSION and index.get('size') == size:
+        return index
+    except (IOError, OSError, ValueError):
+      pass
+    return self.__build_index(size)
+
+  def __build_index(self, size):
+    entries = {}
+    offset = 0
+    while offset < size:
+      end = self.__map.find(b'\n', offset)
+      end = size if end < 0 else end + 1
+      record = codec.loads(self.__map[offset:end])
+      kind = record['kind']
+      entries.setdefault(kind, []).append([str(record['object']['id']), _object_date(kind, record['object']), offset, end - offset])
+      offset = end
+    return { 'version': INDEX_VERSION, 'size': size, 'kinds': entries }
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    self.close()
+    return False
+
+  def close(self):
+    """Unmap and close the backup.
+    """
+    if isinstance(self.__map, mmap.mmap):
+      self.__map.close()
+    self.__fh.close()
+
+  def __read(self, location):
+    (offset, length) = location
+    return codec.loads(self.__map[offset:offset + length])['object']
+
+  def kinds(self):
+    """Return the kinds of object in the backup, e.g. ``['journals', 'notes', 'trades']``.
+    """
+    return sorted(self.__by_id.keys())
+
+  def count(self, kind):
+    """Return the number of objects of ``kind``.
+    """
+    return len(self.__by_id.get(kind, {}))
+
+  def ids(self, kind):
+    """Return the IDs of the objects of ``kind``, in backup order.
+
+       :rtype: list of str
+    """
+    return list(self.__by_id.get(kind, {}).keys())
+
+  def get(self, kind, object_id):
+    """Return one object.
+
+       :param str kind: ``'journals'``, ``'notes'`` or ``'trades'``
+       :param object_id: the object's ID
+       :type object_id: str or int
+       :return: the object, or ``None`` if the backup doesn't have it
+       :rtype: dict or None
+    """
+    location = self.__by_id.get(kind, {}).get(str(object_id))
+    return self.__read(location) if location is not None else None
+
+  def get_trade(self, trade_id):
+    """Return the trade with ID ``trade_id``, or ``None``. See :meth:`get`.
+    """
+    return self.get('trades', trade_id)
+
+  def get_journal(self, journal_id):
+    """Return the journal entry with ID ``journal_id``, or ``None``. See :meth:`get`.
+    """
+    return self.get('journals', journal_id)
+
+  def get_note(self, note_id):
+    """Return the note with ID ``note_id``, or ``None``. See :meth:`get`.
+    """
+    return self.get('notes', note_id)
+
+  def between(self, kind, startdate = None, enddate = None):
+    """Yield the objects of ``kind`` dated between ``startdate`` and ``enddate`` (both inclusive), oldest day first.
+
+       Trades are dated by the day they started, journal entries by their date and notes by the day they were
+       created. Objects on the same day come in backup order. Objects without a date are never returned.
+
+       :param str kind: ``'journals'``, ``'notes'`` or ``'trades'``
+       :param startdate: the first day. ``None`` means no lower bound.
+       :param enddate: the last day. ``None`` means no upper bound.
+       :type startdate: date or datetime or str or None
+       :type enddate: date or datetime or str or None
+       :rtype: generator
+    """
+    (dates, locations) = self.__by_date.get(kind, ([], []))
+    startdate = _date_key(startdate)
+    enddate = _date_key(enddate)
+    first = 0 if startdate is None else bisect.bisect_left(dates, startdate)
+    last = len(dates) if enddate is None else bisect.bisect_right(dates, enddate)
+    for location in locations[first:last]:
+      yield self.__read(location)
+
+  def iter_objects(self, kind = None):
+    """Yield the objects of the backup (or only those of ``kind``) in backup order, as ``(kind, object)`` tuples.
+    """
+    kinds = self.kinds() if kind is None else [kind]
+    located = sorted((location, k) for k in kinds for location in self.__by_id.get(k, {}).values())
+    for (location, k) in located:
+      yield (k, self.__read(location))
+
+  def load(self):
+    """Return the whole backup in the form of a decoded tv-backup file: a dict mapping each kind to a list of objects.
+
+       :rtype: dict
+    """
+    result = dict((kind, []) for kind in self.kinds())
+    for (kind, obj) in self.iter_objects():
+      result[kind].append(obj)
+    return result
@@ -0,0 +1,210 @@
+# vim: filetype=python shiftwidth=2 tabstop=2 expandtab
+#
+# Copyright (c) 2015, Jon Nall
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of tradervue-utils nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+.. module:: metrics
+   :platform: Unix, Windows
+   :synopsis: Per-endpoint request metrics for the Tradervue API
+
+.. moduleauthor:: Jon Nall <jon.nall@gmail.com>
+
+"""
+
+import bisect
+import threading
+
+class _Series:
+  """The counters for one endpoint and HTTP method.
+  """
+
+  def __init__(self, bucket_count):
+    self.requests = 0
+    self.retries = 0
+    self.bytes_sent = 0
+    self.bytes_received = 0
+    self.errors = {}                        # status code or exception name -> count
+    self.buckets = [0] * (bucket_count + 1) # the last bucket counts latencies beyond the largest bound
+    self.latency_sum = 0.0
+
+class Metrics:
+  """Thread-safe request metrics, kept per endpoint (``trades``, ``journal``, ``notes``, ``imports``, ``users``) and
+     HTTP method.
+
+     For each pair the number of requests, retries, bytes sent and received, errors by HTTP status (or exception
+     name) and a latency histogram are kept. Recording a request only increments counters, so metrics can be left on
+     in production. Latency percentiles are estimated from the histogram buckets.
+
+     :class:`~tradervue.tradervue.Tradervue` and :class:`~tradervue.async_tradervue.AsyncTradervue` record into
+     their ``metrics`` attribute. One instance may be shared by several clients.
+  """
+
+  """The upper bounds (in seconds) of the latency histogram buckets
+  """
+  LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.15, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 7.5, 10.0, 15.0, 30.0, 60.0)
+
+  def __init__(self, buckets = None):
+    """Construct a Metrics instance.
+
+       :param buckets: the latency histogram's bucket upper bounds in seconds, in increasing order. Defaults to ``Metrics.LATENCY_BUCKETS``.
+       :type buckets: tuple or None
+       :return: the Metrics instance
+       :rtype: Metrics
+    """
+    self.buckets = tuple(Metrics.LATENCY_BUCKETS if buckets is None else buckets)
+    self.__lock = threading.Lock()
+    self.__series = {} # (endpoint, method) -> _Series
+
+  def record(self, endpoint, method, status, seconds, sent = 0, received = 0, retry = False):
+    """Record one HTTP request.
+
+       :param str endpoint: the API endpoint, e.g. ``'trades'``
+       :param str method: the HTTP method, e.g. ``'GET'``
+       :param status: the HTTP status of the response, or the name of the exception raised if there was no response. Statuses of 400 and above (and exceptions) are counted as errors.
+       :param float seconds: the time taken to receive the response
+       :param int sent: the size of the request body in bytes
+       :param int received: the size of the response body in bytes
+       :param bool retry: True if the request repeats one that was throttled
+       :type status: int or str
+    """
+    bucket = bisect.bisect_left(self.buckets, seconds)
+    with self.__lock:
+      series = self.__series.get((endpoint, method))
+      if series is None:
+        series = self.__series[(endpoint, method)] = _Series(len(self.buckets))
+
+      series.requests += 1
+      series.bytes_sent += sent
+      series.bytes_received += received
+      series.buckets[bucket] += 1
+      series.latency_sum += seconds
+      if retry:
+        series.retries += 1
+      if not isinstance(status, int) or status >= 400:
+        series.errors[status] = series.errors.get(status, 0) + 1
+
+  def record_received(self, endpoint, method, received):
+    """Add to the bytes received for ``endpoint`` and ``method`` without counting another request. For response
+       bodies that are read after their request was recorded, such as streamed ones.
+
+       :param str endpoint: the API endpoint, e.g. ``'trades'``
+       :param str method: the HTTP method, e.g. ``'GET'``
+       :param int received: the number of response body bytes read
+    """
+    with self.__lock:
+      series = self.__series.get((endpoint, method))
+      if series is None:
+        series = self.__series[(endpoint, method)] = _Series(len(self.buckets))
+      series.bytes_received += received
+
+  def reset(self):
+    """Discard everything recorded so far.
+    """
+    with self.__lock:
+      self.__series = {}
+
+  def __percentile(self, counts, total, fraction):
+    # Linear interpolation within the bucket the percentile falls in. Latencies beyond the largest bound are reported
+    # as that bound.
+    rank = fraction * total
+    seen = 0
+    for index, count in enumerate(counts):
+      if count > 0 and seen + count >= rank:
+        if index == len(self.buckets):
+          return self.buckets[-1]
+        lower = 0.0 if index == 0 else self.buckets[index - 1]
+        return lower + (self.buckets[index] - lower) * (rank - seen) / count
+      seen += count
+    return 0.0
+
+  def snapshot(self):
+    """Return the metrics recorded so far.
+
+       :return: a dict of endpoint -> method -> dict with ``requests``, ``retries``, ``bytes_sent``, ``bytes_received``, ``errors`` (a dict of status code or exception name -> count) and ``latency`` keys. ``latency`` is a dict with the ``p50``, ``p95``, ``p99`` and ``mean`` latencies in seconds.
+       :rtype: dict
+    """
+    with self.__lock:
+      series = [(key, s.requests, s.retries, s.bytes_sent, s.bytes_received, dict(s.errors), list(s.buckets), s.latency_sum) for key, s in self.__series.items()]
+
+    result = {}
+    for (endpoint, method), requests, retries, sent, received, errors, counts, latency_sum in series:
+      result.setdefault(endpoint, {})[method] = {
+        'requests': requests,
+        'retries': retries,
+        'bytes_sent': sent,
+        'bytes_received': received,
+        'errors': errors,
+        'latency': { 'p50': self.__percentile(counts, requests, 0.50),
+                     'p95': self.__percentile(counts, requests, 0.95),
+                     'p99': self.__percentile(counts, requests, 0.99),
+                     'mean': latency_sum / requests } }
+    return result
+
+  def prometheus(self, prefix = 'tradervue'):
+    """Return the metrics in the Prometheus text exposition format.
+
+       :param str prefix: the prefix of every metric name
+       :rtype: str
+    """
+    with self.__lock:
+      series = sorted((key, s.requests, s.retries, s.bytes_sent, s.bytes_received, dict(s.errors), list(s.buckets), s.latency_sum) for key, s in self.__series.items())
+
+    def labels(endpoint, method, **extra):
+      pairs = [('endpoint', endpoint), ('method', method)] + sorted(extra.items())
+      return '{%s}' % (','.join('%s="%s"' % (k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in pairs))
+
+    lines = []
+    counters = [('requests_total', 'Requests issued to the Tradervue API', 1),
+                ('retries_total', 'Requests repeated after being throttled', 2),
+                ('bytes_sent_total', 'Request body bytes sent', 3),
+                ('bytes_received_total', 'Response body bytes received', 4)]
+    for name, description, index in counters:
+      lines.append('# HELP %s_%s %s' % (prefix, name, description))
+      lines.append('# TYPE %s_%s counter' % (prefix, name))
+      for s in series:
+        lines.append('%s_%s%s %d' % (prefix, name, labels(*s[0]), s[index]))
+
+    lines.append('# HELP %s_errors_total Failed requests by HTTP status or exception' % (prefix))
+    lines.append('# TYPE %s_errors_total counter' % (prefix))
+    for s in series:
+      for code, count in sorted(s[5].items(), key = lambda item: str(item[0])):
+        lines.append('%s_errors_total%s %d' % (prefix, labels(*s[0], code = code), count))
+
+    lines.append('# HELP %s_request_duration_seconds Time taken to receive a response' % (prefix))
+    lines.append('# TYPE %s_request_duration_seconds histogram' % (prefix))
+    for s in series:
+      cumulative = 0
+      for bound, count in zip(self.buckets + ('+Inf',), s[6]):
+        cumulative += count
+        lines.append('%s_request_duration_seconds_bucket%s %d' % (prefix, labels(*s[0], le = bound), cumulative))
+      lines.append('%s_request_duration_seconds_sum%s %r' % (prefix, labels(*s[0]), s[7]))
+      lines.append('%s_request_duration_seconds_count%s %d' % (prefix, labels(*s[0]), s[1]))
+
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,498 @@
+# vim: filetype=python shiftwidth=2 tabstop=2 expandtab
+#
+# Copyright (c) 2015, Jon Nall
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of tradervue-utils nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+.. module:: mirror
+   :platform: Unix, Windows
+   :synopsis: A local SQLite mirror of a Tradervue account
+
+.. moduleauthor:: Jon Nall <jon.nall@gmail.com>
+
+"""
+
+import concurrent.futures
+import datetime
+import json
+import logging
+import re
+import sqlite3
+
+from .sync import change_marker, unchanged
+from .tradervue import _trade_side, _trade_duration
+
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS trades (
+  id TEXT PRIMARY KEY,
+  symbol TEXT COLLATE NOCASE,
+  side TEXT COLLATE NOCASE,
+  duration TEXT COLLATE NOCASE,
+  date TEXT,
+  started_at REAL,
+  gross_pl REAL,
+  marker TEXT,
+  data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS trades_symbol ON trades (symbol, started_at);
+CREATE INDEX IF NOT EXISTS trades_date ON trades (date);
+CREATE INDEX IF NOT EXISTS trades_started_at ON trades (started_at);
+CREATE INDEX IF NOT EXISTS trades_side ON trades (side, started_at);
+
+CREATE TABLE IF NOT EXISTS trade_tags (
+  trade_id TEXT NOT NULL REFERENCES trades (id) ON DELETE CASCADE,
+  tag TEXT NOT NULL COLLATE NOCASE
+);
+CREATE INDEX IF NOT EXISTS trade_tags_tag ON trade_tags (tag, trade_id);
+CREATE INDEX IF NOT EXISTS trade_tags_trade ON trade_tags (trade_id);
+
+CREATE TABLE IF NOT EXISTS executions (
+  id TEXT,
+  trade_id TEXT NOT NULL REFERENCES trades (id) ON DELETE CASCADE,
+  position INTEGER NOT NULL,
+  datetime TEXT,
+  symbol TEXT COLLATE NOCASE,
+  quantity REAL,
+  price REAL,
+  data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS executions_trade ON executions (trade_id, position);
+CREATE INDEX IF NOT EXISTS executions_symbol ON executions (symbol, datetime);
+
+CREATE TABLE IF NOT EXISTS journals (
+  id TEXT PRIMARY KEY,
+  date TEXT,
+  marker TEXT,
+  data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS journals_date ON journals (date);
+
+CREATE TABLE IF NOT EXISTS notes (
+  id TEXT PRIMARY KEY,
+  marker TEXT,
+  data TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS comments (
+  kind TEXT NOT NULL,
+  object_id TEXT NOT NULL,
+  position INTEGER NOT NULL,
+  data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS comments_object ON comments (kind, object_id, position);
+"""
+
+def _timestamp(value):
+  if not value:
+    return None
+  try:
+    return datetime.datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+  except ValueError:
+    return None
+
+def _number(value):
+  try:
+    return float(value)
+  except (TypeError, ValueError):
+    return None
+
+_TAG_TOKEN = re.compile(r'\(|\)|&&?|\|\|?|!|[^\s()&|!]+')
+
+def _tag_filter(expr):
+  """Compile a tag expression into an SQL condition on ``trades`` and its parameters.
+
+     Tags can be combined with ``and`` (or ``&``), ``or`` (or ``|``) and ``not`` (or ``!``) and grouped with
+     parentheses. Tags next to each other must all match. Matching is case-insensitive.
+  """
+  tokens = [t.lower() if t.lower() in ('and', 'or', 'not') else t for t in _TAG_TOKEN.findall(expr)]
+  tokens = ['and' if t in ('&', '&&') else 'or' if t in ('|', '||') else 'not' if t == '!' else t for t in tokens]
+  params = []
+  pos = [0]
+
+  def peek():
+    return tokens[pos[0]] if pos[0] < len(tokens) else None
+
+  def take():
+    pos[0] += 1
+    return tokens[pos[0] - 1]
+
+  def parse_or():
+    terms = [parse_and()]
+    while peek() == 'or':
+      take()
+      terms.append(parse_and())
+    return terms[0] if len(terms) == 1 else '(%s)' % (' OR '.join(terms))
+
+  def parse_and():
+    terms = [parse_not()]
+    while peek() is not None and peek() not in ('or', ')'):
+      if peek() == 'and':
+        take()
+      terms.append(parse_not())
+    return terms[0] if len(terms) == 1 else '(%s)' % (' AND '.join(terms))
+
+  def parse_not():
+    if peek() == 'not':
+      take()
+      return 'NOT %s' % (parse_not())
+    elif peek() == '(':
+      take()
+      term = parse_or()
+      if peek() != ')':
+        raise ValueError("Unbalanced parentheses in tag expression '%s'" % (expr))
+      take()
+      return term
+    elif peek() in (None, ')', 'and', 'or'):
+      raise ValueError("Expected a tag at position %d of tag expression '%s'" % (pos[0] + 1, expr))
+    params.append(take())
+    return 'EXISTS (SELECT 1 FROM trade_tags WHERE trade_tags.trade_id = trades.id AND trade_tags.tag = ?)'
+
+  condition = parse_or()
+  if peek() is not None:
+    raise ValueError("Unexpected '%s' in tag expression '%s'" % (peek(), expr))
+  return (condition, params)
+
+class Mirror:
+  """A local SQLite copy of a Tradervue account's trades (with their executions and comments), journals and notes.
+
+     :meth:`sync` downloads the account, and later calls only download what changed. The query methods take the same
+     arguments as their :class:`~tradervue.tradervue.Tradervue` counterparts and return the same objects, but are
+     answered from the database using its indexes on symbol, date, side and tags.
+
+     A Mirror must only be used from the thread that created it.
+  """
+
+  def __init__(self, path, tradervue = None, jobs = 4):
+    """Construct a Mirror instance, creating the database if needed.
+
+       :param str path: the SQLite database file. ``':memory:'`` keeps the mirror in memory.
+       :param tradervue: the client used by :meth:`sync`. Queries don't need one.
+       :param int jobs: the number of objects whose details are downloaded concurrently by :meth:`sync`
+       :type tradervue: Tradervue or None
+       :return: the Mirror instance
+       :rtype: Mirror
+    """
+    self.log = logging.getLogger(__name__)
+    self.path = path
+    self.tradervue = tradervue
+    self.jobs = jobs
+
+    self.db = sqlite3.connect(path)
+    self.db.execute('PRAGMA foreign_keys = ON')
+    if path != ':memory:':
+      self.db.execute('PRAGMA journal_mode = WAL')
+
+    version = self.db.execute('PRAGMA user_version').fetchone()[0]
+    if version not in (0, SCHEMA_VERSION):
+      raise ValueError("%s holds a version %d mirror, but this version of tradervue reads version %d" % (path, version, SCHEMA_VERSION))
+    self.db.executescript(SCHEMA)
+    self.db.execute('PRAGMA user_version = %d' % (SCHEMA_VERSION))
+    self.db.commit()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    self.close()
+    return False
+
+  def close(self):
+    """Close the database.
+    """
+    self.db.close()
+
+  ###########################################################################
+  # Synchronization
+  ###########################################################################
+
+  def sync(self, full = False, window = 100):
+    """Bring the mirror up to date with the account.
+
+       Objects are listed newest first. Objects that are new or whose ``updated_at`` changed are downloaded in full;
+       the rest are left alone. Trades whose listing has no ``updated_at`` are always downloaded again, since edits to
+       their details don't show in the listing (see :func:`~tradervue.sync.unchanged`). An incremental sync stops walking each listing after ``window`` consecutive unchanged
+       objects, so older edits and deletions are only picked up by a full sync, which walks everything and drops
+       objects that no longer exist.
+
+       :param bool full: walk the complete listings instead of stopping at the first ``window`` unchanged objects
+       :param int window: the number of consecutive unchanged objects that end an incremental walk. 0 always walks the complete listings.
+       :return: a dict with ``trades``, ``journals`` and ``notes`` keys, each a dict of ``added``, ``updated``, ``deleted`` and ``unchanged`` counts
+       :rtype: dict
+    """
+    if self.tradervue is None:
+      raise ValueError("A Mirror needs a Tradervue client to sync")
+
+    tv = self.tradervue
+    window = 0 if full else window
+    with concurrent.futures.ThreadPoolExecutor(max_workers = self.jobs) as pool:
+      return { 'trades': self.__sync('trades', tv.iter_trades(), window, pool, self.__download_trade, self.__store_trade, True),
+               'journals': self.__sync('journals', tv.iter_journals(), window, pool, self.__download_journal, self.__store_journal),
+               'notes': self.__sync('notes', tv.iter_notes(), window, pool, self.__download_note, self.__store_note) }
+
+  def __sync(self, table, listing, window, pool, download, store, detailed = False):
+    known = dict(self.db.execute('SELECT id, marker FROM %s' % (table)))
+    counts = { 'added': 0, 'updated': 0, 'deleted': 0, 'unchanged': 0 }
+    seen = set()
+    changed = []
+    unchanged_run = 0
+    complete = True
+
+    try:
+      for listed in listing:
+        object_id = str(listed['id'])
+        seen.add(object_id)
+        marker = change_marker(listed)
+        if unchanged(marker, known.get(object_id), detailed):
+          counts['unchanged'] += 1
+          unchanged_run += 1
+          if window > 0 and unchanged_run >= window:
+            complete = False
+            break
+          continue
+
+        unchanged_run = 0
+        counts['updated' if object_id in known else 'added'] += 1
+        changed.append((listed, marker))
+        if len(changed) >= 100:
+          self.__store(changed, pool, download, store)
+          changed = []
+    finally:
+      # Stopping early abandons the listing; closing it waits for its page prefetch instead of leaving it running
+      listing.close()
+
+    self.__store(changed, pool, download, store)
+
+    # Only a complete walk shows which objects are gone
+    if complete:
+      deleted = [(object_id,) for object_id in known if object_id not in seen]
+      counts['deleted'] = len(deleted)
+      with self.db:
+        self.db.executemany('DELETE FROM %s WHERE id = ?' % (table), deleted)
+        self.db.executemany("DELETE FROM comments WHERE kind = '%s' AND object_id = ?" % (table), deleted)
+
+    self.log.info("Synced %s: %d added, %d updated, %d deleted, %d unchanged" % (table, counts['added'], counts['updated'], counts['deleted'], counts['unchanged']))
+    return counts
+
+  def __store(self, changed, pool, download, store):
+    # Downloads run on the pool; all database writes happen on this thread in one transaction
+    if len(changed) == 0:
+      return
+    results = pool.map(lambda item: download(item[0]), changed)
+    with self.db:
+      for (listed, marker), obj in zip(changed, results):
+        if obj is not None:
+          store(obj, marker)
+
+  def __download_trade(self, listed):
+    tv = self.tradervue
+    trade = tv.get_trade(listed['id'])
+    if trade is None:
+      return None
+    trade['executions'] = tv.get_trade_executions(trade['id']) if int(trade.get('exec_count', 0)) > 0 else []
+    trade['comments'] = tv.get_trade_comments(trade['id']) if int(trade.get('comment_count', 0)) > 0 else []
+    if trade['executions'] is None or trade['comments'] is None:
+      return None
+    return trade
+
+  def __download_journal(self, listed):
+    listed['comments'] = self.tradervue.get_journal_comments(listed['id']) if int(listed.get('comment_count', 0)) > 0 else []
+    return None if listed['comments'] is None else listed
+
+  def __download_note(self, listed):
+    listed['comments'] = self.tradervue.get_note_comments(listed['id']) if int(listed.get('comment_count', 0)) > 0 else []
+    return None if listed['comments'] is None else listed
+
+  def __store_comments(self, kind, object_id, comments):
+    self.db.execute('DELETE FROM comments WHERE kind = ? AND object_id = ?', (kind, object_id))
+    self.db.executemany('INSERT INTO comments (kind, object_id, position, data) VALUES (?, ?, ?, ?)',
+                        [(kind, object_id, i, json.dumps(c)) for i, c in enumerate(comments)])
+
+  def __store_trade(self, trade, marker):
+    trade_id = str(trade['id'])
+    executions = trade.pop('executions')
+    comments = trade.pop('comments')
+    start = trade.get('start_datetime') or ''
+
+    # Deleting the old row cascades to its tags and executions
+    self.db.execute('DELETE FROM trades WHERE id = ?', (trade_id,))
+    self.db.execute('INSERT INTO trades (id, symbol, side, duration, date, started_at, gross_pl, marker, data) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    (trade_id, trade.get('symbol'), trade.get('side'), trade.get('duration'), start[:10] or None, _timestamp(start), _number(trade.get('gross_pl')), marker, json.dumps(trade)))
+    self.db.executemany('INSERT INTO trade_tags (trade_id, tag) VALUES (?, ?)', [(trade_id, tag) for tag in set(trade.get('tags') or [])])
+    self.db.executemany('INSERT INTO executions (id, trade_id, position, datetime, symbol, quantity, price, data) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                        [(e.get('id'), trade_id, i, e.get('datetime'), e.get('symbol'), _number(e.get('quantity')), _number(e.get('price')), json.dumps(e)) for i, e in enumerate(executions)])
+    self.__store_comments('trades', trade_id, comments)
+
+  def __store_journal(self, journal, marker):
+    comments = journal.pop('comments')
+    self.db.execute('INSERT OR REPLACE INTO journals (id, date, marker, data) VALUES (?, ?, ?, ?)', (str(journal['id']), journal.get('date'), marker, json.dumps(journal)))
+    self.__store_comments('journals', str(journal['id']), comments)
+
+  def __store_note(self, note, marker):
+    comments = note.pop('comments')
+    self.db.execute('INSERT OR REPLACE INTO notes (id, marker, data) VALUES (?, ?, ?)', (str(note['id']), marker, json.dumps(note)))
+    self.__store_comments('notes', str(note['id']), comments)
+
+  ###########################################################################
+  # Queries
+  ###########################################################################
+
+  def __comments(self, kind, object_id):
+    return [json.loads(data) for (data,) in self.db.execute('SELECT data FROM comments WHERE kind = ? AND object_id = ? ORDER BY position', (kind, object_id))]
+
+  def __executions(self, trade_id):
+    return [json.loads(data) for (data,) in self.db.execute('SELECT data FROM executions WHERE trade_id = ? ORDER BY position', (trade_id,))]
+
+  @staticmethod
+  def __limit(sql, params, limit, offset):
+    if limit is not None:
+      return (sql + ' LIMIT ? OFFSET ?', params + [int(limit), int(offset)])
+    return (sql + ' LIMIT -1 OFFSET ?', params + [int(offset)])
+
+  def get_trades(self, symbol = None, tag_expr = None, side = None, duration = None, startdate = None, enddate = None, winners = None, include_comments = False, include_executions = False, max_trades = 25, offset = 0):
+    """Query the mirrored trades. The arguments and result are the same as for :meth:`Tradervue.get_trades <tradervue.tradervue.Tradervue.get_trades>`, except that ``max_trades`` may be ``None`` to return every match.
+
+       The trades are the full objects returned by :meth:`Tradervue.get_trade <tradervue.tradervue.Tradervue.get_trade>`, so they include ``notes``.
+
+       ``tag_expr`` combines tags with ``and`` (or ``&``), ``or`` (or ``|``) and ``not`` (or ``!``), grouped with
+       parentheses. Tags next to each other must all match.
+
+       :rtype: list
+    """
+    conditions = []
+    params = []
+    if symbol is not None:
+      conditions.append('symbol = ?')
+      params.append(symbol)
+    if tag_expr is not None:
+      condition, tag_params = _tag_filter(tag_expr)
+      conditions.append(condition)
+      params.extend(tag_params)
+    if side is not None:
+      conditions.append('side = ?')
+      params.append(_trade_side(side))
+    if duration is not None:
+      conditions.append('duration = ?')
+      params.append(_trade_duration(duration))
+    if startdate is not None:
+      conditions.append('date >= ?')
+      params.append(startdate.strftime('%Y-%m-%d'))
+    if enddate is not None:
+      conditions.append('date <= ?')
+      params.append(enddate.strftime('%Y-%m-%d'))
+    if winners is not None:
+      conditions.append('gross_pl > 0' if winners else 'gross_pl < 0')
+
+    sql = 'SELECT id, data FROM trades'
+    if len(conditions) > 0:
+      sql += ' WHERE ' + ' AND '.join(conditions)
+    sql += ' ORDER BY started_at DESC, CAST(id AS INTEGER) DESC'
+    sql, params = Mirror.__limit(sql, params, max_trades, offset)
+
+    trades = []
+    for trade_id, data in self.db.execute(sql, params).fetchall():
+      trade = json.loads(data)
+      if include_comments and int(trade.get('comment_count', 0)) > 0:
+        trade['comments'] = self.__comments('trades', trade_id)
+      if include_executions and int(trade.get('exec_count', 0)) > 0:
+        trade['executions'] = self.__executions(trade_id)
+      trades.append(trade)
+    return trades
+
+  def get_trade(self, trade_id):
+    """Return the mirrored trade, or ``None`` if it isn't in the mirror.
+
+       :rtype: dict or None
+    """
+    row = self.db.execute('SELECT data FROM trades WHERE id = ?', (str(trade_id),)).fetchone()
+    return None if row is None else json.loads(row[0])
+
+  def get_trade_executions(self, trade_id):
+    """Return the mirrored executions of a trade.
+
+       :rtype: list
+    """
+    return self.__executions(str(trade_id))
+
+  def get_trade_comments(self, trade_id):
+    """Return the mirrored comments of a trade.
+
+       :rtype: list
+    """
+    return self.__comments('trades', str(trade_id))
+
+  def get_journals(self, date = None, startdate = None, enddate = None, include_comments = False, max_journals = 25, offset = 0):
+    """Query the mirrored journals. The arguments and result are the same as for :meth:`Tradervue.get_journals <tradervue.tradervue.Tradervue.get_journals>`, except that ``max_journals`` may be ``None`` to return every match.
+
+       :rtype: list
+    """
+    if date is not None and (startdate is not None or enddate is not None):
+      raise ValueError("Cannot specify startdate or enddate if date is specified")
+
+    conditions = []
+    params = []
+    if date is not None:
+      conditions.append('date = ?')
+      params.append(date.strftime('%Y-%m-%d'))
+    if startdate is not None:
+      conditions.append('date >= ?')
+      params.append(startdate.strftime('%Y-%m-%d'))
+    if enddate is not None:
+      conditions.append('date <= ?')
+      params.append(enddate.strftime('%Y-%m-%d'))
+
+    sql = 'SELECT id, data FROM journals'
+    if len(conditions) > 0:
+      sql += ' WHERE ' + ' AND '.join(conditions)
+    sql += ' ORDER BY date DESC, CAST(id AS INTEGER) DESC'
+    sql, params = Mirror.__limit(sql, params, max_journals, offset)
+
+    journals = []
+    for journal_id, data in self.db.execute(sql, params).fetchall():
+      journal = json.loads(data)
+      if include_comments and int(journal.get('comment_count', 0)) > 0:
+        journal['comments'] = self.__comments('journals', journal_id)
+      journals.append(journal)
+    return journals
+
+  def get_notes(self, include_comments = False, max_notes = 25, offset = 0):
+    """Return the mirrored notes, newest first. ``max_notes`` may be ``None`` to return all of them.
+
+       :rtype: list
+    """
+    sql, params = Mirror.__limit('SELECT id, data FROM notes ORDER BY CAST(id AS INTEGER) DESC', [], max_notes, offset)
+
+    notes = []
+    for note_id, data in self.db.execute(sql, params).fetchall():
+      note = json.loads(data)
+      if include_comments and int(note.get('comment_count', 0)) > 0:
+        note['comments'] = self.__comments('notes', note_id)
+      notes.append(note)
+    return notes
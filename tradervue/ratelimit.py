@@ -0,0 +1,177 @@
+# vim: filetype=python shiftwidth=2 tabstop=2 expandtab
+#
+# Copyright (c) 2015, Jon Nall
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of tradervue-utils nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+.. module:: ratelimit
+   :platform: Unix, Windows
+   :synopsis: Adaptive request rate limiting for the Tradervue API
+
+.. moduleauthor:: Jon Nall <jon.nall@gmail.com>
+
+"""
+
+import email.utils
+import threading
+import time
+
+class RateLimiter:
+  """A thread-safe token bucket whose rate adapts to throttling by the server.
+
+     Every request first reserves a token with :meth:`reserve` and waits the returned number of seconds. The outcome
+     is then reported with :meth:`on_response`. A 429 or 503 response cuts the rate multiplicatively and pauses all
+     requests for the ``Retry-After`` period if the server sent one. Each other response raises the rate additively,
+     up to ``max_rate`` (AIMD).
+
+     Clients created with the same credentials share one limiter (see :meth:`shared`), so their combined request rate
+     is limited, not each client's individually.
+  """
+
+  THROTTLE_STATUS_CODES = (429, 503)
+
+  __shared = {}
+  __shared_lock = threading.Lock()
+
+  def __init__(self, rate = 20.0, burst = 20, min_rate = 0.5, max_rate = 100.0, increase = 5.0, decrease = 0.5):
+    """Construct a RateLimiter instance.
+
+       :param float rate: the initial number of requests per second
+       :param int burst: the maximum number of requests that can be issued back-to-back after an idle period
+       :param float min_rate: the rate is never cut below this many requests per second. It's lowered to ``max_rate`` if it's higher.
+       :param float max_rate: the rate never grows beyond this many requests per second
+       :param float increase: how many requests per second the rate grows by over one second of unthrottled responses
+       :param float decrease: the factor the rate is multiplied by when the server throttles a request
+       :return: the RateLimiter instance
+       :rtype: RateLimiter
+    """
+    self.rate = float(rate)
+    self.burst = burst
+    # max_rate is the hard limit, so throttling must not push the rate above it
+    self.min_rate = min(min_rate, max_rate)
+    self.max_rate = max_rate
+    self.increase = increase
+    self.decrease = decrease
+
+    self.throttled = 0
+    self.waited = 0.0
+
+    self.__lock = threading.Lock()
+    self.__tokens = float(burst)
+    self.__last = time.time()
+    self.__blocked_until = 0.0
+    self.__last_decrease = 0.0
+
+  @classmethod
+  def shared(cls, baseurl, username):
+    """Return the limiter shared by all clients using ``username`` on ``baseurl``, creating it if needed.
+    """
+    key = (baseurl, username)
+    with cls.__shared_lock:
+      if key not in cls.__shared:
+        cls.__shared[key] = cls()
+      return cls.__shared[key]
+
+  def reserve(self):
+    """Take a token for one request.
+
+       :return: the number of seconds the caller must wait before issuing the request
+       :rtype: float
+    """
+    with self.__lock:
+      now = time.time()
+      self.__tokens = min(self.burst, self.__tokens + (now - self.__last) * self.rate)
+      self.__last = now
+      self.__tokens -= 1
+
+      # A negative balance is a reservation against tokens that haven't been generated yet
+      delay = -self.__tokens / self.rate if self.__tokens < 0 else 0.0
+      delay = max(delay, self.__blocked_until - now)
+      self.waited += delay
+      return delay
+
+  def acquire(self):
+    """Block until a request may be issued.
+    """
+    delay = self.reserve()
+    if delay > 0:
+      time.sleep(delay)
+
+  def on_response(self, status_code, retry_after = None):
+    """Adapt the rate to the outcome of a request.
+
+       :param int status_code: the HTTP status of the response
+       :param retry_after: the value of the response's ``Retry-After`` header, if any. Both the delta-seconds and HTTP-date forms are accepted.
+       :type retry_after: str or None
+       :return: ``True`` if the server throttled the request
+       :rtype: bool
+    """
+    with self.__lock:
+      if status_code not in RateLimiter.THROTTLE_STATUS_CODES:
+        # Additive increase: after one second's worth of successful requests the rate has grown by ``increase``
+        self.rate = min(self.max_rate, self.rate + self.increase / self.rate)
+        return False
+
+      self.throttled += 1
+
+      # Concurrent requests tend to be throttled together. Cut the rate once per burst of throttling, not once for
+      # every one of those requests.
+      now = time.time()
+      if now - self.__last_decrease >= 1.0:
+        self.__last_decrease = now
+        self.rate = max(self.min_rate, self.rate * self.decrease)
+        self.__tokens = min(self.__tokens, 0.0)
+
+      delay = RateLimiter.parse_retry_after(retry_after)
+      if delay is not None:
+        self.__blocked_until = max(self.__blocked_until, now + delay)
+      return True
+
+  @staticmethod
+  def parse_retry_after(value):
+    """Convert a ``Retry-After`` header value to a number of seconds, or ``None`` if it can't be parsed.
+    """
+    if value is None:
+      return None
+    try:
+      return max(0.0, float(value))
+    except ValueError:
+      pass
+    try:
+      return max(0.0, email.utils.mktime_tz(email.utils.parsedate_tz(value)) - time.time())
+    except (TypeError, ValueError):
+      return None
+
+  def stats(self):
+    """Return a snapshot of the limiter state.
+
+       :return: a dict with ``rate`` (requests/sec), ``throttled`` (number of 429/503 responses) and ``waited`` (total seconds requests were delayed) keys
+       :rtype: dict
+    """
+    with self.__lock:
+      return { 'rate': self.rate, 'throttled': self.throttled, 'waited': self.waited }
@@ -0,0 +1,224 @@
+# vim: filetype=python shiftwidth=2 tabstop=2 expandtab
+#
+# Copyright (c) 2015, Jon Nall
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of tradervue-utils nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+.. module:: records
+   :platform: Unix, Windows
+   :synopsis: Compact record types for Tradervue objects
+
+.. moduleauthor:: Jon Nall <jon.nall@gmail.com>
+
+"""
+
+import sys
+
+def _intern(value):
+  return sys.intern(value) if isinstance(value, str) else value
+
+class Record:
+  """The base of the record types. A record stores the fields of one Tradervue object in ``__slots__`` rather than a
+     dict, so it doesn't carry a hash table and a copy of every key. Strings that repeat from object to object
+     (symbols, sides, tags) are interned so all records share one copy.
+
+     Fields are read as attributes (``trade.symbol``) or, so code written against the dicts keeps working, with
+     ``trade['symbol']`` and ``trade.get('symbol')``. Reading a field the object didn't have (or that was left out by
+     a ``fields`` projection) raises :class:`AttributeError` (or :class:`KeyError` for ``[]``). Keys that aren't
+     among :attr:`FIELDS` are kept in a dict in ``extra``.
+  """
+
+  __slots__ = ('extra',)
+
+  """The names of the fields stored in slots
+  """
+  FIELDS = ()
+
+  """Fields whose string values are interned
+  """
+  INTERNED = ()
+
+  """Fields holding lists of sub-objects, mapped to the record type of the sub-objects
+  """
+  NESTED = {}
+
+  @classmethod
+  def from_dict(cls, obj, fields = None):
+    """Convert an object as returned by the API.
+
+       :param dict obj: the object
+       :param fields: the keys to keep. ``None`` keeps all of them. Sub-objects (e.g. a trade's executions) are kept whole.
+       :type fields: set or None
+       :rtype: Record
+    """
+    record = cls.__new__(cls)
+    record.extra = None
+    slots = cls.FIELDS
+    for key, value in obj.items():
+      if fields is not None and key not in fields:
+        continue
+
+      if key in cls.INTERNED:
+        value = _intern(value)
+      elif key == 'tags' and isinstance(value, list):
+        value = tuple(_intern(tag) for tag in value)
+      elif key in cls.NESTED and isinstance(value, list):
+        value = [cls.NESTED[key].from_dict(item) for item in value]
+
+      if key in slots:
+        setattr(record, key, value)
+      else:
+        if record.extra is None:
+          record.extra = {}
+        record.extra[key] = value
+    return record
+
+  def __getattr__(self, name):
+    # Only called for fields that were never set
+    if name != 'extra' and self.extra is not None and name in self.extra:
+      return self.extra[name]
+    raise AttributeError("%s has no '%s' field" % (self.__class__.__name__, name))
+
+  def keys(self):
+    """Return the names of the fields that are set, in the order of :attr:`FIELDS` followed by any extra keys.
+
+       :rtype: list
+    """
+    keys = [name for name in self.FIELDS if hasattr(self, name)]
+    if self.extra is not None:
+      keys.extend(self.extra.keys())
+    return keys
+
+  def __contains__(self, name):
+    return hasattr(self, name)
+
+  def __getitem__(self, name):
+    try:
+      return getattr(self, name)
+    except AttributeError:
+      raise KeyError(name)
+
+  def get(self, name, default = None):
+    return getattr(self, name, default)
+
+  def to_dict(self):
+    """Convert back to the dict the API returned (less any fields that were projected away).
+
+       :rtype: dict
+    """
+    result = {}
+    for name in self.keys():
+      value = getattr(self, name)
+      if name in self.NESTED and isinstance(value, list):
+        value = [item.to_dict() for item in value]
+      elif name == 'tags' and isinstance(value, tuple):
+        value = list(value)
+      result[name] = value
+    return result
+
+  def __eq__(self, other):
+    return type(self) is type(other) and self.to_dict() == other.to_dict()
+
+  def __ne__(self, other):
+    return not self == other
+
+  __hash__ = None
+
+  def __repr__(self):
+    return '%s(%s)' % (self.__class__.__name__, ', '.join('%s=%r' % (name, getattr(self, name)) for name in self.keys()))
+
+class Comment(Record):
+  """A comment on a trade, journal entry or note.
+  """
+  FIELDS = ('id', 'comment', 'user', 'created_at', 'updated_at')
+  __slots__ = FIELDS
+  INTERNED = ('user',)
+
+class Execution(Record):
+  """An execution of a trade.
+  """
+  FIELDS = ('id', 'datetime', 'symbol', 'quantity', 'price', 'option', 'commission', 'transfee', 'ecnfee')
+  __slots__ = FIELDS
+  INTERNED = ('symbol', 'option')
+
+class Trade(Record):
+  """A trade, with its executions and comments as :class:`Execution` and :class:`Comment` records if they were fetched.
+  """
+  FIELDS = ('id', 'symbol', 'side', 'duration', 'open', 'volume', 'gross_pl', 'native_pl', 'initial_risk', 'shared', 'notes', 'tags', 'exec_count', 'comment_count', 'start_datetime', 'end_datetime', 'updated_at', 'executions', 'comments', 'fetch_errors')
+  __slots__ = FIELDS
+  INTERNED = ('symbol', 'side', 'duration')
+  NESTED = { 'executions': Execution, 'comments': Comment }
+
+class JournalEntry(Record):
+  """A journal entry, with its comments as :class:`Comment` records if they were fetched.
+  """
+  FIELDS = ('id', 'date', 'notes', 'comment_count', 'trade_ids', 'created_at', 'updated_at', 'comments', 'fetch_errors')
+  __slots__ = FIELDS
+  NESTED = { 'comments': Comment }
+
+class Note(Record):
+  """A journal note, with its comments as :class:`Comment` records if they were fetched.
+  """
+  FIELDS = ('id', 'notes', 'comment_count', 'created_at', 'updated_at', 'comments', 'fetch_errors')
+  __slots__ = FIELDS
+  NESTED = { 'comments': Comment }
+
+def projection(fields, keep = ()):
+  """Return the set of keys a ``fields`` projection keeps.
+
+     :param fields: the keys asked for
+     :param keep: keys that are always kept, e.g. the sub-resources being fetched
+     :type fields: iterable of str or None
+     :type keep: iterable of str
+     :return: the keys, or ``None`` to keep everything
+     :rtype: frozenset or None
+  """
+  if fields is None:
+    return None
+  if isinstance(fields, str):
+    fields = [fields]
+  return frozenset(fields) | frozenset(keep) | frozenset(['fetch_errors'])
+
+def shape(objects, record_type, fields = None, records = False):
+  """Apply a ``fields`` projection to a list of objects and optionally convert them to records.
+
+     :param list objects: the objects as returned by the API
+     :param type record_type: the :class:`Record` subclass to convert to
+     :param fields: the keys to keep (see :func:`projection`)
+     :param bool records: convert the objects to ``record_type`` instances rather than returning dicts
+     :type fields: frozenset or None
+     :rtype: list
+  """
+  if objects is None:
+    return None
+  if records:
+    return [record_type.from_dict(obj, fields) for obj in objects]
+  if fields is None:
+    return objects
+  return [dict((key, value) for (key, value) in obj.items() if key in fields) for obj in objects]
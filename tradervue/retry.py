@@ -0,0 +1,123 @@
+# vim: filetype=python shiftwidth=2 tabstop=2 expandtab
+#
+# Copyright (c) 2015, Jon Nall
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of tradervue-utils nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+.. module:: retry
+   :platform: Unix, Windows
+   :synopsis: Retry and polling schedules for the Tradervue API
+
+.. moduleauthor:: Jon Nall <jon.nall@gmail.com>
+
+"""
+
+import random
+import time
+
+class RetryPolicy:
+  """Describes how long to wait between attempts of an operation that may need to be repeated.
+
+     The wait starts at ``min_interval`` and grows by ``multiplier`` after every attempt, up to ``max_interval``.
+     Each wait, including the first, is then shortened by a random fraction of up to ``jitter`` so that several
+     clients don't retry in lockstep. No more waits are scheduled once ``deadline`` seconds have passed since the first attempt, or once
+     ``max_attempts`` attempts have been made.
+
+     A policy holds no state and can be reused; call :meth:`start` for each operation.
+  """
+
+  def __init__(self, min_interval = 1.0, max_interval = 30.0, multiplier = 2.0, jitter = 0.25, deadline = 300.0, max_attempts = None):
+    """Construct a RetryPolicy instance.
+
+       :param float min_interval: the first (and shortest) wait in seconds
+       :param float max_interval: the longest wait in seconds
+       :param float multiplier: the factor each wait grows by
+       :param float jitter: the maximum fraction (between 0 and 1) each wait is randomly shortened by. ``0`` gives fixed waits.
+       :param deadline: the total number of seconds to keep trying. ``None`` means no limit.
+       :param max_attempts: the total number of attempts to make. ``None`` means no limit.
+       :type deadline: float or None
+       :type max_attempts: int or None
+       :return: the RetryPolicy instance
+       :rtype: RetryPolicy
+    """
+    if deadline is None and max_attempts is None:
+      raise ValueError("A RetryPolicy needs a deadline, max_attempts or both")
+
+    self.min_interval = min_interval
+    self.max_interval = max(min_interval, max_interval)
+    self.multiplier = multiplier
+    self.jitter = jitter
+    self.deadline = deadline
+    self.max_attempts = max_attempts
+
+  def start(self):
+    """Begin a new operation governed by this policy.
+
+       :return: the schedule for the operation
+       :rtype: RetrySchedule
+    """
+    return RetrySchedule(self)
+
+class RetrySchedule:
+  """Tracks the attempts of one operation. Create these with :meth:`RetryPolicy.start`.
+  """
+
+  def __init__(self, policy):
+    self.policy = policy
+    self.attempts = 0
+    self.waited = 0.0
+    self.started = time.time()
+
+  def elapsed(self):
+    """Return the number of seconds since the operation started.
+    """
+    return time.time() - self.started
+
+  def next_delay(self):
+    """Record a failed (or unfinished) attempt and return how long to wait before the next one.
+
+       :return: the number of seconds to wait, or ``None`` if the policy's attempts or deadline are exhausted
+       :rtype: float or None
+    """
+    policy = self.policy
+    self.attempts += 1
+    if policy.max_attempts is not None and self.attempts >= policy.max_attempts:
+      return None
+
+    # Jitter comes after the clamping, otherwise it could never shorten the first (min_interval) wait
+    delay = min(policy.max_interval, policy.min_interval * (policy.multiplier ** (self.attempts - 1)))
+    delay *= 1.0 - policy.jitter * random.random()
+
+    if policy.deadline is not None:
+      remaining = policy.deadline - self.elapsed()
+      if remaining <= 0:
+        return None
+      delay = min(delay, remaining)
+
+    self.waited += delay
+    return delay
@@ -0,0 +1,315 @@
+# vim: filetype=python shiftwidth=2 tabstop=2 expandtab
+#
+# Copyright (c) 2015, Jon Nall
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of tradervue-utils nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+.. module:: snapshots
+   :platform: Unix, Windows
+   :synopsis: A deduplicated, content-addressed store of backup snapshots
+
+.. moduleauthor:: Jon Nall <jon.nall@gmail.com>
+
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import re
+import time
+import zlib
+
+_NAME = re.compile(r'^[A-Za-z0-9_.-]+$')
+
+def _encode(obj):
+  # Key order is preserved so a restored backup matches the original byte for byte
+  return json.dumps(obj, separators = (',', ':'), ensure_ascii = False).encode('utf-8')
+
+def _replace(path, data):
+  tmp_path = '%s.%d.tmp' % (path, os.getpid())
+  with open(tmp_path, 'wb') as fh:
+    fh.write(data)
+  os.replace(tmp_path, path)
+
+class SnapshotStore:
+  """A directory of backup snapshots in which every trade, journal entry and note is stored once.
+
+     Each object is stored compressed under the SHA-256 hash of its JSON, so an object that is the same in many
+     snapshots takes the space of one. A snapshot is a list of those hashes, in backup order, along with a small
+     summary. Writing a snapshot only writes the objects that aren't in the store yet, so the disk space and time it
+     takes grow with what changed rather than with the size of the account.
+
+     The layout of the directory is::
+
+       objects/<first 2 hex digits>/<remaining 62 hex digits>   an object's JSON, zlib compressed
+       snapshots/<name>.refs.gz                                 one "<kind> <hash>" line per object, in order
+       snapshots/<name>.json                                    the summary, written last so it marks a complete snapshot
+
+     Objects no longer referenced by any snapshot stay until :meth:`gc` is run. Don't run :meth:`gc` while a snapshot
+     is being written.
+  """
+
+  def __init__(self, path, level = 6):
+    """Construct a SnapshotStore instance, creating the directory if needed.
+
+       :param str path: the store's directory
+       :param int level: the zlib compression level of new objects
+       :return: the SnapshotStore instance
+       :rtype: SnapshotStore
+    """
+    self.path = path
+    self.level = level
+    self.objects_path = os.path.join(path, 'objects')
+    self.snapshots_path = os.path.join(path, 'snapshots')
+    for directory in (self.objects_path, self.snapshots_path):
+      if not os.path.isdir(directory):
+        os.makedirs(directory)
+
+  def __object_path(self, digest):
+    return os.path.join(self.objects_path, digest[:2], digest[2:])
+
+  def __summary_path(self, name):
+    return os.path.join(self.snapshots_path, '%s.json' % (name))
+
+  def __refs_path(self, name):
+    return os.path.join(self.snapshots_path, '%s.refs.gz' % (name))
+
+  def put(self, data):
+    """Store the encoded object ``data`` unless it's already stored.
+
+       :param bytes data: the object's JSON
+       :return: (the object's hash, the number of compressed bytes written, which is 0 if it was already stored)
+       :rtype: tuple
+    """
+    digest = hashlib.sha256(data).hexdigest()
+    path = self.__object_path(digest)
+    if os.path.exists(path):
+      return (digest, 0)
+
+    directory = os.path.dirname(path)
+    if not os.path.isdir(directory):
+      os.makedirs(directory, exist_ok = True)
+    compressed = zlib.compress(data, self.level)
+    _replace(path, compressed)
+    return (digest, len(compressed))
+
+  def get(self, digest):
+    """Return the object stored under ``digest``.
+
+       :param str digest: the object's hash
+       :rtype: dict
+       :raises IOError: if the object is missing
+    """
+    with open(self.__object_path(digest), 'rb') as fh:
+      return json.loads(zlib.decompress(fh.read()).decode('utf-8'))
+
+  def writer(self, name):
+    """Start writing a new snapshot.
+
+       :param str name: the snapshot's name. Letters, digits, ``_``, ``.`` and ``-`` only.
+       :rtype: SnapshotWriter
+       :raises ValueError: if the name is invalid or already taken
+    """
+    if _NAME.match(name) is None:
+      raise ValueError("Invalid snapshot name '%s'" % (name))
+    if self.exists(name):
+      raise ValueError("Snapshot '%s' already exists in %s" % (name, self.path))
+    return SnapshotWriter(self, name, self.__refs_path(name), self.__summary_path(name))
+
+  def exists(self, name):
+    """Return ``True`` if a complete snapshot called ``name`` exists.
+    """
+    return os.path.exists(self.__summary_path(name))
+
+  def snapshots(self):
+    """Return the summaries of all complete snapshots, oldest first.
+
+       Each summary is a dict with the ``name``, the ``created`` time (seconds since the epoch), the number of objects
+       of each kind (``counts``), and the number of new objects (``new_objects``) and compressed bytes
+       (``bytes_written``) the snapshot added to the store.
+
+       :rtype: list of dict
+    """
+    result = []
+    for filename in os.listdir(self.snapshots_path):
+      if filename.endswith('.json'):
+        with open(os.path.join(self.snapshots_path, filename), 'r') as fh:
+          result.append(json.load(fh))
+    result.sort(key = lambda summary: (summary['created'], summary['name']))
+    return result
+
+  def latest(self):
+    """Return the name of the newest snapshot, or ``None`` if there are none.
+    """
+    summaries = self.snapshots()
+    return summaries[-1]['name'] if len(summaries) > 0 else None
+
+  def refs(self, name):
+    """Yield the ``(kind, hash)`` of every object of a snapshot, in backup order.
+
+       :raises KeyError: if there's no such snapshot
+    """
+    if not self.exists(name):
+      raise KeyError(name)
+    with gzip.open(self.__refs_path(name), 'rt') as fh:
+      for line in fh:
+        (kind, digest) = line.split()
+        yield (kind, digest)
+
+  def iter_objects(self, name, kind = None):
+    """Yield the objects of a snapshot one at a time, in backup order.
+
+       :param str name: the snapshot
+       :param kind: only yield objects of this kind (``'journals'``, ``'notes'`` or ``'trades'``)
+       :type kind: str or None
+       :return: a generator of ``(kind, object)`` tuples
+       :rtype: generator
+       :raises KeyError: if there's no such snapshot
+    """
+    for (object_kind, digest) in self.refs(name):
+      if kind is None or object_kind == kind:
+        yield (object_kind, self.get(digest))
+
+  def load(self, name):
+    """Return a whole snapshot in the form of a decoded tv-backup file: a dict mapping each kind to a list of objects.
+
+       :rtype: dict
+       :raises KeyError: if there's no such snapshot
+    """
+    result = dict((kind, []) for kind in self.__summary(name)['counts'])
+    for (kind, obj) in self.iter_objects(name):
+      result.setdefault(kind, []).append(obj)
+    return result
+
+  def __summary(self, name):
+    try:
+      with open(self.__summary_path(name), 'r') as fh:
+        return json.load(fh)
+    except (IOError, OSError):
+      raise KeyError(name)
+
+  def remove(self, name):
+    """Remove a snapshot. Its objects stay in the store until :meth:`gc` finds them unreferenced.
+
+       :raises KeyError: if there's no such snapshot
+    """
+    if not self.exists(name):
+      raise KeyError(name)
+    # The summary goes first so a partly removed snapshot is never listed
+    os.remove(self.__summary_path(name))
+    if os.path.exists(self.__refs_path(name)):
+      os.remove(self.__refs_path(name))
+
+  def gc(self, keep = None):
+    """Remove the objects no snapshot refers to, and leftovers of snapshots that were never completed.
+
+       :param keep: first remove all but the newest ``keep`` snapshots. ``None`` keeps every snapshot.
+       :type keep: int or None
+       :return: a dict with the number of ``snapshots_removed``, ``objects_removed`` and ``bytes_freed``
+       :rtype: dict
+    """
+    result = { 'snapshots_removed': 0, 'objects_removed': 0, 'bytes_freed': 0 }
+    summaries = self.snapshots()
+    if keep is not None and len(summaries) > keep:
+      for summary in summaries[:len(summaries) - keep]:
+        self.remove(summary['name'])
+        result['snapshots_removed'] += 1
+      summaries = summaries[len(summaries) - keep:]
+
+    referenced = set()
+    names = set()
+    for summary in summaries:
+      names.add(summary['name'])
+      referenced.update(digest for (kind, digest) in self.refs(summary['name']))
+
+    for filename in os.listdir(self.snapshots_path):
+      if filename.endswith('.refs.gz') and filename[:-len('.refs.gz')] not in names:
+        path = os.path.join(self.snapshots_path, filename)
+        result['bytes_freed'] += os.path.getsize(path)
+        os.remove(path)
+
+    for prefix in os.listdir(self.objects_path):
+      directory = os.path.join(self.objects_path, prefix)
+      for filename in os.listdir(directory):
+        if prefix + filename not in referenced:
+          path = os.path.join(directory, filename)
+          result['bytes_freed'] += os.path.getsize(path)
+          os.remove(path)
+          result['objects_removed'] += 1
+    return result
+
+class SnapshotWriter:
+  """Writes one snapshot. Create these with :meth:`SnapshotStore.writer`.
+
+     This has the same interface as tv-backup's writer for backup files: objects are added a section at a time with
+     :meth:`write_section` and the snapshot is completed by :meth:`close`.
+  """
+
+  def __init__(self, store, name, refs_path, summary_path):
+    self.store = store
+    self.name = name
+    self.counts = {}
+    self.new_objects = 0
+    self.bytes_written = 0
+    self.__refs_path = refs_path
+    self.__summary_path = summary_path
+    self.__refs = gzip.open(refs_path, 'wt')
+
+  def write_section(self, kind, objects):
+    """Add ``objects`` to the snapshot under ``kind``.
+
+       :return: the number of objects added
+       :rtype: int
+    """
+    count = 0
+    for obj in objects:
+      (digest, written) = self.store.put(_encode(obj))
+      self.__refs.write('%s %s\n' % (kind, digest))
+      if written > 0:
+        self.new_objects += 1
+        self.bytes_written += written
+      count += 1
+    self.counts[kind] = self.counts.get(kind, 0) + count
+    return count
+
+  def close(self):
+    """Complete the snapshot.
+    """
+    self.__refs.close()
+    self.bytes_written += os.path.getsize(self.__refs_path)
+    summary = { 'name': self.name, 'created': time.time(), 'counts': self.counts, 'new_objects': self.new_objects, 'bytes_written': self.bytes_written }
+    _replace(self.__summary_path, json.dumps(summary).encode('utf-8'))
+
+  def abort(self):
+    """Give up on the snapshot. Objects it already stored are left for :meth:`SnapshotStore.gc`.
+    """
+    self.__refs.close()
+    if os.path.exists(self.__refs_path):
+      os.remove(self.__refs_path)
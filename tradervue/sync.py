@@ -0,0 +1,68 @@
+# vim: filetype=python shiftwidth=2 tabstop=2 expandtab
+#
+# Copyright (c) 2015, Jon Nall
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of tradervue-utils nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+.. module:: sync
+   :platform: Unix, Windows
+   :synopsis: Change detection for incremental copies of a Tradervue account
+
+.. moduleauthor:: Jon Nall <jon.nall@gmail.com>
+
+"""
+
+import hashlib
+import json
+
+def change_marker(obj):
+  """Return a string that changes whenever a listed object changes.
+
+     The server's own modification time is used if the object has an ``updated_at``. Otherwise any change to the
+     listed fields (notes, tags, comment or execution counts, P&L, ...) changes a hash of the whole object.
+
+     :param dict obj: the object as it appears in a listing
+     :rtype: str
+  """
+  if 'updated_at' in obj:
+    return 'updated_at:%s' % (obj['updated_at'])
+  return 'sha1:%s' % (hashlib.sha1(json.dumps(obj, sort_keys = True).encode('utf-8')).hexdigest())
+
+def unchanged(marker, previous_marker, detailed = False):
+  """Return ``True`` if an object whose listing has ``marker`` can be reused from a copy made when it had
+     ``previous_marker``.
+
+     :param str marker: the :func:`change_marker` of the object's current listing
+     :param previous_marker: the marker recorded along with the copy, or ``None`` if there is no copy
+     :param bool detailed: ``True`` if the copy holds more than the listing, e.g. a trade's notes from :meth:`~tradervue.tradervue.Tradervue.get_trade`. Edits to those don't change a hash of the listed fields, so only an unchanged ``updated_at`` shows that such a copy is current.
+     :type previous_marker: str or None
+     :rtype: bool
+  """
+  if previous_marker is None or marker != previous_marker:
+    return False
+  return not detailed or marker.startswith('updated_at:')
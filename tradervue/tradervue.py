@@ -37,15 +37,23 @@
 
 """
 
-import copy
+import concurrent.futures
+import gzip
 import json
 import logging
 import math
 import re
 import requests
+import requests.adapters
 import sys
 import time
 
+from . import codec
+from .metrics import Metrics
+from .ratelimit import RateLimiter
+from .records import Trade, JournalEntry, Note, projection, shape
+from .retry import RetryPolicy
+
 try:
   from colorama import Fore
 except ImportError:
@@ -80,6 +88,214 @@ class TradervueLogFormatter(logging.Formatter):
 
     return '%s-%s- %-15s %s%s' % (prefix, severity, self.formatTime(record, datefmt = None), record.msg, suffix)
 
+def _log_bad_http_response(log, r, msg, show_url = False, target_user = None):
+
+  # See if we can parse out a JSON error repsonse. If not, no big deal
+  status = "HTTP Status: %d" % (r.status_code)
+  if show_url:
+    status += ", URL: %s" % (r.url)
+
+  server_error = 'UNKNOWN'
+  try:
+    jdata = json.loads(r.text)
+    if 'error' in jdata:
+      server_error = jdata['error']
+    elif 'status' in jdata:
+      server_error = jdata['status']
+    else:
+      log.error("Unexpected JSON received for bad HTTP reponse (no status or error field found)")
+      server_error = r.text
+  except ValueError as e:
+    server_error = r.text
+    
+  log.error(msg)
+  log.error(status)
+  log.error("Server error: %s" % (server_error))
+
+  if r.status_code == 403 and target_user:
+    log.error("No permission to issue API calls on behalf of user %s" % (target_user))
+
+def _endpoint(baseurl, url):
+  # The first path component after the API root, e.g. 'trades' for <baseurl>/trades/1234/executions
+  return url[len(baseurl) + 1:].split('/', 1)[0]
+
+def _replayed_headers(interaction):
+  headers = requests.structures.CaseInsensitiveDict(interaction.headers)
+  headers['Content-Length'] = str(len(interaction.content))
+  return headers
+
+def _replayed_response(method, url, params, interaction):
+  r = requests.models.Response()
+  r.status_code = interaction.status
+  r.headers = _replayed_headers(interaction)
+  r.url = requests.Request(method, url, params = params).prepare().url
+  r.encoding = 'utf-8'
+  r._content = interaction.content
+  r._content_consumed = True
+  return r
+
+def _trade_side(side):
+  # The side as trades report it ('long' or 'short')
+  if not re.match(r'^(long|short)$', side, re.IGNORECASE):
+    raise ValueError("The 'side' parameter to get_trades must be 'Long' or 'Short'. Saw '%s'" % (side))
+  return side.lower()
+
+def _trade_duration(duration):
+  # The duration as trades report it ('intraday' or 'multiday')
+  if not re.match(r'^(intraday|multiday)$', duration, re.IGNORECASE):
+    raise ValueError("The 'duration' parameter to get_trades must be 'Intraday' or 'Multiday'. Saw '%s'" % (duration))
+  return duration.lower()
+
+def _trades_query(symbol, tag_expr, side, duration, startdate, enddate, winners):
+  data = { }
+  if symbol is not None: data['symbol'] = symbol
+  if tag_expr is not None: data['tag'] = tag_expr
+  if side is not None: data['side'] = _trade_side(side)[0].upper()
+  if duration is not None: data['duration'] = _trade_duration(duration)[0].upper()
+
+  if startdate is not None: data['startdate'] = startdate.strftime('%m/%d/%Y')
+  if enddate is not None: data['enddate'] = enddate.strftime('%m/%d/%Y')
+  if winners is not None: data['plgross'] = 'W' if winners else 'L'
+
+  return data
+
+def _journals_query(date, startdate, enddate):
+  if date is not None and (startdate is not None or enddate is not None):
+    raise ValueError("Cannot specify startdate or enddate if date is specified")
+
+  data = { }
+  if date is not None: data['d'] = date.strftime('%m/%d/%Y')
+  if startdate is not None: data['startdate'] = startdate.strftime('%m/%d/%Y')
+  if enddate is not None: data['enddate'] = enddate.strftime('%m/%d/%Y')
+
+  return data
+
+def _shape(objects, record_type, fetches, fields, records):
+  # The sub-resources asked for with include_* survive any projection
+  return shape(objects, record_type, projection(fields, [result_key for (result_key, count_key, fetch_fn) in fetches]), records)
+
+def _page_shaper(record_type, fetches, fields, records):
+  if fields is None and not records:
+    return None
+  return lambda page: _shape(page, record_type, fetches, fields, records)
+
+def _import_header(account_tag, tags, allow_duplicates, overlay_commissions, caller = 'import_executions'):
+  if tags is not None:
+    if not isinstance(tags, list):
+      raise TypeError("The tags argument (if specified) to %s must be a list, but found %s" % (caller, type(tags)))
+
+  data = { 'allow_duplicates': allow_duplicates, 'overlay_commissions': overlay_commissions }
+
+  # TV doesn't automatically add the account_tag. It must be explicitly added to the tags list
+  if account_tag is not None:
+    data['account_tag'] = account_tag
+    if tags is None: tags = []
+
+  if tags is not None: data['tags'] = tags
+
+  return data
+
+def _import_payload(executions, account_tag, tags, allow_duplicates, overlay_commissions):
+  if len(executions) == 0:
+    raise ValueError("Found 0 executions to import in import_executions. Must specify at least 1")
+  if not isinstance(executions, list):
+    raise TypeError("The executions argument to import_executions must be a list, but found %s" % (type(executions)))
+
+  data = _import_header(account_tag, tags, allow_duplicates, overlay_commissions)
+  data['executions'] = executions
+
+  return data
+
+def _import_batches(executions, header, max_rows, max_bytes):
+  """Split ``executions`` into import request bodies of at most ``max_rows`` executions and (roughly) ``max_bytes``.
+
+     Yields (execution count, JSON body) tuples. Executions are serialized one at a time as the iterable is consumed,
+     so the whole iterable never has to be in memory. A single execution larger than ``max_bytes`` gets a chunk of
+     its own.
+  """
+  prefix = codec.dumps(header)[:-1] + b',"executions":['
+  suffix = b']}'
+
+  parts = []
+  size = len(prefix) + len(suffix)
+  for execution in executions:
+    part = codec.dumps(execution)
+    if len(parts) > 0 and (len(parts) >= max_rows or size + len(part) + 1 > max_bytes):
+      yield (len(parts), prefix + b','.join(parts) + suffix)
+      parts = []
+      size = len(prefix) + len(suffix)
+    parts.append(part)
+    size += len(part) + 1
+
+  if len(parts) > 0:
+    yield (len(parts), prefix + b','.join(parts) + suffix)
+
+def _import_chunk(index, count, size, result, timing):
+  if isinstance(result, dict):
+    status = result['status']
+  elif result is False:
+    status = 'not submitted'
+  else:
+    status = 'unknown'
+  return { 'index': index, 'executions': count, 'bytes': size, 'status': status, 'result': result if isinstance(result, dict) else None, 'timing': timing }
+
+def _import_summary(chunks, elapsed):
+  summary = { 'chunks': len(chunks), 'executions': 0, 'bytes': 0, 'seconds': elapsed }
+  for status in ['succeeded', 'failed', 'not submitted', 'unknown']:
+    summary[status] = 0
+  for chunk in chunks:
+    summary['executions'] += chunk['executions']
+    summary['bytes'] += chunk['bytes']
+    summary[chunk['status']] = summary.get(chunk['status'], 0) + 1
+  return summary
+
+def _check_import_status(log, result):
+  if result is None:
+    return None
+  elif not 'status' in result:
+    log.error("Unable to find 'status' key in result: %s" % (result))
+    return None
+  elif not result['status'] in ['ready', 'queued', 'processing', 'succeeded', 'failed' ]:
+    log.error("Unexpected status '%s' for import status. Check API and update library. Result = %s" % (result['status'], result))
+    return None
+  return result
+
+def _import_policies(import_retries, wait_retries, secs_per_wait_retry, busy_policy, poll_policy):
+  # The older count/interval arguments still work, and bring back the fixed waits they used to describe: busy imports
+  # were retried 5 seconds apart, and the status was polled once up front and then wait_retries + 1 more times.
+  if busy_policy is None:
+    busy_policy = Tradervue.IMPORT_BUSY_POLICY
+    if import_retries is not None:
+      busy_policy = RetryPolicy(min_interval = 5.0, max_interval = 5.0, multiplier = 1.0, jitter = 0.0, deadline = None, max_attempts = import_retries)
+
+  if poll_policy is None:
+    poll_policy = Tradervue.IMPORT_POLL_POLICY
+    if wait_retries is not None or secs_per_wait_retry is not None:
+      interval = 3.0 if secs_per_wait_retry is None else secs_per_wait_retry
+      polls = (5 if wait_retries is None else wait_retries) + 2
+      poll_policy = RetryPolicy(min_interval = interval, max_interval = interval, multiplier = 1.0, jitter = 0.0, deadline = None, max_attempts = polls)
+
+  return (busy_policy, poll_policy)
+
+def _import_result(log, data, polls, elapsed):
+  if data is None:
+    return None
+  elif data['status'] == 'ready':
+    log.error("Found importer in ready state, but never saw success/failure")
+    return None
+  elif data['status'] == 'succeeded':
+    log.debug("Import was successful")
+    return data
+  elif data['status'] == 'failed':
+    log.error("Import had some failures")
+    return data
+  elif data['status'] in ['queued', 'processing']:
+    log.error("Import is still being processed after %d attempts (%.1f seconds) to query status. Giving up" % (polls, elapsed))
+    return None
+  else:
+    log.error("Unsupported import status '%s'" % (data['status']))
+    return None
+
 class Tradervue:
   """Here's some class stuff more
   """
@@ -88,16 +304,74 @@ class Tradervue:
   """
   MAX_ALLOWED_OBJECT_REQUEST = 500
 
-  def __init__(self, username, password, user_agent, target_user = None, baseurl = 'https://www.tradervue.com', verbose_http = False):
+  """The number of objects the API returns per page. Iterators such as :meth:`iter_trades` request one page at a time
+  """
+  MAX_OBJECTS_PER_REQUEST = 100
+
+  """List responses at least this large (or of unknown length) are decoded incrementally as they're received, so the
+     whole body is never held in memory alongside the decoded objects
+  """
+  STREAM_MIN_BYTES = 1024 * 1024
+
+  """The size of the chunks incrementally decoded responses are read in
+  """
+  STREAM_CHUNK_BYTES = 64 * 1024
+
+  """Request bodies smaller than this aren't worth compressing when ``gzip_requests`` is enabled
+  """
+  GZIP_MIN_BYTES = 1024
+
+  """The default wait between :meth:`import_executions` attempts while Tradervue is busy with another import (HTTP
+     424): from half a second, doubling up to 5 seconds, for as long as the old fixed waits took at worst (15 seconds)
+  """
+  IMPORT_BUSY_POLICY = RetryPolicy(min_interval = 0.5, max_interval = 5.0, multiplier = 2.0, jitter = 0.25, deadline = 15.0)
+
+  """The default wait between :meth:`import_executions` status queries: from half a second, doubling up to 3 seconds,
+     for as long as the old fixed polls took at worst (18 seconds). Small imports are noticed as soon as they're done.
+  """
+  IMPORT_POLL_POLICY = RetryPolicy(min_interval = 0.5, max_interval = 3.0, multiplier = 2.0, jitter = 0.25, deadline = 18.0)
+
+  """A backoff for waiting out a busy importer for up to 10 minutes. The default for
+     :meth:`import_executions_batched`, whose chunks queue up behind each other
+  """
+  IMPORT_BUSY_BACKOFF = RetryPolicy(min_interval = 1.0, max_interval = 30.0, multiplier = 2.0, deadline = 600.0)
+
+  """A backoff for waiting up to 30 minutes for an import to be processed. Starts short so small imports return
+     quickly. The default for :meth:`import_executions_batched`
+  """
+  IMPORT_POLL_BACKOFF = RetryPolicy(min_interval = 0.25, max_interval = 10.0, multiplier = 1.5, deadline = 1800.0)
+
+  def __init__(self, username, password, user_agent, target_user = None, baseurl = 'https://www.tradervue.com', verbose_http = False, pool_connections = 10, pool_maxsize = 10, pool_block = False, max_retries = 0, session = None, max_workers = 4, cache = None, rate_limiter = None, throttle_retries = 5, gzip_requests = False, metrics = None, cassette = None):
     """Construct a Tradervue instance.
 
+       All requests issued by the instance share a single pooled, keep-alive HTTP session so that consecutive calls reuse
+       established connections. Call :meth:`close` (or use the instance as a context manager) to release the connections.
+
        :param str username: the Tradervue username
        :param str password: the Tradervue password
        :param str user_agent: the user agent to use in requests. Should be something like: ``MyApp (your@email.com)``
        :param target_user: the user id to issues requests on behalf of. To be used by organization administrators (if the feature is enabled)
        :param str baseurl: the organization's URL if using a local server
        :param bool verbose_http: set to True for verbose dumping of HTTP requests and reponses (requires logging of DEBUG severity to be enabled)
+       :param int pool_connections: the number of per-host connection pools to cache
+       :param int pool_maxsize: the maximum number of connections kept alive per host
+       :param bool pool_block: if ``True``, block when all ``pool_maxsize`` connections to a host are in use instead of opening extra (non-pooled) connections
+       :param max_retries: the number of connection-level retries, or a ``urllib3.util.retry.Retry`` instance for finer control
+       :param session: an existing ``requests.Session`` to use. If specified, the pool arguments are ignored and the session is not closed by :meth:`close`.
+       :param int max_workers: the number of concurrent requests used when fetching comments and executions for the results of :meth:`get_trades`, :meth:`get_journals` and :meth:`get_notes`. A value of 1 fetches them serially.
+       :param cache: an object cache for :meth:`get_trade`, :meth:`get_journal`, :meth:`get_note`, :meth:`get_user` and the comment/execution getters. Entries are invalidated automatically when this instance modifies or deletes the object. If ``None``, nothing is cached.
        :type target_user: str or None
+       :type max_retries: int or Retry
+       :param rate_limiter: the limiter every request passes through. By default all clients for the same ``username`` and ``baseurl`` share one adaptive limiter (see :class:`~tradervue.ratelimit.RateLimiter`). Specify ``False`` to disable rate limiting.
+       :param int throttle_retries: the number of times a request the server throttled (HTTP 429 or 503) is retried, after waiting for the ``Retry-After`` period
+       :param bool gzip_requests: set to True to gzip request bodies of at least ``Tradervue.GZIP_MIN_BYTES`` (sent with ``Content-Encoding: gzip``). Only enable this if the server accepts compressed requests.
+       :param metrics: where request counts, latencies, sizes and errors are recorded. By default each client has its own :class:`~tradervue.metrics.Metrics`, available as the ``metrics`` attribute. Pass an instance to share it between clients, or ``False`` to disable metrics.
+       :type session: requests.Session or None
+       :type cache: ObjectCache or None
+       :type rate_limiter: RateLimiter or None or False
+       :param cassette: record every request and response into this cassette, or answer requests from it without using the network, depending on its mode (see :class:`~tradervue.cassette.Cassette`)
+       :type metrics: Metrics or None or False
+       :type cassette: Cassette or None
        :return: the Tradervue instance
        :rtype: Tradervue
     """
@@ -108,75 +382,143 @@ class Tradervue:
     self.baseurl = '/'.join([baseurl, 'api', 'v1'])
     self.log = logging.getLogger('tradervue')
     self.verbose_http = verbose_http
-
-  # Simple wrappers for requests API
-  def __get   (self, url, params) : return self.__make_request(requests.get,    url, params = params)
-  def __put   (self, url, payload): return self.__make_request(requests.put,    url, payload)
-  def __post  (self, url, payload): return self.__make_request(requests.post,   url, payload)
-  def __delete(self, url, payload): return self.__make_request(requests.delete, url, payload)
-
-  def __make_request(self, request_fn, url, payload = None, params = None):
-    auth = (self.username, self.password)
-    headers = { 'Accept': 'application/json',
-                'Content-Type': 'application/json',
-                'User-Agent': self.user_agent }
-
-    if payload is not None:
-      payload = json.dumps(payload, indent = 2)
+    self.max_workers = max(1, int(max_workers))
+    self.cache = cache
+    self.rate_limiter = RateLimiter.shared(self.baseurl, username) if rate_limiter is None else (rate_limiter or None)
+    self.throttle_retries = throttle_retries
+    self.last_import_timing = None
+    self.gzip_requests = gzip_requests
+    self.metrics = Metrics() if metrics is None else (metrics or None)
+    self.cassette = cassette
+
+    self.__owns_session = session is None
+    if session is None:
+      session = requests.Session()
+      adapter = requests.adapters.HTTPAdapter(pool_connections = pool_connections, pool_maxsize = pool_maxsize, max_retries = max_retries, pool_block = pool_block)
+      session.mount('https://', adapter)
+      session.mount('http://', adapter)
+
+    # Auth and headers are identical for every request, so set them up once on the session
+    session.auth = (self.username, self.password)
+    session.headers.update({ 'Accept': 'application/json',
+                             'Content-Type': 'application/json',
+                             'User-Agent': self.user_agent })
 
     # Add Target User header if that's been requested
     #
     if self.target_user is not None:
-      headers['Tradervue-UserId'] = self.target_user
+      session.headers['Tradervue-UserId'] = self.target_user
+
+    self.session = session
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    self.close()
+    return False
+
+  def close(self):
+    """Close the underlying HTTP session and release any pooled connections.
+
+       If a ``session`` was passed to the constructor it is left open; closing it is the caller's responsibility.
+    """
+    if self.__owns_session:
+      self.session.close()
 
-    if self.verbose_http:
+  # Simple wrappers for requests API
+  def __get   (self, url, params, stream = False): return self.__make_request('GET', url, params = params, stream = stream)
+  def __put   (self, url, payload): return self.__make_request('PUT',    url, payload)
+  def __post  (self, url, payload): return self.__make_request('POST',   url, payload)
+  def __delete(self, url, payload): return self.__make_request('DELETE', url, payload)
+
+  def __make_request(self, method, url, payload = None, params = None, stream = False):
+    # Payloads may arrive already encoded (see import_executions_batched)
+    if payload is not None and not isinstance(payload, bytes):
+      payload = codec.dumps(payload)
+
+    # Don't format headers and bodies unless they'll actually be logged
+    verbose = self.verbose_http and self.log.isEnabledFor(logging.DEBUG)
+    if verbose:
       self.log.debug(color_text(Fore.GREEN, "REQUEST:  url     %s" % (url)))
-      self.log.debug(color_text(Fore.GREEN, "          headers %s" % (headers)))
-      self.log.debug(color_text(Fore.GREEN, "          user    %s" % (auth[0])))
-      self.log.debug(color_text(Fore.GREEN, "          payload %s" % (payload)))
+      self.log.debug(color_text(Fore.GREEN, "          headers %s" % (dict(self.session.headers))))
+      self.log.debug(color_text(Fore.GREEN, "          user    %s" % (self.username)))
+      self.log.debug(color_text(Fore.GREEN, "          payload %s" % (payload if payload is None else payload.decode('utf-8'))))
       self.log.debug(color_text(Fore.GREEN, "          params  %s" % (params)))
 
-    result = request_fn(url, headers = headers, auth = auth, data = payload, params = params)
-
-    if self.verbose_http:
-      self.log.debug(color_text(Fore.GREEN, "RESPONSE: url     %s" % (result.url)))
-      self.log.debug(color_text(Fore.GREEN, "          code    %s" % (result.status_code)))
-      self.log.debug(color_text(Fore.GREEN, "          headers %s" % (result.headers)))
-      self.log.debug(color_text(Fore.GREEN, "          body    %s" % (result.text)))
-    return result
+    # Cassettes identify requests by the uncompressed body
+    body = payload
+    headers = None
+    if self.gzip_requests and payload is not None and len(payload) >= Tradervue.GZIP_MIN_BYTES:
+      payload = gzip.compress(payload, compresslevel = 6)
+      headers = { 'Content-Encoding': 'gzip' }
 
-  def __handle_bad_http_response(self, r, msg, show_url = False):
+    endpoint = _endpoint(self.baseurl, url)
+    sent = 0 if payload is None else len(payload)
+    path = url[len(self.baseurl):]
+    replaying = self.cassette is not None and self.cassette.mode == 'replay'
+    recording = self.cassette is not None and self.cassette.mode == 'record'
 
-    # See if we can parse out a JSON error repsonse. If not, no big deal
-    status = "HTTP Status: %d" % (r.status_code)
-    if show_url:
-      status += ", URL: %s" % (r.url)
+    attempt = 0
+    while True:
+      if self.rate_limiter is not None:
+        self.rate_limiter.acquire()
+
+      start = time.perf_counter()
+      try:
+        if replaying:
+          interaction, delay = self.cassette.replay(method, path, params, body)
+          if delay > 0:
+            time.sleep(delay)
+          result = _replayed_response(method, url, params, interaction)
+        else:
+          result = self.session.request(method, url, data = payload, params = params, headers = headers, stream = stream)
+      except requests.exceptions.RequestException as e:
+        if self.metrics is not None:
+          self.metrics.record(endpoint, method, type(e).__name__, time.perf_counter() - start, sent, 0, attempt > 0)
+        raise
+
+      if recording:
+        elapsed = time.perf_counter() - start
+        self.cassette.record(method, path, params, body, result.status_code, result.headers, result.content, elapsed)
+
+      if self.metrics is not None:
+        # Streamed bodies haven't been read yet. They're counted as they're read (see __record_received).
+        length = result.headers.get('Content-Length')
+        received = 0 if stream else (int(length) if length is not None else len(result.content))
+        self.metrics.record(endpoint, method, result.status_code, time.perf_counter() - start, sent, received, attempt > 0)
+
+      if verbose:
+        self.log.debug(color_text(Fore.GREEN, "RESPONSE: url     %s" % (result.url)))
+        self.log.debug(color_text(Fore.GREEN, "          code    %s" % (result.status_code)))
+        self.log.debug(color_text(Fore.GREEN, "          headers %s" % (result.headers)))
+        self.log.debug(color_text(Fore.GREEN, "          body    %s" % (result.text)))
+
+      throttled = result.status_code in RateLimiter.THROTTLE_STATUS_CODES
+      if self.rate_limiter is not None:
+        self.rate_limiter.on_response(result.status_code, result.headers.get('Retry-After'))
+      if not throttled or attempt >= self.throttle_retries:
+        return result
+
+      attempt += 1
+      result.close()
+      self.log.warning("Request to %s was throttled (HTTP %d). Retrying (attempt %d of %d)" % (url, result.status_code, attempt, self.throttle_retries))
+      if self.rate_limiter is None:
+        time.sleep(RateLimiter.parse_retry_after(result.headers.get('Retry-After')) or 1)
 
-    server_error = 'UNKNOWN'
-    try:
-      jdata = json.loads(r.text)
-      if 'error' in jdata:
-        server_error = jdata['error']
-      elif 'status' in jdata:
-        server_error = jdata['status']
-      else:
-        self.log.error("Unexpected JSON received for bad HTTP reponse (no status or error field found)")
-        server_error = r.text
-    except ValueError as e:
-      server_error = r.text
-      
-    self.log.error(msg)
-    self.log.error(status)
-    self.log.error("Server error: %s" % (server_error))
+  def __handle_bad_http_response(self, r, msg, show_url = False):
+    _log_bad_http_response(self.log, r, msg, show_url, self.target_user)
 
-    if r.status_code == 403 and self.target_user:
-      self.log.error("No permission to issue API calls on behalf of user %d")
+  def __invalidate(self, key, object_id = None):
+    if self.cache is not None:
+      self.cache.invalidate(key, object_id)
 
   def __delete_object(self, key, object_id):
     object_id = str(object_id)
     url = '/'.join([self.baseurl, key, object_id])
 
     r = self.__delete(url, None)
+    self.__invalidate(key, object_id)
     if r.status_code == 200:
       self.log.debug("%s-DELETE[%s]: %s" % (key.upper(), object_id, color_text(Fore.GREEN, 'SUCCESS')))
       return True
@@ -193,7 +535,7 @@ class Tradervue:
       if return_url:
         return r.headers['Location']
       else:
-        payload = json.loads(r.text)
+        payload = codec.loads(r.content)
         return payload['id']
     else:
       self.__handle_bad_http_response(r, "%s-CREATE[%s]: %s" % (key.upper(), user_identifier, color_text(Fore.RED, 'FAILED')))
@@ -208,6 +550,7 @@ class Tradervue:
 
     url = '/'.join([self.baseurl, key, object_id])
     r = self.__put(url, data)
+    self.__invalidate(key, object_id)
     if r.status_code == 200:
       self.log.debug("%s-UPDATE[%s]: (%s) %s" % (key.upper(), object_id, ' '.join(list(data.keys())), color_text(Fore.GREEN, 'SUCCESS')))
       return True
@@ -216,7 +559,7 @@ class Tradervue:
       return False
 
   def __get_objects(self, key, data, result_key = None, max_objects = 25, object_offset = 0):
-    MAX_OBJECTS_PER_REQUEST = 100
+    MAX_OBJECTS_PER_REQUEST = Tradervue.MAX_OBJECTS_PER_REQUEST
 
     max_objects = int(max_objects) # Check for valid value and not None
 
@@ -275,6 +618,36 @@ class Tradervue:
     return objects
 
 
+  def __iter_objects(self, key, data, result_key, fetches, offset, shape_page = None):
+    """Lazily walk all pages of ``key`` starting at ``offset``, yielding one object at a time.
+
+       The next page (including any sub-resource ``fetches``) is requested in the background while the current page
+       is being consumed, so at most two pages are held in memory at once.
+    """
+    page_size = Tradervue.MAX_OBJECTS_PER_REQUEST
+
+    def fetch_page(page_offset):
+      page = self.__get_objects(key, dict(data), result_key, page_size, page_offset)
+      if page is not None and len(fetches) > 0:
+        self.__fetch_sub_resources(key, page, fetches)
+      if page is not None and shape_page is not None:
+        # Projected away keys are dropped only once sub-resources (which need the IDs and counts) have been fetched
+        page = shape_page(page)
+      return page
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers = 1) as prefetcher:
+      pending = prefetcher.submit(fetch_page, offset)
+      while pending is not None:
+        page = pending.result()
+        if page is None:
+          raise IOError("Unable to fetch %s at offset %d" % (key, offset))
+
+        offset += len(page)
+        pending = prefetcher.submit(fetch_page, offset) if len(page) == page_size else None
+
+        for obj in page:
+          yield obj
+
   def __get_object(self, endpoint, fragments, object_id, result_key = None, data = None, start_index = 0, end_index = None):
 
     if fragments is None: fragments = []
@@ -286,28 +659,124 @@ class Tradervue:
     url = '/'.join(url_array)
     f_debug_string = '' if len(fragments) == 0 else '[%s]' % ('/'.join(fragments))
 
-    r = self.__get(url, data)
-    if r.status_code == 200:
+    # Single objects (and their comments/executions) can be served from the cache. Queries are never cached.
+    cache_key = cache_token = content = None
+    cached = False
+    if self.cache is not None and object_id is not None and data is None:
+      cache_key = (endpoint, str(object_id)) + tuple(fragments)
+      cache_token = self.cache.token(cache_key)
+      content = self.cache.get(cache_key)
+      cached = content is not None
+
+    if cached:
+      self.log.debug("%s-GET[%s]%s: %s" % (endpoint.upper(), object_id, f_debug_string, color_text(Fore.GREEN, 'CACHED')))
+    else:
+      # Uncached lists may be large enough to be worth decoding as they arrive
+      stream = cache_key is None and result_key is not None
+      r = self.__get(url, data, stream)
+      if r.status_code != 200:
+        self.__handle_bad_http_response(r, "%s-GET[%s]%s: %s" % (endpoint.upper(), object_id, f_debug_string, color_text(Fore.RED, 'FAILED')), show_url = True)
+        return None
+
       self.log.debug("%s-GET[%s]%s: %s" % (endpoint.upper(), object_id, f_debug_string, color_text(Fore.GREEN, 'SUCCESS')))
-      result = json.loads(r.text)
-      if result_key is not None:
-        if result_key not in result:
-          self.log.error("Unable to find '%s' key in %s results: %s" % (result_key, endpoint, r.text))
-          return None
-        else:
-          result = result[result_key]
+      length = r.headers.get('Content-Length')
+      if stream and (length is None or int(length) >= Tradervue.STREAM_MIN_BYTES):
+        return self.__decode_stream(r, endpoint, result_key, start_index, end_index)
+      content = r.content
+      if stream:
+        self.__record_received(endpoint, len(content))
+
+    # Cached entries hold the raw response body rather than the decoded object so callers can't modify the cached copy
+    result = codec.loads(content)
+    if result_key is not None:
+      if result_key not in result:
+        self.log.error("Unable to find '%s' key in %s results: %s" % (result_key, endpoint, content.decode('utf-8', 'replace')))
+        return None
       else:
-        # result is fine as-is
-        pass
+        result = result[result_key]
     else:
-      self.__handle_bad_http_response(r, "%s-GET[%s]%s: %s" % (endpoint.upper(), object_id, f_debug_string, color_text(Fore.RED, 'FAILED')), show_url = True)
-      return None
+      # result is fine as-is
+      pass
 
-    if isinstance(result, list):
+    # Only fresh responses are stored; re-storing a hit would push its expiry back and it might never expire
+    if cache_key is not None and not cached:
+      self.cache.put(cache_key, content, len(content), cache_token)
+
+    # Only copy the list if a part of it was asked for
+    if isinstance(result, list) and (start_index > 0 or (end_index is not None and end_index < len(result))):
       return result[start_index:end_index]
     else:
       return result
 
+  def __decode_stream(self, r, endpoint, result_key, start_index, end_index):
+    # The whole body is read (elements outside the slice are decoded and dropped) so the connection can be reused.
+    # Closing a response that hasn't been read to the end drops its connection instead of returning it to the pool.
+    result = []
+    received = 0
+    def counted(chunks):
+      nonlocal received
+      for chunk in chunks:
+        received += len(chunk)
+        yield chunk
+
+    chunks = counted(r.iter_content(Tradervue.STREAM_CHUNK_BYTES))
+    try:
+      for index, obj in enumerate(codec.iter_array(chunks, result_key)):
+        if index >= start_index and (end_index is None or index < end_index):
+          result.append(obj)
+      for chunk in chunks: pass
+    except KeyError:
+      self.log.error("Unable to find '%s' key in %s results" % (result_key, endpoint))
+      for chunk in chunks: pass
+      return None
+    finally:
+      r.close()
+      self.__record_received(endpoint, received)
+    return result
+
+  def __record_received(self, endpoint, received):
+    if self.metrics is not None:
+      self.metrics.record_received(endpoint, 'GET', received)
+
+  def __fetch_sub_resource(self, fetch_fn, object_id):
+    try:
+      result = fetch_fn(object_id)
+    except requests.exceptions.RequestException as e:
+      return (None, str(e))
+    if result is None:
+      return (None, 'request failed')
+    return (result, None)
+
+  def __fetch_sub_resources(self, key, objects, fetches):
+    """Fetch sub-resources (comments, executions) for each object in ``objects`` on a bounded worker pool.
+
+       ``fetches`` is a list of ``(result_key, count_key, fetch_fn)`` tuples. A fetch is only issued if the object's
+       ``count_key`` is non-zero. Results are attached to the objects in place, so the order of ``objects`` is
+       unchanged. Failures don't abort the whole call; they're recorded in the object's ``fetch_errors`` dict instead.
+    """
+    jobs = []
+    for obj in objects:
+      for result_key, count_key, fetch_fn in fetches:
+        if int(obj[count_key]) > 0:
+          jobs.append((obj, result_key, fetch_fn))
+
+    if len(jobs) == 0:
+      return
+
+    workers = min(self.max_workers, len(jobs))
+    if workers == 1:
+      results = [self.__fetch_sub_resource(fetch_fn, obj['id']) for (obj, result_key, fetch_fn) in jobs]
+    else:
+      with concurrent.futures.ThreadPoolExecutor(max_workers = workers) as pool:
+        results = list(pool.map(lambda job: self.__fetch_sub_resource(job[2], job[0]['id']), jobs))
+
+    for (obj, result_key, fetch_fn), (value, error) in zip(jobs, results):
+      if error is None:
+        obj[result_key] = value
+      else:
+        self.log.error("Unable to fetch %s for %s ID %s: %s" % (result_key, key, obj['id'], error))
+        obj.setdefault('fetch_errors', {})[result_key] = error
+
   def create_trade(self, symbol, notes = None, initial_risk = None, shared = False, tags = [], return_url = False):
     """Create a new trade. This is the equivalent of the 'New Trade' feature on the website.
 
@@ -325,7 +794,7 @@ class Tradervue:
     data = { 'symbol': symbol, 'shared': shared }
     if notes is not None: data['notes'] = notes
     if initial_risk is not None: data['initial_risk'] = initial_risk
-    if tags is not None and len(tags) > 0: data['tags'] = copy.deepcopy(tags)
+    if tags is not None and len(tags) > 0: data['tags'] = tags
 
     return self.__create_object('trades', symbol, data, return_url)
 
@@ -338,13 +807,23 @@ class Tradervue:
     """
     return self.__delete_object('trades', trade_id)
 
-  def get_trades(self, symbol = None, tag_expr = None, side = None, duration = None, startdate = None, enddate = None, winners = None, include_comments = False, include_executions = False, max_trades = 25, offset = 0):
+  def __trade_fetches(self, include_comments, include_executions):
+    fetches = []
+    if include_comments: fetches.append(('comments', 'comment_count', self.get_trade_comments))
+    if include_executions: fetches.append(('executions', 'exec_count', self.get_trade_executions))
+    return fetches
+
+  def get_trades(self, symbol = None, tag_expr = None, side = None, duration = None, startdate = None, enddate = None, winners = None, include_comments = False, include_executions = False, max_trades = 25, offset = 0, fields = None, records = False):
     """Query for trades matching the specified criteria.
 
        All arguments to this method are optional. If not specified, they are not part of the query. 
 
        The list returned from this method contains dict objects which have fields as defined in the `Tradervue Trade Documentation <https://github.com/tradervue/api-docs/blob/master/trades.md>`_.
 
+       Comments and executions are fetched concurrently using up to ``max_workers`` requests (see :class:`Tradervue`). If
+       any of them can't be fetched, the trade gets a ``fetch_errors`` key mapping ``'comments'`` or ``'executions'`` to
+       an error message rather than the whole call failing.
+
        :param symbol: Find trades on this symbol
        :param tag_expr: Find trades matching this tag expression. Read more about tag expressions in this `blog entry <http://blog.tradervue.com/2012/10/10/new-tag-combination-report/>`_.
        :param side: Find trades matching the specified side. Must be one of the following values: ``'Long'`` or ``'Short'``.
@@ -356,6 +835,8 @@ class Tradervue:
        :param bool include_executions: If there are executions associated with the trade, include them in the results (the ``executions`` key will be a list of comments)
        :param max_trades: Return at most the specified number of trades. The maximum value here is determined by ``Tradervue.MAX_ALLOWED_OBJECT_REQUEST``
        :param offset: Returns trades starting at the specified offset. Trades are returned newest first, so this can be used to query older trades.
+       :param fields: Keep only these keys of each trade (e.g. ``['id', 'symbol', 'gross_pl']``) to save memory. Comments and executions asked for with ``include_comments`` and ``include_executions`` are always kept. ``None`` keeps every key.
+       :param bool records: Return :class:`Trade <tradervue.records.Trade>` records rather than dicts. Records take a fraction of the memory of a dict.
        :type symbol: str or None
        :type tag_expr: str or None
        :type side: str or None
@@ -365,39 +846,39 @@ class Tradervue:
        :type winners: bool or None
        :type max_trades: int
        :type offset: int
+       :type fields: list of str or None
        :return: a list of trades matching the specified critiera or ``None`` if an error is encountered
        :rtype: list or None
     """
-    data = { }
-    if symbol is not None: data['symbol'] = symbol
-    if tag_expr is not None: data['tag'] = tag_expr
+    data = _trades_query(symbol, tag_expr, side, duration, startdate, enddate, winners)
 
-    if side is not None:
-      if not re.match(r'^(long|short)$', side, re.IGNORECASE):
-        raise ValueError("The 'side' parameter to get_trades must be 'Long' or 'Short'. Saw '%s'" % (side))
-      else:
-        data['side'] = side[0].upper()
+    all_trades = self.__get_objects('trades', data, 'trades', max_trades, offset)
 
-    if duration is not None:
-      if not re.match(r'^(intraday|multiday)$', duration, re.IGNORECASE):
-        raise ValueError("The 'duration' parameter to get_trades must be 'Intraday' or 'Multiday'. Saw '%s'" % (duration))
-      else:
-        data['duration'] = duration[0].upper()
+    fetches = self.__trade_fetches(include_comments, include_executions)
+    if all_trades is not None and len(fetches) > 0:
+      self.__fetch_sub_resources('trades', all_trades, fetches)
 
-    if startdate is not None: data['startdate'] = startdate.strftime('%m/%d/%Y')
-    if enddate is not None: data['enddate'] = enddate.strftime('%m/%d/%Y')
-    if winners is not None: data['plgross'] = 'W' if winners else 'L'
+    return _shape(all_trades, Trade, fetches, fields, records)
 
-    all_trades = self.__get_objects('trades', data, 'trades', max_trades, offset)
+  def iter_trades(self, symbol = None, tag_expr = None, side = None, duration = None, startdate = None, enddate = None, winners = None, include_comments = False, include_executions = False, offset = 0, fields = None, records = False):
+    """Lazily iterate over all trades matching the specified criteria.
 
-    if include_comments or include_executions:
-      for trade in all_trades:
-        if include_comments and int(trade['comment_count']) > 0:
-          trade['comments'] = self.get_trade_comments(trade['id'])
-        if include_executions and int(trade['exec_count']) > 0:
-          trade['executions'] = self.get_trade_executions(trade['id'])
+       This accepts the same filters as :meth:`get_trades`, but isn't limited to ``Tradervue.MAX_ALLOWED_OBJECT_REQUEST``
+       trades. Trades are requested one page at a time, and the next page is prefetched while the current one is being
+       consumed, so memory use doesn't grow with the size of the account.
 
-    return all_trades
+       :param offset: Start iterating at the specified offset. Trades are returned newest first.
+       :param fields: see :meth:`get_trades`
+       :param bool records: see :meth:`get_trades`
+       :type offset: int
+       :type fields: list of str or None
+       :return: a generator yielding one trade (a dict or a :class:`Trade <tradervue.records.Trade>`) at a time
+       :rtype: generator
+       :raises IOError: if a page of trades can't be fetched
+    """
+    data = _trades_query(symbol, tag_expr, side, duration, startdate, enddate, winners)
+    fetches = self.__trade_fetches(include_comments, include_executions)
+    return self.__iter_objects('trades', data, 'trades', fetches, offset, _page_shaper(Trade, fetches, fields, records))
 
   def get_trade(self, trade_id):
     """Get detailed information about the specified trade ID.
@@ -453,7 +934,7 @@ class Tradervue:
     if notes is not None: data['notes'] = notes
     if shared is not None: data['shared'] = shared
     if initial_risk is not None: data['initial_risk'] = initial_risk
-    if tags is not None : data['tags'] = copy.deepcopy(tags)
+    if tags is not None : data['tags'] = tags
 
     return self.__update_object('trades', trade_id, data)
 
@@ -465,16 +946,9 @@ class Tradervue:
        :return: a dict of the current import state or ``None`` on error
        :rtype: dict or None
     """
-    result = self.__get_object('imports', None, None)
-    if not 'status' in result:
-      self.log.error("Unable to find 'status' key in result: %s" % (result))
-      return None 
-    elif not result['status'] in ['ready', 'queued', 'processing', 'succeeded', 'failed' ]:
-      self.log.error("Unexpected status '%s' for import status. Check API and update library. Result = %s" % (status, result))
-      return None
-    return result
+    return _check_import_status(self.log, self.__get_object('imports', None, None))
 
-  def import_executions(self, executions, account_tag = None, tags = None, allow_duplicates = False, overlay_commissions = False, import_retries = 3, wait_for_completion = False, wait_retries = 5, secs_per_wait_retry = 3):
+  def import_executions(self, executions, account_tag = None, tags = None, allow_duplicates = False, overlay_commissions = False, import_retries = None, wait_for_completion = False, wait_retries = None, secs_per_wait_retry = None, busy_policy = None, poll_policy = None):
     """Import the specified trade executions.
 
        :param list executions: The executions to import. This should be a list of dicts. Each dict should have keys as specified in the `Tradervue Import Documentation <https://github.com/tradervue/api-docs/blob/master/imports.md>`_.
@@ -482,92 +956,149 @@ class Tradervue:
        :param tags: A list of tags to be applied to this trade. The list values should be strings. IF ``None``, no tags are applied to the trade.
        :param bool allow_duplicates: set this to ``True`` if you wish to disable Tradervue's automatic duplicate-detection when importing this data.
        :param bool overlay_commissions: set this to ``True`` to run this import in commission-overlay mode; no new trades will be created, and existing trades will be updated with commission and fee data. See the Tradervue `help article <http://www.tradervue.com/help/older_commissions>`_ for more details.
-       :param int import_retries: Tradervue allows only one import at a time. If this method is invoked while Tradervue is busy, the import will be retried up to this many times before returning ``None``.
+       :param import_retries: Tradervue allows only one import at a time. If this method is invoked while Tradervue is busy, the import will be attempted at most this many times, 5 seconds apart, before returning ``False``. Replaces the default ``busy_policy``.
        :param bool wait_for_completion: If ``True``, this method will block until the import has been processed by Tradervue. In this case, the import success/failure information will be the return value from this method. Details on that data structure are available in the `Tradervue Import Documentation <https://github.com/tradervue/api-docs/blob/master/imports.md>`_.
-       :param int wait_retries: The number of times to poll the import status before giving up and returning ``None``.
-       :param int secs_per_wait_retry: The poll interval in seconds to query import status.
+       :param wait_retries: The number of times to poll the import status after the first two polls before giving up and returning ``None``. Replaces the default ``poll_policy`` with fixed polls (every ``secs_per_wait_retry`` seconds, or 3).
+       :param secs_per_wait_retry: A fixed poll interval in seconds to query import status, instead of the default ``poll_policy`` backoff. Unless ``wait_retries`` is given, the status is polled 7 times.
+       :param busy_policy: How long to wait between attempts while Tradervue is busy with another import. Defaults to ``Tradervue.IMPORT_BUSY_POLICY`` (a short backoff for up to 15 seconds). Pass ``Tradervue.IMPORT_BUSY_BACKOFF`` to keep trying for up to 10 minutes.
+       :param poll_policy: How long to wait between import status queries when ``wait_for_completion`` is ``True``. Defaults to ``Tradervue.IMPORT_POLL_POLICY`` (a short backoff for up to 18 seconds). Pass ``Tradervue.IMPORT_POLL_BACKOFF`` to wait for up to 30 minutes.
        :type account_tag: str or None
        :type tags: list or None
+       :type import_retries: int or None
+       :type wait_retries: int or None
+       :type secs_per_wait_retry: float or None
+       :type busy_policy: RetryPolicy or None
+       :type poll_policy: RetryPolicy or None
        :return: If ``wait_for_completion`` is ``True`` returns the import status dict or ``None`` on error. Otherwise returns ``True`` on success or ``False`` if an error occurs.
        :rtype: dict or None
        :raises ValueError: if ``executions`` is empty
        :raises TypeError: if ``executions`` or ``tags`` are not list objects
+
+       The time spent on each phase is available afterwards in ``last_import_timing``, a dict with ``submit_seconds``,
+       ``submit_attempts``, ``wait_seconds`` and ``polls`` keys.
     """
-    if len(executions) == 0:
-      raise ValueError("Found 0 executions to import in import_executions. Must specify at least 1")
-    if not isinstance(executions, list):
-      raise TypeError("The executions argument to import_executions must be a list, but found %s" % (type(executions)))
-    if tags is not None:
-      if not isinstance(tags, list):
-        raise TypeError("The tags argument (if specified) to import_executions must be a list, but found %s" % (type(tags)))
-    
-    data = { 'executions': copy.deepcopy(executions), 'allow_duplicates': allow_duplicates, 'overlay_commissions': overlay_commissions }
+    data = _import_payload(executions, account_tag, tags, allow_duplicates, overlay_commissions)
+    (busy_policy, poll_policy) = _import_policies(import_retries, wait_retries, secs_per_wait_retry, busy_policy, poll_policy)
 
-    # TV doesn't automatically add the account_tag. It must be explicitly added to the tags list
-    if account_tag is not None:
-      data['account_tag'] = account_tag
-      if tags is None: tags = []
+    return self.__import_executions(data, wait_for_completion, busy_policy, poll_policy)
 
-    if tags is not None: data['tags'] = copy.deepcopy(tags)
+  def import_executions_batched(self, executions, account_tag = None, tags = None, allow_duplicates = False, overlay_commissions = False, max_rows = 5000, max_bytes = 4 * 1024 * 1024, stop_on_error = False, busy_policy = None, poll_policy = None, on_chunk = None):
+    """Import a large number of trade executions as a sequence of smaller imports.
 
-    return self.__import_executions(data, import_retries, wait_for_completion, wait_retries, secs_per_wait_retry)
+       ``executions`` is split into chunks of at most ``max_rows`` executions and roughly ``max_bytes`` of JSON. Each
+       chunk is imported in turn and waited on, since Tradervue only processes one import at a time. The next chunk is
+       serialized while the current one is being processed, and is submitted as soon as the import slot frees up. A
+       bad execution only fails the chunk that contains it.
 
-  def __import_executions(self, data, import_retries, wait_for_completion, wait_retries, secs_per_wait_retry):
+       :param executions: The executions to import. Any iterable of dicts with keys as specified in the `Tradervue Import Documentation <https://github.com/tradervue/api-docs/blob/master/imports.md>`_. It's consumed lazily.
+       :param account_tag: An account tag to use when importing. If ``None``, no account tag is used.
+       :param tags: A list of tags to be applied to the imported trades. If ``None``, no tags are applied.
+       :param bool allow_duplicates: see :meth:`import_executions`
+       :param bool overlay_commissions: see :meth:`import_executions`
+       :param int max_rows: the maximum number of executions per chunk
+       :param int max_bytes: the approximate maximum size of each chunk's request body
+       :param bool stop_on_error: if ``True``, stop after the first chunk that doesn't succeed
+       :param busy_policy: see :meth:`import_executions`. Defaults to ``Tradervue.IMPORT_BUSY_BACKOFF``.
+       :param poll_policy: see :meth:`import_executions`. Defaults to ``Tradervue.IMPORT_POLL_BACKOFF``.
+       :param on_chunk: called with each chunk's dict (as in the returned ``chunks`` list) as soon as the chunk has been imported, e.g. to record progress
+       :type account_tag: str or None
+       :type tags: list or None
+       :type busy_policy: RetryPolicy or None
+       :type poll_policy: RetryPolicy or None
+       :type on_chunk: callable or None
+       :return: a dict with a ``chunks`` list (one dict per chunk with ``index``, ``executions``, ``bytes``, ``status``, ``result`` and ``timing`` keys) and a ``summary`` dict totalling executions, bytes, seconds and chunks per status
+       :rtype: dict
+       :raises ValueError: if ``executions`` is empty
+       :raises TypeError: if ``tags`` is not a list
+    """
+    header = _import_header(account_tag, tags, allow_duplicates, overlay_commissions, 'import_executions_batched')
+    (busy_policy, poll_policy) = _import_policies(None, None, None, busy_policy or Tradervue.IMPORT_BUSY_BACKOFF, poll_policy or Tradervue.IMPORT_POLL_BACKOFF)
+    batches = _import_batches(executions, header, max_rows, max_bytes)
+
+    start = time.time()
+    chunks = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers = 1) as serializer:
+      pending = serializer.submit(next, batches, None)
+      while True:
+        batch = pending.result()
+        if batch is None:
+          break
+        pending = serializer.submit(next, batches, None)
+
+        (count, body) = batch
+        result = self.__import_executions(body, True, busy_policy, poll_policy)
+        chunk = _import_chunk(len(chunks), count, len(body), result, self.last_import_timing)
+        chunks.append(chunk)
+        self.log.debug("Import chunk %d (%d executions, %d bytes): %s" % (chunk['index'], count, len(body), chunk['status']))
+        if on_chunk is not None:
+          on_chunk(chunk)
+
+        if stop_on_error and chunk['status'] != 'succeeded':
+          self.log.error("Import chunk %d didn't succeed. Not importing the remaining executions." % (chunk['index']))
+          break
+
+    if len(chunks) == 0:
+      raise ValueError("Found 0 executions to import in import_executions_batched. Must specify at least 1")
+
+    return { 'chunks': chunks, 'summary': _import_summary(chunks, time.time() - start) }
+
+  def __import_executions(self, data, wait_for_completion, busy_policy, poll_policy):
     url = '/'.join([self.baseurl, 'imports'])
+    timing = self.last_import_timing = { 'submit_seconds': 0.0, 'submit_attempts': 0, 'wait_seconds': 0.0, 'polls': 0 }
 
     import_posted = False
-    retries_left = import_retries
-    while retries_left > 0:
-      retries_left -= 1
+    busy = busy_policy.start()
+    while True:
       r = self.__post(url, data)
+      timing['submit_attempts'] += 1
       if r.status_code == 200:
-        data = json.loads(r.text)
-        status = data['status']
+        result = codec.loads(r.content)
+        status = result['status']
         if not status in ['queued']:
           self.log.error("Unexpected status '%s' from importing executions: %s" % (status, r.text))
           return False
         else:
           self.log.debug("Import request successful: %s" % (r.text))
           import_posted = True
+          # Imports add executions to (and overlay commissions onto) existing trades, so any of them may change
+          self.__invalidate('trades')
           break
       elif r.status_code == 424:
-        data = json.loads(r.text)
-        self.log.warning("Waiting 5 seconds and retrying import: %s" % (data['error']))
-        time.sleep(5)
+        result = codec.loads(r.content)
+        delay = busy.next_delay()
+        if delay is None:
+          break
+        self.log.warning("Waiting %.1f seconds and retrying import: %s" % (delay, result['error']))
+        time.sleep(delay)
       else:
         self.__handle_bad_http_response(r, "Unable to import executions")
         return False
+    timing['submit_seconds'] = busy.elapsed()
 
     if not import_posted:
-      self.log.error("Unable to import executions after %d attempts. Giving up." % (import_retries))
-      return False 
+      self.log.error("Unable to import executions after %d attempts (%.1f seconds). Giving up." % (timing['submit_attempts'], timing['submit_seconds']))
+      return False
     elif wait_for_completion:
       self.log.debug("Waiting for import to complete...")
 
-      retries_left = wait_retries
-      data = self.import_status()
+      poll = poll_policy.start()
+      result = self.import_status()
+      timing['polls'] += 1
 
-      while data is not None and (data['status'] == 'queued' or data['status'] == 'processing') and retries_left >= 0:
-        retries_left -= 1
-        time.sleep(secs_per_wait_retry)
-        data = self.import_status()
-
-      if data['status'] == 'ready':
-        self.log.error("Found importer in ready state, but never saw success/failure")
-        return None
-      elif data['status'] == 'succeeded':
-        self.log.debug("Import was successful")
-        return data
-      elif data['status'] == 'failed':
-        self.log.error("Import had some failures")
-        return data
-      elif data['status'] in ['queued', 'processing']:
-        self.log.error("Import is still being processed after %d attmpts to query status. Giving up" % (wait_retries))
-        return None
-      else:
-        self.log.error("Unsupported import status '%s'" % (data['status']))
-        return None
+      while result is not None and (result['status'] == 'queued' or result['status'] == 'processing'):
+        delay = poll.next_delay()
+        if delay is None:
+          break
+        time.sleep(delay)
+        result = self.import_status()
+        timing['polls'] += 1
+      timing['wait_seconds'] = poll.elapsed()
+
+      self.log.debug("Import submitted in %.1f seconds (%d attempts) and processed in %.1f seconds (%d polls)" % (timing['submit_seconds'], timing['submit_attempts'], timing['wait_seconds'], timing['polls']))
+      self.__invalidate('trades')
+      return _import_result(self.log, result, timing['polls'], timing['wait_seconds'])
     else:
+      self.log.debug("Import submitted in %.1f seconds (%d attempts)" % (timing['submit_seconds'], timing['submit_attempts']))
       return True
 
   def get_users(self):
@@ -646,7 +1177,7 @@ class Tradervue:
 
     return self.__create_object('users', username, data, return_url)
 
-  def get_journals(self, date = None, startdate = None, enddate = None, include_comments = False, max_journals = 25, offset = 0):
+  def get_journals(self, date = None, startdate = None, enddate = None, include_comments = False, max_journals = 25, offset = 0, fields = None, records = False):
     """Query for journal entries matching the specified criteria.
 
        All arguments to this method are optional. If not specified, they are not part of the query. 
@@ -656,33 +1187,48 @@ class Tradervue:
        :param date: Find journal entry for the specified date. If this argument is used, neither ``startdate`` nor ``enddate`` should be specified.
        :param startdate: Find journal entries occuring on or after the specified time. Do not use if ``date`` is specified.
        :param enddate: Find journal entries occuring on or before the specified time. Do not use if ``date`` is specified.
-       :param bool include_comments: If there are comments associated with the journal entry, include them in the results (the ``comments`` key will be a list of comments)
+       :param bool include_comments: If there are comments associated with the journal entry, include them in the results (the ``comments`` key will be a list of comments). Comments are fetched concurrently; failures are recorded per entry in a ``fetch_errors`` dict.
        :param max_journals: Return at most the specified number of journal entries.
        :param offset: Returns journal entries starting at the specified offset. Entries are returned newest first, so this can be used to query older entries.
+       :param fields: Keep only these keys of each journal entry (e.g. ``['id', 'date', 'notes']``) to save memory. Comments asked for with ``include_comments`` are always kept. ``None`` keeps every key.
+       :param bool records: Return :class:`JournalEntry <tradervue.records.JournalEntry>` records rather than dicts. Records take a fraction of the memory of a dict.
        :type date: date or datetime or None
        :type startdate: date or datetime or None
        :type enddate: date or datetime or None
        :type max_journals: int
        :type offset: int
+       :type fields: list of str or None
        :return: a list of journal entries matching the specified critiera or ``None`` if an error is encountered
        :rtype: list or None
     """
-    if date is not None and (startdate is not None or enddate is not None):
-      raise ValueError("Cannot specify startdate or enddate if date is specified")
-
-    data = { }
-    if date is not None: data['d'] = date.strftime('%m/%d/%Y')
-    if startdate is not None: data['startdate'] = startdate.strftime('%m/%d/%Y')
-    if enddate is not None: data['enddate'] = enddate.strftime('%m/%d/%Y')
+    data = _journals_query(date, startdate, enddate)
 
     all_journals = self.__get_objects('journal', data, 'journal_entries', max_journals, offset)
 
-    if include_comments:
-      for journal in all_journals:
-        if int(journal['comment_count']) > 0:
-          journal['comments'] = self.get_journal_comments(journal['id'])
+    fetches = [('comments', 'comment_count', self.get_journal_comments)] if include_comments else []
+    if all_journals is not None and len(fetches) > 0:
+      self.__fetch_sub_resources('journal', all_journals, fetches)
+
+    return _shape(all_journals, JournalEntry, fetches, fields, records)
+
+  def iter_journals(self, date = None, startdate = None, enddate = None, include_comments = False, offset = 0, fields = None, records = False):
+    """Lazily iterate over all journal entries matching the specified criteria.
 
-    return all_journals
+       This accepts the same filters as :meth:`get_journals`. Entries are requested one page at a time, with the next
+       page prefetched while the current one is being consumed.
+
+       :param offset: Start iterating at the specified offset. Entries are returned newest first.
+       :param fields: see :meth:`get_journals`
+       :param bool records: see :meth:`get_journals`
+       :type offset: int
+       :type fields: list of str or None
+       :return: a generator yielding one journal entry (a dict or a :class:`JournalEntry <tradervue.records.JournalEntry>`) at a time
+       :rtype: generator
+       :raises IOError: if a page of journal entries can't be fetched
+    """
+    data = _journals_query(date, startdate, enddate)
+    fetches = [('comments', 'comment_count', self.get_journal_comments)] if include_comments else []
+    return self.__iter_objects('journal', data, 'journal_entries', fetches, offset, _page_shaper(JournalEntry, fetches, fields, records))
 
   def get_journal(self, journal_id = None, date = None):
     """Get detailed information about the specified journal ID (or the journal on the specified date). Exactly one of ``journal_id`` or ``date`` must be specified.
@@ -704,10 +1250,23 @@ class Tradervue:
     if journal_id is not None:
       return self.__get_object('journal', None, journal_id)
     else:
+      # Remember which journal ID belongs to the date so repeated lookups skip the query. The mapping may be stale if
+      # the journal has since been deleted, in which case fall through to the query.
+      alias_key = ('journal', 'date:%s' % (date.strftime('%Y-%m-%d')))
+      if self.cache is not None:
+        journal_id = self.cache.get(alias_key)
+        if journal_id is not None:
+          journal = self.__get_object('journal', None, journal_id)
+          if journal is not None:
+            return journal
+          self.cache.invalidate(*alias_key)
+
       journals = self.get_journals(date = date, max_journals = 1)
       if journals is None or len(journals) == 0:
         return None
       else:
+        if self.cache is not None:
+          self.cache.put(alias_key, journals[0]['id'], 0)
         return self.get_journal(journals[0]['id'])
 
   def get_journal_comments(self, journal_id):
@@ -762,27 +1321,47 @@ class Tradervue:
     """
     return self.__delete_object('journal', journal_id)
 
-  def get_notes(self, include_comments = False, max_notes = 25, offset = 0):
+  def get_notes(self, include_comments = False, max_notes = 25, offset = 0, fields = None, records = False):
     """Query for journal notes.
 
        The list returned from this method contains dict objects which have fields as defined in the `Tradervue Journal Notes Documentation <https://github.com/tradervue/api-docs/blob/master/notes.md>`_.
 
-       :param bool include_comments: If there are comments associated with the note, include them in the results (the ``comments`` key will be a list of comments)
+       :param bool include_comments: If there are comments associated with the note, include them in the results (the ``comments`` key will be a list of comments). Comments are fetched concurrently; failures are recorded per note in a ``fetch_errors`` dict.
        :param max_notes: Return at most the specified number of journal notes. Specify ``None`` to return all notes.
        :param offset: Returns notes starting at the specified offset. Notes are returned newest first, so this can be used to query older notes.
+       :param fields: Keep only these keys of each note (e.g. ``['id', 'notes', 'created_at']``) to save memory. Comments asked for with ``include_comments`` are always kept. ``None`` keeps every key.
+       :param bool records: Return :class:`Note <tradervue.records.Note>` records rather than dicts. Records take a fraction of the memory of a dict.
        :type max_notes: int
        :type offset: int
+       :type fields: list of str or None
        :return: a list of journal notes or ``None`` if an error is encountered
        :rtype: list or None
     """
     all_notes = self.__get_objects('notes', {}, 'journal_notes', max_notes, offset)
 
-    if include_comments:
-      for note in all_notes:
-        if int(note['comment_count']) > 0:
-          note['comments'] = self.get_note_comments(note['id'])
+    fetches = [('comments', 'comment_count', self.get_note_comments)] if include_comments else []
+    if all_notes is not None and len(fetches) > 0:
+      self.__fetch_sub_resources('notes', all_notes, fetches)
+
+    return _shape(all_notes, Note, fetches, fields, records)
+
+  def iter_notes(self, include_comments = False, offset = 0, fields = None, records = False):
+    """Lazily iterate over all journal notes.
 
-    return all_notes
+       This accepts the same arguments as :meth:`get_notes`. Notes are requested one page at a time, with the next page
+       prefetched while the current one is being consumed.
+
+       :param offset: Start iterating at the specified offset. Notes are returned newest first.
+       :param fields: see :meth:`get_notes`
+       :param bool records: see :meth:`get_notes`
+       :type offset: int
+       :type fields: list of str or None
+       :return: a generator yielding one journal note (a dict or a :class:`Note <tradervue.records.Note>`) at a time
+       :rtype: generator
+       :raises IOError: if a page of journal notes can't be fetched
+    """
+    fetches = [('comments', 'comment_count', self.get_note_comments)] if include_comments else []
+    return self.__iter_objects('notes', {}, 'journal_notes', fetches, offset, _page_shaper(Note, fetches, fields, records))
 
   def get_note(self, note_id):
     """Get detailed information about the specified journal note ID.